@@ -0,0 +1,218 @@
+"""
+ann.py
+------
+Low-rank content embeddings + an approximate nearest-neighbour index.
+
+The top-K table (neighbors.py) still needs an exact N x N pass over the 5000-
+dimension TF-IDF vectors to build, which is fine for TMDB-5000 and not for a
+catalog of 100k+ movies. This module reduces TF-IDF to dense embeddings with a
+truncated SVD (128 float32 dimensions by default, L2-normalised) and indexes
+them with an inverted file (IVF): spherical k-means cells, each holding the
+rows assigned to it. A query scores the `nprobe` nearest cells' rows exactly
+and keeps the best k, so only a fraction of the catalog is touched per
+request and nothing N x N is ever built.
+
+Layout (written next to the other artifacts, copied into the bundle):
+    ann_embeddings.npy     float32 [N, D]    unit-length SVD embeddings
+    ann_components.npy     float32 [D, V]    SVD basis (projects new TF-IDF rows)
+    ann_centroids.npy      float32 [L, D]    IVF cell centroids
+    ann_order.npy          int32   [N]       rows grouped by cell
+    ann_offsets.npy        int64   [L + 1]   cell c is order[offsets[c]:offsets[c+1]]
+
+Reads from   artifacts/tfidf_matrix.npz   (python build_artifacts.py)
+
+    python ann.py                          # build with 128 dims, sqrt(N) cells
+    python ann.py --dim 64 --lists 512
+    python ann.py --report                 # recall@50 vs exact cosine per nprobe
+
+The backend serves from it with CONTENT_MODE=ann (ANN_NPROBE cells per query).
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+ARRAYS = ("ann_embeddings", "ann_components", "ann_centroids", "ann_order", "ann_offsets")
+DEFAULT_DIM = 128
+DEFAULT_NPROBE = 8
+
+
+def _normalise(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def svd_embeddings(vectors, dim=DEFAULT_DIM, seed=0):
+    """(embeddings [N, dim], components [dim, V]) of a TF-IDF matrix via truncated SVD."""
+    from sklearn.decomposition import TruncatedSVD
+
+    dim = max(1, min(dim, vectors.shape[1] - 1, vectors.shape[0] - 1))
+    svd = TruncatedSVD(n_components=dim, algorithm="randomized", random_state=seed)
+    reduced = svd.fit_transform(vectors)
+    return _normalise(reduced), svd.components_.astype(np.float32)
+
+
+def project(vectors, components):
+    """Embed new TF-IDF rows with an existing SVD basis."""
+    return _normalise(np.asarray(vectors @ components.T))
+
+
+def _assign(embeddings, centroids, block_rows=8192):
+    cells = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), block_rows):
+        cells[start:start + block_rows] = np.argmax(embeddings[start:start + block_rows] @ centroids.T, axis=1)
+    return cells
+
+
+def _kmeans(embeddings, n_lists, iters=12, seed=0, sample=256):
+    """Spherical k-means (cosine) on at most `sample` points per cell."""
+    rng = np.random.default_rng(seed)
+    n = len(embeddings)
+    train = embeddings[rng.choice(n, min(n, n_lists * sample), replace=False)]
+    centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+    for _ in range(iters):
+        cells = _assign(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, cells, train)
+        empty = np.bincount(cells, minlength=n_lists) == 0
+        # Re-seed empty cells from random training points so no list stays unused.
+        sums[empty] = train[rng.choice(len(train), int(empty.sum()))]
+        centroids = _normalise(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file cosine index over unit-length embeddings."""
+
+    def __init__(self, embeddings, centroids, order, offsets, nprobe=DEFAULT_NPROBE):
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, seed=0, nprobe=DEFAULT_NPROBE):
+        n = len(embeddings)
+        n_lists = max(1, min(n_lists or int(np.sqrt(n)), n))
+        centroids = _kmeans(embeddings, n_lists, seed=seed)
+        cells = _assign(embeddings, centroids)
+        order = np.argsort(cells, kind="stable").astype(np.int32)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=n_lists), out=offsets[1:])
+        return cls(embeddings, centroids, order, offsets, nprobe)
+
+    @classmethod
+    def from_artifacts(cls, artifacts, nprobe=DEFAULT_NPROBE):
+        return cls(artifacts['ann_embeddings'], artifacts['ann_centroids'],
+                   artifacts['ann_order'], artifacts['ann_offsets'], nprobe)
+
+    def search(self, query, k, nprobe=None, exclude=-1):
+        """(rows, scores) of the k best rows for a unit query vector, best first."""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        cell_scores = self.centroids @ query
+        cells = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in cells])
+        rows = rows[rows != exclude]
+        scores = self.embeddings[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order].astype(np.int32), scores[order]
+
+    def neighbours(self, row, k, nprobe=None):
+        """Content neighbours of a catalog movie, the movie itself left out."""
+        return self.search(np.asarray(self.embeddings[row], dtype=np.float32), k, nprobe, exclude=row)
+
+
+def save(arrays, directory="artifacts"):
+    for name in ARRAYS:
+        np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+
+
+def load(directory="artifacts"):
+    """Dict of the ann_* arrays (memory-mapped), or None if they haven't been built."""
+    paths = {name: os.path.join(directory, f"{name}.npy") for name in ARRAYS}
+    if not all(os.path.exists(p) for p in paths.values()):
+        return None
+    return {name: np.load(path, mmap_mode='r') for name, path in paths.items()}
+
+
+def build(vectors, dim=DEFAULT_DIM, n_lists=None, seed=0):
+    """All ann_* arrays for a TF-IDF matrix."""
+    embeddings, components = svd_embeddings(vectors, dim, seed)
+    index = IVFIndex.build(embeddings, n_lists, seed)
+    return {'ann_embeddings': embeddings, 'ann_components': components,
+            'ann_centroids': index.centroids, 'ann_order': index.order, 'ann_offsets': index.offsets}
+
+
+def recall_report(vectors, arrays, k=50, nprobes=(1, 2, 4, 8, 16, 32), sample=200, seed=0):
+    """Recall@k of the SVD embeddings and the IVF index against exact TF-IDF cosine.
+
+    Returns one dict per nprobe; the last row probes every cell, i.e. exact
+    search over the embeddings, so it isolates the loss from the SVD itself.
+    """
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    k = min(k, n - 1)
+    queries = rng.choice(n, min(sample, n), replace=False)
+
+    exact = (vectors[queries] @ vectors.T)
+    exact = exact.toarray() if hasattr(exact, 'toarray') else np.asarray(exact)
+    exact[np.arange(len(queries)), queries] = -np.inf
+    truth = [set(np.argpartition(-row, k - 1)[:k].tolist()) for row in exact]
+
+    index = IVFIndex.from_artifacts(arrays)
+    n_lists = len(index.centroids)
+    sizes = np.diff(index.offsets)
+    probe_order = np.argsort(-(np.asarray(index.embeddings[queries]) @ index.centroids.T), axis=1)
+    results = []
+    for nprobe in sorted({p for p in nprobes if p < n_lists} | {n_lists}):
+        start = time.perf_counter()
+        found = [index.neighbours(q, k, nprobe)[0] for q in queries]
+        elapsed = time.perf_counter() - start
+        hits = [len(truth_q & set(rows.tolist())) for truth_q, rows in zip(truth, found)]
+        results.append({
+            "nprobe": nprobe,
+            "scanned": float(sizes[probe_order[:, :nprobe]].sum(axis=1).mean()) / n,
+            "recall": float(np.mean(hits)) / k,
+            "ms_per_query": elapsed / len(queries) * 1000,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build SVD content embeddings and an IVF index.")
+    parser.add_argument("--src", default="artifacts", help="directory holding tfidf_matrix.npz")
+    parser.add_argument("--dst", default=None, help="output directory (defaults to --src)")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM, help="embedding dimensions")
+    parser.add_argument("--lists", type=int, default=None, help="IVF cells (default sqrt(N))")
+    parser.add_argument("--report", action="store_true", help="print recall@50 vs exact cosine")
+    parser.add_argument("--sample", type=int, default=200, help="query movies for --report")
+    args = parser.parse_args()
+    dst = args.dst or args.src
+    os.makedirs(dst, exist_ok=True)
+
+    from scipy.sparse import load_npz
+    vectors = load_npz(os.path.join(args.src, "tfidf_matrix.npz")).tocsr()
+
+    start = time.perf_counter()
+    arrays = build(vectors, args.dim, args.lists)
+    save(arrays, dst)
+    n, dim = arrays['ann_embeddings'].shape
+    index_mb = sum(arrays[name].nbytes for name in ARRAYS if name != 'ann_components') / 1e6
+    print(f"{n} movies x {dim} dims, {len(arrays['ann_centroids'])} cells: "
+          f"{index_mb:.1f} MB index (dense N x N would be {n * n * 8 / 1e6:.0f} MB), "
+          f"built in {time.perf_counter() - start:.1f}s")
+
+    if args.report:
+        print(f"\n{'nprobe':>7} {'scanned':>8} {'recall@50':>10} {'ms/query':>9}")
+        for r in recall_report(vectors, arrays, sample=args.sample):
+            print(f"{r['nprobe']:>7} {r['scanned']:>7.1%} {r['recall']:>10.3f} {r['ms_per_query']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
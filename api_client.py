@@ -0,0 +1,112 @@
+"""
+api_client.py
+-------------
+Shared HTTP layer for the Streamlit frontends (frontend.py, frontend_v2.py).
+
+Streamlit re-runs the whole script on every widget change, so without this
+each slider step or rerun was a fresh TCP connection and a full /recommend
+call, plus one OMDb call per card. One instance per frontend process gives:
+
+  * one pooled keep-alive requests.Session for the backend and OMDb,
+  * a short-lived response cache (cache.TTLCache) shared by every user
+    session, so reruns with unchanged inputs and slider moves back to a seen
+    position cost nothing,
+  * in-flight deduplication: identical concurrent requests (several sessions,
+    or the cards of one page) share a single HTTP call,
+  * debouncing: a rerun whose inputs changed moments after the previous one
+    pauses briefly, so Streamlit can abandon it in favour of the next change,
+  * one shared thread pool for the per-card lookups instead of one per render.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import TTLCache
+
+# Backend responses are only reused briefly (the backend caches too); OMDb data
+# barely changes, so it is kept for an hour like the old st.cache_data.
+BACKEND_TTL = float(os.getenv("CLIENT_CACHE_TTL", "30"))
+OMDB_TTL = 3600.0
+DEBOUNCE_S = float(os.getenv("CLIENT_DEBOUNCE_MS", "300")) / 1000
+ALPHA_GRID = 0.05               # the slider step; matches the backend's CACHE_ALPHA_GRID
+# What the backend puts in poster_url when its poster store has no poster (main._poster_url).
+PLACEHOLDER_POSTER = "https://placehold.co/"
+
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+
+backend_cache = TTLCache(max_entries=1024, ttl=BACKEND_TTL)
+omdb_cache = TTLCache(max_entries=8192, ttl=OMDB_TTL)
+pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="api-client")
+
+
+class _NotOK(Exception):
+    """Non-200 answer: reported as None, and not cached."""
+
+
+def get_json(url, params, cache=backend_cache, timeout=10):
+    """GET url?params as JSON through the shared session and cache; None on any failure."""
+    key = (url, tuple(sorted(params.items())))
+
+    def fetch():
+        r = session.get(url, params=params, timeout=timeout)
+        if r.status_code != 200:
+            raise _NotOK(r.status_code)
+        return r.json()
+
+    try:
+        return cache.get_or_compute(key, fetch)
+    except (_NotOK, requests.RequestException, ValueError):
+        return None
+
+
+def recommend(api_url, title, genre, alpha):
+    alpha = round(round(alpha / ALPHA_GRID) * ALPHA_GRID, 6)
+    return get_json(api_url, {"title": title.strip(), "alpha": alpha, "genre": genre})
+
+
+def suggest(api_url, query, limit=8):
+    """Typeahead titles for a partial query from the backend's /suggest; [] if unavailable."""
+    base = api_url.rsplit("/", 1)[0]
+    data = get_json(f"{base}/suggest", {"q": query.strip(), "limit": limit})
+    return [s["title"] for s in data["suggestions"]] if data else []
+
+
+def omdb(url, api_key, title):
+    """Raw OMDb JSON for a title (None on failure), cached for OMDB_TTL."""
+    return get_json(url, {"t": title, "apikey": api_key}, cache=omdb_cache, timeout=5)
+
+
+def is_placeholder(poster_url):
+    """True if a card's poster_url is the backend's stand-in, not a prefetched poster."""
+    return not poster_url or poster_url.startswith(PLACEHOLDER_POSTER)
+
+
+def settle(state, inputs, delay=DEBOUNCE_S):
+    """
+    Debounce a rerun. `state` is st.session_state and `inputs` the request
+    parameters of this rerun. If they changed within `delay` of the previous
+    rerun (a slider drag, fast typing), wait out the delay. Returns True if it
+    waited; the caller then makes any Streamlit call, which is where Streamlit
+    abandons the run if a newer one arrived meanwhile.
+    """
+    now = time.monotonic()
+    previous, at = state.get("_client_inputs"), state.get("_client_inputs_at", 0.0)
+    state["_client_inputs"], state["_client_inputs_at"] = inputs, now
+    if previous is None or previous == inputs or now - at > delay:
+        return False
+    time.sleep(delay)
+    return True
+
+
+def map_parallel(func, items):
+    return list(pool.map(func, items))
+
+
+def stats():
+    return {"backend": backend_cache.stats(), "omdb": omdb_cache.stats()}
@@ -0,0 +1,15 @@
+"""
+benchmarks
+----------
+Throughput, latency and memory benchmarks for the backend.
+
+    synth.py        synthetic artifact sets (5k / 50k / 500k movies) in the shapes lifespan loads
+    micro.py        microbenchmarks of the hot-path functions (candidates, CF lookup, rescoring, ...)
+    load.py         end-to-end load driver against a uvicorn-served app
+    startup.py      cold start and RSS of the bundle vs the legacy pickle load path
+    exec_modes.py   thread vs process execution mode, side by side
+    report.py       runs all of the above per size and writes / compares JSON reports
+
+Run as modules from the repo root, e.g.:
+    python -m benchmarks.report --sizes 5k 50k
+"""
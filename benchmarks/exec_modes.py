@@ -0,0 +1,45 @@
+"""
+benchmarks/exec_modes.py
+------------------------
+Throughput of /recommend with EXECUTION_MODE=thread vs EXECUTION_MODE=process.
+
+Starts the backend once per mode (benchmarks.load: rate limit and caches off,
+so every request does the full resolve + rescore work), drives it with
+concurrent clients for a fixed time, and prints requests/second and latency
+percentiles side by side.
+
+    python -m benchmarks.exec_modes                          # artifacts/bundle
+    python -m benchmarks.exec_modes --size 50k --concurrency 32 --duration 20 --process-workers 4
+"""
+import argparse
+import os
+
+from benchmarks import load, synth
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare thread vs process execution modes.")
+    parser.add_argument("--size", default=None, help="serve a synthetic set (5k / 50k / 500k) instead")
+    parser.add_argument("--bundle", default=os.getenv("ARTIFACT_BUNDLE", os.path.join("artifacts", "bundle")))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mode")
+    parser.add_argument("--process-workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    bundle_dir = os.path.join(synth.ensure(args.size), "bundle") if args.size else args.bundle
+    results = {
+        mode: load.run(bundle_dir, args.concurrency, args.duration, args.port,
+                       env={"EXECUTION_MODE": mode, "PROCESS_WORKERS": str(args.process_workers)})
+        for mode in ("thread", "process")
+    }
+
+    print(f"\n{'mode':<8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<8} {r['rps']:>8.1f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+    print(f"\nprocess / thread throughput: {results['process']['rps'] / results['thread']['rps']:.2f}x "
+          f"({args.process_workers} workers, {args.concurrency} clients)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+benchmarks/load.py
+------------------
+End-to-end load driver: starts the backend with uvicorn on a bundle, replays a
+realistic query mix with concurrent clients and reports throughput, latency
+percentiles, startup time and the server's peak RSS.
+
+Query mix (per request):
+    50%  exact catalog titles
+    30%  typo'd titles (one dropped or swapped character -> fuzzy path)
+    20%  cold start: half empty titles, half titles that match nothing
+and independently 30% of requests carry a genre filter. Rate limiting is off;
+the result and title caches are off too unless --cache is given, so by
+default every request does the full resolve + rescore work.
+
+    python -m benchmarks.load --size 50k --concurrency 16 --duration 20
+    python -m benchmarks.load --bundle artifacts/bundle --cache
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+import bundle
+from benchmarks import synth
+from benchmarks.micro import typo
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GENRES = ["Drama", "Comedy", "Action", "Thriller", "Horror", "Action,Comedy"]
+
+
+def queries(titles, n, seed=0):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.5:
+            title = rng.choice(titles)
+        elif kind < 0.8:
+            title = typo(rng.choice(titles), rng)
+        elif kind < 0.9:
+            title = ""
+        else:
+            title = "".join(rng.choice("qxzjvkw") for _ in range(rng.randint(6, 14)))
+        genre = rng.choice(GENRES) if rng.random() < 0.3 else "All"
+        out.append({"title": title, "alpha": round(rng.random(), 2), "genre": genre})
+    return out
+
+
+def wait_ready(url, server, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"backend exited with code {server.returncode} during startup")
+        try:
+            if requests.get(url, timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"backend at {url} did not come up within {timeout}s")
+
+
+def peak_rss_mb(pid):
+    """VmHWM of a process (Linux); NaN elsewhere."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1e3
+    except OSError:
+        pass
+    return float("nan")
+
+
+def drive(base_url, params, concurrency, duration):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(offset):
+        session = requests.Session()
+        mine, failed = [], 0
+        i = offset
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            response = session.get(f"{base_url}/recommend", params=params[i % len(params)], timeout=60)
+            if response.ok:
+                mine.append(time.perf_counter() - start)
+            else:
+                failed += 1
+            i += concurrency
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    lat_ms = np.array(latencies or [float("nan")]) * 1000
+    return {"requests": len(latencies), "errors": errors[0], "rps": len(latencies) / duration,
+            "p50_ms": float(np.percentile(lat_ms, 50)), "p99_ms": float(np.percentile(lat_ms, 99))}
+
+
+def run(bundle_dir, concurrency=16, duration=10.0, port=8765, cache=False, env=None, n_queries=5000):
+    """Start a backend on `bundle_dir`, warm it up, drive it, stop it. Returns the measurements."""
+    titles = bundle.open_bundle(bundle_dir)['titles']
+    params = queries(titles, n_queries)
+
+    server_env = dict(os.environ, ARTIFACT_BUNDLE=os.path.abspath(bundle_dir),
+                      ARTIFACT_VERSIONS=os.path.join(os.path.abspath(bundle_dir), "no-versions"),
+                      RATE_LIMIT_ENABLED="0",
+                      PYTHONPATH=REPO + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    if not cache:
+        server_env.update(RESULT_CACHE_SIZE="0", TITLE_CACHE_SIZE="0")
+    server_env.update(env or {})
+
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                               "--log-level", "warning"], env=server_env, cwd=REPO,
+                              stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(f"{base_url}/readyz", server)
+        startup_s = time.perf_counter() - start
+        drive(base_url, params[:200], concurrency, min(2.0, duration))        # warm-up
+        result = drive(base_url, params, concurrency, duration)
+        result.update(startup_s=startup_s, peak_rss_mb=peak_rss_mb(server.pid))
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the backend with a realistic query mix.")
+    parser.add_argument("--size", default="5k", help="synthetic set: 5k / 50k / 500k or a movie count")
+    parser.add_argument("--bundle", default=None, help="bundle directory to serve instead of a synthetic set")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of measured load")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache", action="store_true", help="leave the result / title caches on")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a summary")
+    args = parser.parse_args()
+
+    bundle_dir = args.bundle or os.path.join(synth.ensure(args.size), "bundle")
+    result = run(bundle_dir, args.concurrency, args.duration, args.port, args.cache)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['rps']:.1f} req/s, p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, "
+          f"{result['errors']} errors | startup {result['startup_s']:.2f}s, peak RSS {result['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+benchmarks/micro.py
+-------------------
+Microbenchmarks of the request hot path, in-process, on a synthetic set.
+
+Each case runs against a fixed random sample of movies and reports the median
+time per call over several repeats:
+
+    candidates        top-50 content neighbours (scoring.candidates), no genre
+    candidates_genre  same with a genre filter over the whole K row
+    cf_pair           one CF lookup by tmdb id pair (scoring.cf_scores, one candidate)
+    cf_scores         CF scores of 50 candidates against one base movie
+    rescore           blend + sort of 50 candidates (scoring.rescore)
+    rank              candidates + rescore, what /recommend runs per miss
+    rescore_batch     128 base movies at once, per movie
+    resolve_exact     exact title lookup
+    resolve_fuzzy     typo'd title: trigram shortlist + token_sort_ratio
+    suggest           typeahead on a 1-8 character title prefix
+    profile           10-seed taste profile (scoring.rank_profile)
+
+    python -m benchmarks.micro --size 50k
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+import bundle
+import scoring
+import workers
+from benchmarks import synth
+
+
+def _time_per_call(func, calls, repeats=5):
+    """Median seconds per call of func(i) over `repeats` passes of `calls` calls."""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(calls):
+            func(i)
+        samples.append((time.perf_counter() - start) / calls)
+    return float(np.median(samples))
+
+
+def typo(title, rng):
+    if len(title) < 5:
+        return title
+    i = rng.randrange(1, len(title) - 1)
+    return title[:i] + title[i + 1:] if rng.random() < 0.5 else title[:i] + title[i + 1] + title[i] + title[i + 2:]
+
+
+def run(arts, calls=200, seed=0):
+    """{case: microseconds per call}."""
+    rng = random.Random(seed)
+    n = len(arts['titles'])
+    rows = [rng.randrange(n) for _ in range(calls)]
+    tmdb_ids = arts['tmdb_ids']
+    pairs = [(int(tmdb_ids[rng.randrange(n)]), int(tmdb_ids[rng.randrange(n)])) for _ in range(calls)]
+    genre = "Drama" if "Drama" in arts['genre_vocab'] else next(iter(arts['genre_vocab']))
+    exact = [arts['titles'][r] for r in rows]
+    fuzzy = [typo(t, rng) for t in exact]
+    prefixes = [t[:rng.randint(1, 8)] for t in exact]
+    cands = [scoring.candidates(arts, r, 50) for r in rows]
+    seeds = [rng.sample(range(n), 10) for _ in range(calls // 10 or 1)]
+
+    def cf_pair(i):
+        tmdb_rows = arts['tmdb_rows']
+        a, b = pairs[i]
+        if a in tmdb_rows and b in tmdb_rows:
+            scoring.cf_scores(arts, tmdb_rows[a], [tmdb_rows[b]])
+
+    batch_rows = np.array(rows[:128] * (128 // len(rows[:128]) + 1))[:128]
+    cases = {
+        "candidates": (lambda i: scoring.candidates(arts, rows[i], 50), calls),
+        "candidates_genre": (lambda i: scoring.candidates(arts, rows[i], 50, genre), calls),
+        "cf_pair": (cf_pair, calls),
+        "cf_scores": (lambda i: scoring.cf_scores(arts, rows[i], cands[i][0]), calls),
+        "rescore": (lambda i: scoring.rescore(arts, rows[i], cands[i][0], cands[i][1], 0.45), calls),
+        "rank": (lambda i: workers.rank(rows[i], 0.45, artifacts=arts), calls),
+        "resolve_exact": (lambda i: arts['title_index'].resolve(exact[i]), calls),
+        "resolve_fuzzy": (lambda i: arts['title_index'].resolve(fuzzy[i]), calls),
+        "suggest": (lambda i: arts['suggest_index'].suggest(prefixes[i]), calls),
+        "profile": (lambda i: scoring.rank_profile(arts, seeds[i], [1.0] * 10, 0.45), len(seeds)),
+    }
+    results = {name: _time_per_call(func, count) * 1e6 for name, (func, count) in cases.items()}
+    results["rescore_batch"] = _time_per_call(
+        lambda i: scoring.rescore_batch(arts, batch_rows, [0.45] * 128, ["All"] * 128), 5) * 1e6 / 128
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the recommendation hot path.")
+    parser.add_argument("--size", default="5k", help="synthetic set: 5k / 50k / 500k or a movie count")
+    parser.add_argument("--bundle", default=None, help="bundle directory to use instead of a synthetic set")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    bundle_dir = args.bundle or os.path.join(synth.ensure(args.size), "bundle")
+    start = time.perf_counter()
+    arts = bundle.load_serving(bundle_dir)
+    load_s = time.perf_counter() - start
+    results = run(arts, args.calls)
+    if args.json:
+        print(json.dumps({"load_s": load_s, "us_per_call": results}, indent=2))
+        return
+    print(f"{len(arts['titles'])} movies, loaded in {load_s:.2f}s\n")
+    print(f"{'case':<18} {'us/call':>10}")
+    for name, us in results.items():
+        print(f"{name:<18} {us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+benchmarks/report.py
+--------------------
+One benchmark report per commit: for each catalog size, bundle load time,
+cold start / RSS per load path, the microbenchmarks, and an end-to-end load
+run (req/s, p50/p99, startup time, peak RSS). Results go to
+benchmarks/results/<commit>.json so two commits can be compared side by side.
+
+    python -m benchmarks.report --sizes 5k 50k
+    python -m benchmarks.report --sizes 500k --duration 30 --concurrency 32
+    python -m benchmarks.report --compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+import bundle
+from benchmarks import load, micro, startup, synth
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=load.REPO, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_size(size, concurrency, duration, calls, port):
+    data_dir = synth.ensure(size)
+    bundle_dir = os.path.join(data_dir, "bundle")
+    print(f"[{size}] cold start per load path...")
+    cold = startup.run(data_dir)
+    start = time.perf_counter()
+    arts = bundle.load_serving(bundle_dir)
+    load_s = time.perf_counter() - start
+    print(f"[{size}] {len(arts['titles'])} movies, bundle loaded in {load_s:.2f}s; microbenchmarks...")
+    us_per_call = micro.run(arts, calls)
+    del arts
+    print(f"[{size}] load test: {concurrency} clients for {duration:.0f}s...")
+    return {"movies": synth.parse_size(size), "bundle_load_s": load_s, "startup": cold, "micro_us": us_per_call,
+            "load": load.run(bundle_dir, concurrency, duration, port)}
+
+
+def _rows(report):
+    """Flatten a report into {(size, metric): value}."""
+    rows = {}
+    for size, r in report["sizes"].items():
+        rows[(size, "bundle_load_s")] = r["bundle_load_s"]
+        for path, cold in r.get("startup", {}).items():
+            for name in ("load_s", "rss_mb", "peak_rss_mb"):
+                rows[(size, f"{path} {name}")] = cold[name]
+        for name, value in r["micro_us"].items():
+            rows[(size, f"{name} us")] = value
+        for name in ("rps", "p50_ms", "p99_ms", "startup_s", "peak_rss_mb", "errors"):
+            rows[(size, name)] = r["load"][name]
+    return rows
+
+
+def print_report(report):
+    print(f"\ncommit {report['commit'] or '?'}  {report['timestamp']}  {report['machine']['processor']}")
+    for (size, name), value in _rows(report).items():
+        print(f"  {size:<6} {name:<22} {value:>12.2f}")
+
+
+def compare(a, b):
+    rows_a, rows_b = _rows(a), _rows(b)
+    print(f"{'size':<6} {'metric':<22} {a['commit'] or 'a':>12} {b['commit'] or 'b':>12} {'change':>8}")
+    for key in [k for k in rows_a if k in rows_b]:
+        old, new = rows_a[key], rows_b[key]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else ""
+        print(f"{key[0]:<6} {key[1]:<22} {old:>12.2f} {new:>12.2f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and write a JSON report.")
+    parser.add_argument("--sizes", nargs="+", default=["5k", "50k"], help="5k / 50k / 500k or movie counts")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per size")
+    parser.add_argument("--calls", type=int, default=200, help="calls per microbenchmark pass")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", default=None, help="report path (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved reports")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            compare(json.load(f_old), json.load(f_new))
+        return
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    if commit and _git("status", "--porcelain", "--untracked-files=no"):
+        commit += "-dirty"
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "processor": platform.processor() or platform.machine(), "cpus": os.cpu_count()},
+        "sizes": {size: run_size(size, args.concurrency, args.duration, args.calls, args.port)
+                  for size in args.sizes},
+    }
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{commit or 'report'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\nWrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+benchmarks/startup.py
+---------------------
+Cold start and memory of loading the serving artifacts, per load path.
+
+Each measurement runs in a fresh interpreter, which imports the backend's
+loading code and calls bundle.load_serving once. It reports import and load
+time, resident and peak RSS, and whether pandas ended up imported:
+
+    bundle    the memory-mapped columnar bundle (the normal path)
+    pickles   the legacy movies_df.pkl path (no bundle)
+
+    python -m benchmarks.startup --size 50k
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks import synth
+from benchmarks.load import REPO
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import bundle
+imported = time.perf_counter()
+arts = bundle.load_serving(sys.argv[1], sys.argv[2])
+loaded = time.perf_counter()
+status = dict(line.split(":", 1) for line in open("/proc/self/status") if ":" in line)
+print(json.dumps({
+    "import_s": imported - start,
+    "load_s": loaded - imported,
+    "rss_mb": int(status["VmRSS"].split()[0]) / 1e3,
+    "peak_rss_mb": int(status["VmHWM"].split()[0]) / 1e3,
+    "pandas_imported": "pandas" in sys.modules,
+    "movies": len(arts["titles"]),
+}))
+"""
+
+
+def measure(bundle_dir, legacy_dir):
+    env = dict(os.environ, PYTHONPATH=REPO + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    out = subprocess.run([sys.executable, "-c", PROBE, bundle_dir, legacy_dir], env=env, cwd=REPO,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run(data_dir):
+    return {
+        "bundle": measure(os.path.join(data_dir, "bundle"), data_dir),
+        "pickles": measure(os.path.join(data_dir, "no-bundle"), data_dir),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start and RSS of each artifact load path.")
+    parser.add_argument("--size", default="5k", help="synthetic set: 5k / 50k / 500k or a movie count")
+    parser.add_argument("--data", default=None, help="artifact directory (with bundle/) instead of a synthetic set")
+    args = parser.parse_args()
+
+    results = run(args.data or synth.ensure(args.size))
+    print(f"{'path':<8} {'import s':>9} {'load s':>8} {'RSS MB':>8} {'peak MB':>8}  pandas")
+    for path, r in results.items():
+        print(f"{path:<8} {r['import_s']:>9.2f} {r['load_s']:>8.2f} {r['rss_mb']:>8.0f} "
+              f"{r['peak_rss_mb']:>8.0f}  {'yes' if r['pandas_imported'] else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
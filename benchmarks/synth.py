@@ -0,0 +1,226 @@
+"""
+benchmarks/synth.py
+-------------------
+Synthetic artifact sets at catalog sizes the committed stubs can't show.
+
+Writes the same files the backend loads -- movies_df.pkl, the top-K content
+table, movie_similarity.npy (CF, CSR in a 0-d object array), tmdb_to_ml.pkl,
+movie_id_search.pkl, trending.pkl -- plus the mmap bundle built from them, so
+both load paths can be measured. The shapes and distributions follow the real
+data rather than uniform noise:
+
+  * movies fall into topical clusters; content neighbours are the top K by
+    cosine of clustered embeddings (computed per cluster, so 500k stays cheap),
+  * genres come from the 20 TMDB genres, skewed towards each cluster's own,
+  * vote_count is heavy-tailed, vote_average roughly normal around 6.2,
+  * ~80% of movies have MovieLens ids and a CF row; CF neighbours are mostly
+    from the same cluster, like co-rating patterns,
+  * titles are 1-4 words drawn from a Zipf-weighted synthetic vocabulary, so
+    they collide and share words the way real titles do.
+
+    python -m benchmarks.synth --size 50k                  # -> benchmarks/data/50k/
+    python -m benchmarks.synth --size 500k --out /tmp/synth500k --ann
+"""
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+import ann
+import bundle
+import neighbors
+import scoring
+
+SIZES = {"5k": 5_000, "50k": 50_000, "500k": 500_000}
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+GENRES = ["Drama", "Comedy", "Thriller", "Action", "Romance", "Adventure", "Crime", "Science Fiction",
+          "Horror", "Family", "Fantasy", "Mystery", "Animation", "History", "Music", "War",
+          "Documentary", "Western", "Foreign", "TV Movie"]
+GENRE_WEIGHTS = np.array([20, 15, 11, 10, 8, 7, 6, 5, 5, 4, 4, 3, 2, 2, 2, 1.5, 1, 1, 0.5, 0.5])
+SYLLABLES = ["ka", "ro", "mi", "ta", "ne", "lo", "shi", "var", "den", "ar", "el", "on", "us", "tor",
+             "bra", "cy", "dra", "fen", "gal", "hu", "in", "jo", "kel", "lu", "mor", "ny", "ost"]
+
+
+def parse_size(text):
+    return SIZES.get(text) or int(text)
+
+
+def _vocabulary(rng, n_words=3000):
+    words = set()
+    while len(words) < n_words:
+        words.add("".join(rng.choice(SYLLABLES, rng.integers(1, 4))).capitalize())
+    return sorted(words)
+
+
+def _titles(rng, n):
+    vocab = np.array(_vocabulary(rng))
+    weights = 1.0 / np.arange(1, len(vocab) + 1)
+    weights /= weights.sum()
+    lengths = rng.choice([1, 2, 3, 4], size=n, p=[0.25, 0.4, 0.25, 0.1])
+    words = rng.choice(vocab, size=(n, 4), p=weights)
+    titles = [" ".join(row[:length]) for row, length in zip(words.tolist(), lengths.tolist())]
+    # A few fixed titles so benchmark queries always have known exact hits.
+    for i, title in enumerate(["Inception", "The Dark Knight", "Spider-Man", "Iron Man"][:n]):
+        titles[i] = title
+    return titles
+
+
+def _genres(rng, clusters, n_clusters):
+    p = GENRE_WEIGHTS / GENRE_WEIGHTS.sum()
+    home = np.stack([rng.choice(len(GENRES), 2, replace=False, p=p) for _ in range(n_clusters)])
+    genres = []
+    extra_counts = rng.choice([0, 1, 2], size=len(clusters), p=[0.45, 0.4, 0.15])
+    extras = rng.choice(len(GENRES), size=(len(clusters), 2), p=p)
+    keep_home = rng.random((len(clusters), 2)) < 0.7
+    for row, cluster in enumerate(clusters.tolist()):
+        codes = {int(g) for g, keep in zip(home[cluster], keep_home[row]) if keep}
+        codes.update(int(g) for g in extras[row, :extra_counts[row]])
+        genres.append([GENRES[g] for g in sorted(codes)] or [GENRES[int(home[cluster, 0])]])
+    return genres
+
+
+def _content_table(rng, clusters, n_clusters, k, dim=32):
+    """Exact top-k cosine neighbours within each cluster of noisy clustered embeddings."""
+    n = len(clusters)
+    centres = rng.normal(size=(n_clusters, dim))
+    embeddings = centres[clusters] + rng.normal(scale=2.0, size=(n, dim))
+    embeddings = (embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)).astype(np.float32)
+
+    idx = np.zeros((n, k), dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float16)
+    for cluster in range(n_clusters):
+        members = np.flatnonzero(clusters == cluster)
+        kc = min(k, len(members) - 1)
+        if kc > 0:
+            block = embeddings[members] @ embeddings[members].T
+            local, local_scores = neighbors._topk_rows(block, 0, kc)
+            idx[members, :kc] = members[local]
+            scores[members, :kc] = local_scores
+        if kc < k:
+            # Tiny catalogs only: pad with unrelated movies at score 0.
+            idx[members, kc:] = (members[:, None] + rng.integers(1, n, size=(len(members), k - kc))) % n
+    return idx, scores, embeddings
+
+
+def _cf_matrix(rng, clusters, cf_rows, k=50):
+    """Item-item CF similarity as CSR, neighbours mostly from the same cluster."""
+    cf_movies = np.flatnonzero(cf_rows >= 0)
+    n_cf = len(cf_movies)
+    cf_clusters = clusters[cf_movies]
+    order = np.argsort(cf_clusters, kind="stable")
+    bounds = np.searchsorted(cf_clusters[order], np.arange(cf_clusters.max() + 2))
+
+    rows = np.repeat(np.arange(n_cf), k)
+    same = rng.random(n_cf * k) < 0.8
+    own = cf_clusters[rows]
+    start, size = bounds[own], bounds[own + 1] - bounds[own]
+    in_cluster = order[start + (rng.random(n_cf * k) * size).astype(np.int64)]
+    anywhere = rng.integers(0, n_cf, n_cf * k)
+    cols = np.where(same, in_cluster, anywhere)
+    data = (rng.beta(2, 5, n_cf * k) * np.where(same, 1.0, 0.4)).astype(np.float32)
+
+    keep = rows != cols
+    to_cf = cf_rows[cf_movies]                    # position in cf_movies -> CF matrix row
+    matrix = csr_matrix((data[keep], (to_cf[rows[keep]], to_cf[cols[keep]])), shape=(n_cf, n_cf))
+    matrix.sum_duplicates()
+    np.minimum(matrix.data, 1.0, out=matrix.data)
+    return matrix
+
+
+def generate(n, out_dir, k=neighbors.DEFAULT_K, seed=0, with_ann=False, version=None):
+    """Write a synthetic artifact set of `n` movies to out_dir (+ out_dir/bundle). Returns timings."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    timings = {}
+    start = time.perf_counter()
+
+    n_clusters = max(1, n // max(1000, 2 * (k + 1)))
+    clusters = rng.integers(0, n_clusters, n)
+    tmdb_ids = rng.choice(np.arange(1, max(2_000_000, 4 * n)), size=n, replace=False).astype(np.int64)
+    vote_count = np.minimum((rng.pareto(1.1, n) * 40).astype(np.int64), 40_000)
+    movies_df = pd.DataFrame({
+        'tmdbId': tmdb_ids,
+        'title': _titles(rng, n),
+        'genres': _genres(rng, clusters, n_clusters),
+        'vote_average': np.clip(rng.normal(6.2, 1.0, n), 1, 10).round(1),
+        'vote_count': vote_count,
+    })
+    timings['catalog_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    idx, scores, embeddings = _content_table(rng, clusters, n_clusters, min(k, n - 1))
+    timings['content_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    has_ml = rng.random(n) < 0.8
+    cf_rows = np.full(n, -1, dtype=np.int64)
+    cf_rows[has_ml] = rng.permutation(int(has_ml.sum()))
+    ml_ids = cf_rows * 3 + 1                      # any injective map will do
+    tmdb_to_ml = {int(t): int(m) for t, m in zip(tmdb_ids[has_ml], ml_ids[has_ml])}
+    movie_id_search = {int(m): int(r) for m, r in zip(ml_ids[has_ml], cf_rows[has_ml])}
+    movie_similarity = _cf_matrix(rng, clusters, cf_rows)
+    timings['cf_s'] = time.perf_counter() - start
+
+    C, m = movies_df['vote_average'].mean(), movies_df['vote_count'].quantile(0.9)
+    qualified = movies_df.loc[movies_df['vote_count'] >= m].copy()
+    v, R = qualified['vote_count'], qualified['vote_average']
+    qualified['score'] = v / (v + m) * R + m / (v + m) * C
+    trending = (qualified.sort_values('score', ascending=False).head(20)
+                [['title', 'tmdbId', 'vote_average', 'genres']].to_dict('records'))
+
+    start = time.perf_counter()
+    for name, obj in (("movies_df.pkl", movies_df), ("tmdb_to_ml.pkl", tmdb_to_ml),
+                      ("movie_id_search.pkl", movie_id_search), ("trending.pkl", trending)):
+        with open(os.path.join(out_dir, name), "wb") as f:
+            pickle.dump(obj, f, protocol=4)
+    neighbors.save(idx, scores, out_dir)
+    wrapper = np.empty((), dtype=object)
+    wrapper[()] = movie_similarity
+    np.save(os.path.join(out_dir, "movie_similarity.npy"), wrapper, allow_pickle=True)
+    if with_ann:
+        index = ann.IVFIndex.build(embeddings)
+        ann.save({'ann_embeddings': embeddings, 'ann_components': np.zeros((embeddings.shape[1], 1), np.float32),
+                  'ann_centroids': index.centroids, 'ann_order': index.order, 'ann_offsets': index.offsets},
+                 out_dir)
+
+    loaded = bundle.load_pickles(out_dir)
+    scoring.prepare(loaded)
+    bundle.write_bundle(loaded, os.path.join(out_dir, "bundle"), version=version or f"synth-{n}")
+    timings['write_s'] = time.perf_counter() - start
+    return timings
+
+
+def ensure(size, k=neighbors.DEFAULT_K, with_ann=False):
+    """Directory of the synthetic set for `size`, generated on first use."""
+    n = parse_size(size)
+    out_dir = os.path.join(DATA_DIR, str(size))
+    if not os.path.exists(os.path.join(out_dir, "bundle", bundle.MANIFEST)):
+        print(f"Generating synthetic artifacts: {n} movies -> {out_dir}")
+        generate(n, out_dir, k=k, with_ann=with_ann)
+    return out_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic artifact set.")
+    parser.add_argument("--size", default="5k", help="5k / 50k / 500k or a movie count")
+    parser.add_argument("--out", default=None, help="output directory (default benchmarks/data/<size>)")
+    parser.add_argument("--k", type=int, default=neighbors.DEFAULT_K, help="content neighbours per movie")
+    parser.add_argument("--ann", action="store_true", help="also write the ann_* arrays (CONTENT_MODE=ann)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    n = parse_size(args.size)
+    out_dir = args.out or os.path.join(DATA_DIR, str(args.size))
+    timings = generate(n, out_dir, k=args.k, seed=args.seed, with_ann=args.ann)
+    size_mb = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(out_dir) for f in files) / 1e6
+    print(f"{n} movies -> {out_dir} ({size_mb:.0f} MB): "
+          + ", ".join(f"{name} {seconds:.1f}" for name, seconds in timings.items()))
+
+
+if __name__ == "__main__":
+    main()
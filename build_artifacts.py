@@ -0,0 +1,402 @@
+"""
+build_artifacts.py
+------------------
+Command-line artifact pipeline: rebuilds everything the backend serves from
+the raw Kaggle CSVs, replacing the notebook run.
+
+    python build_artifacts.py                      # data/ -> artifacts/
+    python build_artifacts.py --data data --out artifacts --k 200
+    python build_artifacts.py --force              # ignore the stage cache
+    python build_artifacts.py --stages cf bundle   # force just these stages
+
+Stages (each reads its inputs from disk, so any of them can be re-run alone):
+
+    movies    tmdb_5000_movies.csv + credits -> movies_df.pkl (stemmed text included)
+    tfidf     movies_df -> tfidf_vectorizer.pkl + tfidf_matrix.npz (sparse, never .toarray())
+    content   tfidf -> content_topk_idx.npy / content_topk_scores.npy (blocked cosine top-K)
+    ann       tfidf -> ann_*.npy (SVD embeddings + IVF index for CONTENT_MODE=ann)
+    ratings   ratings.csv -> user-mean centred CSR (groupby-transform) + movie_id_search.pkl
+    cf        ratings -> movie_similarity.npy (blocked top-K item-item cosine, cf_topk.py)
+    links     links.csv -> tmdb_to_ml.pkl
+    trending  movies_df -> trending.pkl (IMDB weighted rating)
+    bundle    all of the above -> bundle/ (memory-mapped serving format)
+    materialize  bundle -> bundle/materialized/ (top-10 lists over the alpha grid)
+
+A stage is skipped when its fingerprint -- the source of its build function and
+of the modules / helpers it calls, parameters, input file sizes / mtimes and
+upstream fingerprints -- matches the last successful build
+recorded in <out>/.build/state.json. Time, RSS and peak RSS are reported for
+every stage.
+
+Needs the build-only extra:  pip install nltk
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import ann
+import bundle
+import catalog
+import cf_topk
+import materialize
+import neighbors
+import scoring
+import suggest
+import title_index
+
+STATE_FILE = os.path.join(".build", "state.json")
+
+
+# --------------------------------------------------------------- memory
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        return float("nan")
+
+
+def _reset_peak():
+    # Linux only: "5" resets VmHWM so each stage reports its own peak.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1e3
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+    except ImportError:
+        return float("nan")
+
+
+# --------------------------------------------------------------- text
+def _names(column, key="name", limit=None, squash=True):
+    """Parse a TMDB JSON column into lists of names ("Science Fiction" -> "sciencefiction")."""
+    def parse(raw):
+        names = [item[key] for item in json.loads(raw)[:limit]]
+        return [n.replace(" ", "").lower() for n in names] if squash else names
+    return column.map(parse)
+
+
+def _director(raw):
+    for person in json.loads(raw):
+        if person['job'] == 'Director':
+            return [person['name'].replace(" ", "").lower()]
+    return []
+
+
+def stem_texts(texts):
+    """Porter-stem every word; each distinct word is stemmed once."""
+    from nltk.stem.porter import PorterStemmer
+    stem = PorterStemmer().stem
+    cache = {}
+
+    def stem_text(text):
+        out = []
+        for word in text.lower().split():
+            if word not in cache:
+                cache[word] = stem(word)
+            out.append(cache[word])
+        return " ".join(out)
+    return [stem_text(t) for t in texts]
+
+
+def prepare_movies(movies, credits):
+    """Raw TMDB movies + credits frames -> the movies_df the backend and TF-IDF use."""
+    df = movies.merge(credits, on='title')
+    df = df[['genres', 'keywords', 'overview', 'title', 'movie_id', 'cast', 'crew',
+             'production_companies', 'vote_average', 'vote_count']].dropna()
+
+    genres = _names(df['genres'], squash=False)
+    keywords = _names(df['keywords'])
+    cast = _names(df['cast'], limit=3)
+    director = df['crew'].map(_director)
+    companies = _names(df['production_companies'])
+
+    join = " ".join
+    # Genres and director weighted x2, as in the notebook.
+    final_text = ((genres.map(join) + " ") * 2 + (director.map(join) + " ") * 2
+                  + cast.map(join) + " " + keywords.map(join) + " " + df['overview'].str.lower() + " ")
+
+    out = pd.DataFrame({
+        'tmdbId': df['movie_id'].astype(np.int64),
+        'title': df['title'],
+        'final_text': final_text,
+        'company_set': companies.map(join),
+        'genres': genres,
+        'vote_average': df['vote_average'],
+        'vote_count': df['vote_count'],
+    })
+    out = out.drop_duplicates(subset='tmdbId', keep='first').reset_index(drop=True)
+    out['final_text_nltk'] = stem_texts(out['final_text'] + (out['title'] + " ") + out['company_set'])
+    return out
+
+
+# --------------------------------------------------------------- stages
+def stage_movies(ctx):
+    movies = pd.read_csv(ctx.data("tmdb_5000_movies.csv"))
+    credits = pd.read_csv(ctx.data("tmdb_5000_credits.csv"))
+    movies_df = prepare_movies(movies, credits)
+    ctx.dump_pickle("movies_df.pkl", movies_df)
+    return f"{len(movies_df)} movies"
+
+
+def stage_tfidf(ctx):
+    from scipy.sparse import save_npz
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    movies_df = ctx.load_pickle("movies_df.pkl")
+    vectorizer = TfidfVectorizer(max_features=ctx.args.max_features, stop_words='english',
+                                 dtype=np.float32)
+    vectors = vectorizer.fit_transform(movies_df['final_text_nltk'])
+    ctx.dump_pickle("tfidf_vectorizer.pkl", vectorizer)
+    save_npz(ctx.out("tfidf_matrix.npz"), vectors)
+    return f"{vectors.shape[0]} x {vectors.shape[1]}, nnz={vectors.nnz}"
+
+
+def stage_content(ctx):
+    from scipy.sparse import load_npz
+
+    vectors = load_npz(ctx.out("tfidf_matrix.npz")).tocsr()
+    idx, scores = neighbors.topk_from_vectors(vectors, k=ctx.args.k)
+    neighbors.save(idx, scores, ctx.args.out)
+    if ctx.args.dense_similarity:
+        # Only for tools that still want the N x N matrix (shrink_artifacts.py).
+        ctx.dump_pickle("similarity.pkl", (vectors @ vectors.T).toarray())
+    return f"top-{idx.shape[1]} table, {(idx.nbytes + scores.nbytes) / 1e6:.1f} MB"
+
+
+def stage_ann(ctx):
+    from scipy.sparse import load_npz
+
+    vectors = load_npz(ctx.out("tfidf_matrix.npz")).tocsr()
+    arrays = ann.build(vectors, dim=ctx.args.ann_dim, n_lists=ctx.args.ann_lists)
+    ann.save(arrays, ctx.args.out)
+    n, dim = arrays['ann_embeddings'].shape
+    return f"{n} x {dim} embeddings, {len(arrays['ann_centroids'])} cells"
+
+
+def stage_ratings(ctx):
+    from scipy.sparse import csr_matrix, save_npz
+
+    ratings = pd.read_csv(ctx.data("ratings.csv"), usecols=['userId', 'movieId', 'rating'],
+                          dtype={'userId': np.int32, 'movieId': np.int32, 'rating': np.float32})
+    # Vectorized user-mean centring (the notebook did this row by row with apply).
+    centred = ratings['rating'] - ratings.groupby('userId')['rating'].transform('mean')
+
+    user_idx = ratings['userId'].astype("category").cat.codes.to_numpy()
+    movie_cat = ratings['movieId'].astype("category")
+    movie_idx = movie_cat.cat.codes.to_numpy()
+    R = csr_matrix((centred.to_numpy(dtype=np.float32), (user_idx, movie_idx)))
+
+    movie_id_search = {int(m): i for i, m in enumerate(movie_cat.cat.categories)}
+    save_npz(ctx.out(".build", "ratings_centred.npz"), R)
+    np.save(ctx.out(".build", "movie_counts.npy"), np.bincount(movie_idx, minlength=R.shape[1]))
+    ctx.dump_pickle("movie_id_search.pkl", movie_id_search)
+    return f"{len(ratings)} ratings, {R.shape[0]} users x {R.shape[1]} movies"
+
+
+def stage_cf(ctx):
+    from scipy.sparse import load_npz
+
+    R = load_npz(ctx.out(".build", "ratings_centred.npz"))
+    counts = np.load(ctx.out(".build", "movie_counts.npy"))
+    # Blocked top-K instead of the full item x item cosine: memory scales with
+    # the block size, not n_items^2. Shrinkage is baked in at build time.
+    movie_similarity = cf_topk.topk_item_similarity(
+        R, k=ctx.args.cf_k, min_support=ctx.args.cf_min_support, counts=counts,
+        min_ratings=ctx.args.cf_min_ratings, block_size=ctx.args.block_size, n_jobs=ctx.args.jobs)
+    # Same 0-d object-array wrapper the notebook's np.save produced.
+    wrapper = np.empty((), dtype=object)
+    wrapper[()] = movie_similarity
+    np.save(ctx.out("movie_similarity.npy"), wrapper, allow_pickle=True)
+    return f"top-{ctx.args.cf_k}, nnz={movie_similarity.nnz}"
+
+
+def stage_links(ctx):
+    links = pd.read_csv(ctx.data("links.csv")).dropna(subset=["tmdbId"])
+    tmdb_to_ml = dict(zip(links['tmdbId'].astype(int).tolist(), links['movieId'].astype(int).tolist()))
+    ctx.dump_pickle("tmdb_to_ml.pkl", tmdb_to_ml)
+    return f"{len(tmdb_to_ml)} links"
+
+
+def stage_trending(ctx):
+    movies_df = ctx.load_pickle("movies_df.pkl")
+    C = movies_df['vote_average'].mean()
+    m = movies_df['vote_count'].quantile(0.9)  # Only consider top 10% vote counts
+
+    qualified = movies_df.loc[movies_df['vote_count'] >= m].copy()
+    v, R = qualified['vote_count'], qualified['vote_average']
+    qualified['score'] = v / (v + m) * R + m / (v + m) * C
+    trending = (qualified.sort_values('score', ascending=False).head(20)
+                [['title', 'tmdbId', 'vote_average', 'genres']].to_dict('records'))
+    ctx.dump_pickle("trending.pkl", trending)
+    return f"{len(trending)} movies"
+
+
+def stage_bundle(ctx):
+    loaded = bundle.load_pickles(ctx.args.out)
+    scoring.prepare(loaded)
+    manifest = bundle.write_bundle(loaded, ctx.out("bundle"), version=ctx.args.version)
+    return f"version {manifest['version']}"
+
+
+def stage_materialize(ctx):
+    manifest = materialize.build(ctx.out("bundle"), movies=ctx.args.materialize_movies, jobs=ctx.args.jobs)
+    size = sum(os.path.getsize(ctx.out("bundle", bundle.MATERIALIZED, f"{name}.npy")) for name in manifest["arrays"])
+    return f"{manifest['movies']} movies, {size / 1e6:.1f} MB"
+
+
+class Stage:
+    def __init__(self, name, build, inputs=(), deps=(), outputs=(), params=(), code=()):
+        self.name = name
+        self.build = build
+        self.inputs = inputs        # raw files under --data
+        self.deps = deps            # upstream stage names
+        self.outputs = outputs      # files under --out
+        self.params = params        # CLI arguments that change the result
+        self.code = code            # modules / functions the result depends on, besides build
+
+
+STAGES = [
+    Stage("movies", stage_movies, inputs=("tmdb_5000_movies.csv", "tmdb_5000_credits.csv"),
+          outputs=("movies_df.pkl",), code=(prepare_movies, _names, _director, stem_texts)),
+    Stage("tfidf", stage_tfidf, deps=("movies",), outputs=("tfidf_vectorizer.pkl", "tfidf_matrix.npz"),
+          params=("max_features",)),
+    Stage("content", stage_content, deps=("tfidf",), outputs=(neighbors.IDX_FILE, neighbors.SCORES_FILE),
+          params=("k", "dense_similarity"), code=(neighbors,)),
+    Stage("ann", stage_ann, deps=("tfidf",), outputs=tuple(f"{name}.npy" for name in ann.ARRAYS),
+          params=("ann_dim", "ann_lists"), code=(ann,)),
+    Stage("ratings", stage_ratings, inputs=("ratings.csv",),
+          outputs=(".build/ratings_centred.npz", ".build/movie_counts.npy", "movie_id_search.pkl")),
+    Stage("cf", stage_cf, deps=("ratings",), outputs=("movie_similarity.npy",),
+          params=("cf_k", "cf_min_support", "cf_min_ratings"), code=(cf_topk,)),
+    Stage("links", stage_links, inputs=("links.csv",), outputs=("tmdb_to_ml.pkl",)),
+    Stage("trending", stage_trending, deps=("movies",), outputs=("trending.pkl",)),
+    Stage("bundle", stage_bundle, deps=("movies", "content", "ann", "cf", "links", "trending"),
+          outputs=("bundle/manifest.json",), params=("version",),
+          code=(bundle, catalog, scoring, neighbors, ann, suggest, title_index)),
+    Stage("materialize", stage_materialize, deps=("bundle",),
+          outputs=("bundle/materialized/manifest.json",), params=("materialize_movies",),
+          code=(materialize, scoring, bundle, ann)),
+]
+
+
+class Context:
+    def __init__(self, args):
+        self.args = args
+
+    def data(self, *parts):
+        return os.path.join(self.args.data, *parts)
+
+    def out(self, *parts):
+        return os.path.join(self.args.out, *parts)
+
+    def dump_pickle(self, name, obj):
+        with open(self.out(name), "wb") as f:
+            pickle.dump(obj, f, protocol=4)
+
+    def load_pickle(self, name):
+        with open(self.out(name), "rb") as f:
+            return pickle.load(f)
+
+
+def fingerprint(stage, ctx, upstream):
+    h = hashlib.sha256()
+    for obj in (stage.build, *stage.code):
+        h.update(inspect.getsource(obj).encode())
+    for name in stage.params:
+        h.update(f"{name}={getattr(ctx.args, name)!r}".encode())
+    for name in stage.inputs:
+        st = os.stat(ctx.data(name))
+        h.update(f"{name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    for dep in stage.deps:
+        h.update(upstream[dep].encode())
+    return h.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build every backend artifact from the raw datasets.")
+    parser.add_argument("--data", default="data", help="directory holding the Kaggle CSVs")
+    parser.add_argument("--out", default="artifacts", help="artifact output directory")
+    parser.add_argument("--k", type=int, default=neighbors.DEFAULT_K, help="content neighbours kept per movie")
+    parser.add_argument("--max-features", type=int, default=5000, help="TF-IDF vocabulary size")
+    parser.add_argument("--ann-dim", type=int, default=ann.DEFAULT_DIM, help="SVD embedding dimensions")
+    parser.add_argument("--ann-lists", type=int, default=None, help="IVF cells (default sqrt(N))")
+    parser.add_argument("--cf-k", type=int, default=100, help="CF neighbours kept per movie")
+    parser.add_argument("--cf-min-support", type=int, default=0,
+                        help="drop CF pairs co-rated by fewer users than this")
+    parser.add_argument("--cf-min-ratings", type=int, default=20,
+                        help="confidence shrinkage: full weight at this many ratings (0 = off)")
+    parser.add_argument("--block-size", type=int, default=512, help="items per CF block")
+    parser.add_argument("--jobs", type=int, default=cf_topk.DEFAULT_JOBS,
+                        help="CF worker threads and materialize processes; each CF thread holds a "
+                             "block-size x movies score block (default: %(default)s)")
+    parser.add_argument("--dense-similarity", action="store_true",
+                        help="also write the dense N x N similarity.pkl")
+    parser.add_argument("--version", default=None, help="bundle version label (default: UTC timestamp)")
+    parser.add_argument("--materialize-movies", type=int, default=0,
+                        help="materialize only the N most voted movies (default: all)")
+    parser.add_argument("--force", action="store_true", help="rebuild every stage")
+    parser.add_argument("--stages", nargs="*", default=(), help="rebuild these stages even if unchanged")
+    args = parser.parse_args()
+
+    ctx = Context(args)
+    os.makedirs(ctx.out(".build"), exist_ok=True)
+    state_path = ctx.out(STATE_FILE)
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+
+    unknown = set(args.stages) - {s.name for s in STAGES}
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    fingerprints, report = {}, []
+    for stage in STAGES:
+        fp = fingerprint(stage, ctx, fingerprints)
+        fingerprints[stage.name] = fp
+        outputs_exist = all(os.path.exists(ctx.out(o)) for o in stage.outputs)
+        if not args.force and stage.name not in args.stages and state.get(stage.name) == fp and outputs_exist:
+            report.append((stage.name, "cached", 0.0, float("nan"), float("nan"), ""))
+            continue
+
+        print(f"[{stage.name}] building...", flush=True)
+        _reset_peak()
+        rss_before, start = _rss_mb(), time.perf_counter()
+        note = stage.build(ctx)
+        elapsed = time.perf_counter() - start
+        report.append((stage.name, "built", elapsed, _rss_mb() - rss_before, _peak_mb(), note or ""))
+
+        state[stage.name] = fp
+        with open(state_path, "w") as f:
+            json.dump(state, f, indent=2)
+
+    print(f"\n{'stage':<12} {'status':<7} {'seconds':>8} {'RSS +MB':>8} {'peak MB':>8}  notes")
+    for name, status, elapsed, rss_delta, peak, note in report:
+        print(f"{name:<12} {status:<7} {elapsed:>8.2f} {rss_delta:>8.1f} {peak:>8.1f}  {note}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,463 @@
+"""
+bundle.py
+---------
+Memory-mapped artifact bundle: the serving artifacts as raw .npy arrays plus a
+small JSON manifest, instead of pickles.
+
+Every array is opened with np.load(mmap_mode='r'), so startup does no
+deserialization work and N uvicorn workers on one host share a single
+page-cache copy of the matrices instead of N private ones.
+
+Layout (artifacts/bundle/):
+    manifest.json          format version, artifact version, array index
+    content_idx.npy        int32   [N, K]   top-K content neighbours (uint16 when N fits)
+    content_scores.npy     float16 [N, K]   or int8, with content_scale.npy float32 [N]
+    tmdb_ids.npy           int64   [N]
+    content_to_cf.npy      int32   [N]      row of the CF matrix, -1 = none
+    title_bytes.npy        uint8   [..]     UTF-8 titles, concatenated
+    title_offsets.npy      int64   [N + 1]
+    genre_codes.npy        int16   [..]     indices into manifest["genres"]
+    genre_offsets.npy      int64   [N + 1]
+    vote_counts.npy        int64   [N]      optional, popularity for /suggest
+    vote_average.npy       float32 [N]      optional
+    cf_indptr.npy / cf_indices.npy / cf_data.npy    CF similarity, CSR parts
+    cf_scale.npy           float32 [rows]   only with int8 cf_data
+    ann_*.npy              optional SVD embeddings + IVF index (ann.py)
+    trending.json
+    materialized/          optional precomputed top-10 lists (materialize.py)
+
+The top-K table is optional when the ann_* arrays are present, so a catalog
+too large for the exact table can be served with CONTENT_MODE=ann.
+
+shrink_artifacts.py --dtype int8 writes the int8 / narrow-index variants; the
+request path multiplies by the scale only for the candidates it gathers
+(scoring.py).
+
+The catalog columns are served straight from the mapped arrays (catalog.py):
+titles are decoded on access and genres stay integer codes, so serving never
+builds per-movie Python objects or imports pandas.
+
+Convert the current pickles once (originals are left untouched):
+    python bundle.py                       # artifacts/ -> artifacts/bundle/
+    python bundle.py --src artifacts_slim --version 2024-06-01
+
+Versioned layout for hot reload: each version is its own bundle directory and
+a CURRENT file names the one to serve. Publishing writes the new directory in
+full, then replaces CURRENT atomically; a published directory is never
+modified again, because running backends have it memory-mapped. Its
+materialized table, if any, is therefore built before it is published:
+    python bundle.py --versions artifacts/versions --version 2024-06-02
+    python bundle.py --versions artifacts/versions --materialize        # + materialize.py table
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+
+import ann
+import catalog
+import neighbors
+import scoring
+from suggest import SuggestIndex
+from title_index import TitleIndex
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+MATERIALIZED = "materialized"
+# load_stages() order; each stage adds to the one before.
+STAGES = ("trending", "titles", "content", "ready")
+
+
+class CSRArrays:
+    """The three CSR arrays of a sparse matrix, without a scipy object around them.
+    `scale` is the per-row float32 scale of int8 `data` (None for float data)."""
+
+    def __init__(self, indptr, indices, data, shape, scale=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = tuple(shape)
+        self.scale = scale
+
+
+def _load_trending_pickle(directory):
+    # Trending is optional: cold start degrades gracefully without it
+    try:
+        with open(os.path.join(directory, "trending.pkl"), "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        print("Warning: trending.pkl not found. Cold start will be empty.")
+        return []
+
+
+def _load_catalog_pickles(directory):
+    loaded = {}
+    for name in ('movies_df', 'tmdb_to_ml', 'movie_id_search'):
+        with open(os.path.join(directory, f"{name}.pkl"), "rb") as f:
+            loaded[name] = pickle.load(f)
+    return loaded
+
+
+def _load_content_pickles(directory):
+    # Content neighbours: serve the precomputed top-K table (python neighbors.py).
+    # Older artifact sets only ship the dense matrix, so derive the table once
+    # here and let the N x N matrix go out of scope.
+    # With ann_*.npy present the table is optional (CONTENT_MODE=ann serves without it).
+    loaded = dict(ann.load(directory) or {})
+    table = neighbors.load(directory)
+    dense_path = os.path.join(directory, "similarity.pkl")
+    if table is None and (os.path.exists(dense_path) or 'ann_embeddings' not in loaded):
+        print("Warning: content top-K table not found. Building it from similarity.pkl...")
+        with open(dense_path, "rb") as f:
+            table = neighbors.topk_from_dense(np.asarray(pickle.load(f)))
+    if table is not None:
+        loaded['content_idx'], loaded['content_scores'] = table
+    return loaded
+
+
+def _load_cf_pickle(directory):
+    loaded_sim = np.load(os.path.join(directory, "movie_similarity.npy"), allow_pickle=True)
+    return loaded_sim.item() if loaded_sim.ndim == 0 else loaded_sim
+
+
+def load_pickles(directory="artifacts"):
+    """Load the notebook's pickled artifacts (the pre-bundle format)."""
+    loaded = _load_catalog_pickles(directory)
+    loaded.update(_load_content_pickles(directory))
+    loaded['trending'] = _load_trending_pickle(directory)
+    loaded['movie_similarity'] = _load_cf_pickle(directory)
+    return loaded
+
+
+def _json_default(value):
+    # trending.pkl comes out of pandas, so its values are numpy scalars / arrays.
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def write_bundle(artifacts, out_dir, version=None):
+    """Write serving artifacts (scoring.prepare'd, or columnar) as a bundle.
+
+    The bundle is written in full to a sibling temp directory and then renamed
+    over `out_dir`, so files a running backend has mapped are never rewritten
+    (truncating a mapped .npy kills the reader with SIGBUS). The old files are
+    only unlinked; their mappings stay valid until the backend reloads."""
+    out_dir = os.path.normpath(out_dir)
+    tmp_dir = f"{out_dir}.tmp{os.getpid()}"
+    os.makedirs(tmp_dir)
+    try:
+        manifest = _write_bundle_files(artifacts, tmp_dir, version)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    _swap_in(tmp_dir, out_dir)
+    return manifest
+
+
+def _swap_in(tmp_dir, out_dir):
+    """Move a complete directory into place at `out_dir`, replacing any old one."""
+    if not os.path.exists(out_dir):
+        os.replace(tmp_dir, out_dir)
+        return
+    # A directory can't be renamed over a non-empty one: move the old one
+    # aside first. Only between the two renames is out_dir missing.
+    old_dir = f"{out_dir}.old{os.getpid()}"
+    os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def _write_bundle_files(artifacts, out_dir, version):
+
+    movie_similarity = artifacts['movie_similarity']
+    if not hasattr(movie_similarity, 'indptr'):
+        from scipy.sparse import csr_matrix
+        movie_similarity = csr_matrix(movie_similarity)
+
+    if 'genre_codes' in artifacts:
+        genre_names, genre_codes, genre_offsets = (artifacts['genre_names'], artifacts['genre_codes'],
+                                                   artifacts['genre_offsets'])
+    else:
+        genre_names, genre_codes, genre_offsets = catalog.encode_genres(artifacts['genres'])
+    titles = artifacts['titles']
+    if not isinstance(titles, catalog.PackedStrings):
+        titles = catalog.PackedStrings.pack(titles)
+
+    arrays = {
+        'tmdb_ids': np.asarray(artifacts['tmdb_ids'], dtype=np.int64),
+        'content_to_cf': np.asarray(artifacts['content_to_cf'], dtype=np.int32),
+        'title_bytes': np.asarray(titles.buffer, dtype=np.uint8),
+        'title_offsets': np.asarray(titles.offsets, dtype=np.int64),
+        'genre_codes': np.asarray(genre_codes, dtype=np.int16),
+        'genre_offsets': np.asarray(genre_offsets, dtype=np.int64),
+        'cf_indptr': np.asarray(movie_similarity.indptr),
+        'cf_indices': np.asarray(movie_similarity.indices),
+        'cf_data': np.asarray(movie_similarity.data),
+    }
+    if getattr(movie_similarity, 'scale', None) is not None:
+        arrays['cf_scale'] = np.asarray(movie_similarity.scale, dtype=np.float32)
+    if 'content_idx' in artifacts:
+        content_idx = np.asarray(artifacts['content_idx'])
+        # uint16 when shrink_artifacts.py narrowed it; anything else is stored as int32.
+        arrays['content_idx'] = (content_idx if content_idx.dtype == np.uint16
+                                 else content_idx.astype(np.int32, copy=False))
+        arrays['content_scores'] = np.asarray(artifacts['content_scores'])
+    if 'content_scale' in artifacts:
+        arrays['content_scale'] = np.asarray(artifacts['content_scale'], dtype=np.float32)
+    if 'vote_counts' in artifacts:
+        arrays['vote_counts'] = np.asarray(artifacts['vote_counts'], dtype=np.int64)
+    if 'vote_average' in artifacts:
+        arrays['vote_average'] = np.asarray(artifacts['vote_average'], dtype=np.float32)
+    arrays.update({name: np.asarray(artifacts[name]) for name in ann.ARRAYS if name in artifacts})
+    for name, array in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), np.ascontiguousarray(array))
+
+    with open(os.path.join(out_dir, "trending.json"), "w", encoding="utf-8") as f:
+        json.dump(artifacts.get('trending', []), f, default=_json_default)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "version": version or time.strftime("%Y%m%d-%H%M%S", time.gmtime()),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "n_movies": len(artifacts['titles']),
+        "genres": list(genre_names),
+        "cf_shape": list(movie_similarity.shape),
+        "arrays": {name: {"dtype": str(a.dtype), "shape": list(a.shape)} for name, a in arrays.items()},
+    }
+    # Manifest last: a bundle without one is incomplete and won't be opened.
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _read_manifest(bundle_dir):
+    with open(os.path.join(bundle_dir, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"{bundle_dir}: bundle format {manifest.get('format_version')} "
+                         f"is not supported (expected {FORMAT_VERSION})")
+    return manifest
+
+
+def _read_trending(bundle_dir):
+    with open(os.path.join(bundle_dir, "trending.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def open_bundle(bundle_dir):
+    """Map a bundle into a serving-artifacts dict (same keys scoring.prepare produces)."""
+    manifest = _read_manifest(bundle_dir)
+
+    arrays = {}
+    for name, spec in manifest["arrays"].items():
+        array = np.load(os.path.join(bundle_dir, f"{name}.npy"), mmap_mode='r')
+        if list(array.shape) != spec["shape"] or str(array.dtype) != spec["dtype"]:
+            raise ValueError(f"{bundle_dir}/{name}.npy does not match the manifest")
+        arrays[name] = array
+
+    trending = _read_trending(bundle_dir)
+
+    loaded = {
+        'version': manifest["version"],
+        'tmdb_ids': arrays['tmdb_ids'],
+        'content_to_cf': arrays['content_to_cf'],
+        'titles': catalog.PackedStrings(arrays['title_bytes'], arrays['title_offsets']),
+        'genre_names': manifest["genres"],
+        'genre_codes': arrays['genre_codes'],
+        'genre_offsets': arrays['genre_offsets'],
+        'movie_similarity': CSRArrays(arrays['cf_indptr'], arrays['cf_indices'],
+                                      arrays['cf_data'], manifest["cf_shape"], arrays.get('cf_scale')),
+        'trending': trending,
+    }
+    # Optional arrays: the top-K table (and its int8 scale), popularity and the ANN index.
+    optional = ('content_idx', 'content_scores', 'content_scale', 'vote_counts', 'vote_average') + ann.ARRAYS
+    loaded.update({name: arrays[name] for name in optional if name in arrays})
+    return loaded
+
+
+def open_materialized(bundle_dir, version, content_mode="table", nprobe=ann.DEFAULT_NPROBE):
+    """Map <bundle_dir>/materialized (materialize.py) for scoring.lookup_materialized,
+    or None if there is none or it was built for another version / content mode."""
+    directory = os.path.join(bundle_dir, MATERIALIZED)
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    built_for = (manifest.get("format_version"), manifest.get("version"),
+                 manifest.get("content_mode"), manifest.get("nprobe"))
+    serving = (FORMAT_VERSION, version, content_mode, nprobe if content_mode == "ann" else None)
+    if built_for != serving:
+        print(f"Ignoring {directory}: built for {built_for[1:]}, serving {serving[1:]}")
+        return None
+
+    table = {}
+    for name, spec in manifest["arrays"].items():
+        array = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+        if list(array.shape) != spec["shape"] or str(array.dtype) != spec["dtype"]:
+            raise ValueError(f"{directory}/{name}.npy does not match the manifest")
+        # Plain ndarray views of the mapping: np.memmap's indexing overhead
+        # would be most of a lookup.
+        table[name] = array.view(np.ndarray)
+    table.update(alphas=manifest["alphas"], alpha_step=manifest["alpha_step"],
+                 genres={g: i for i, g in enumerate(manifest["genres"])},
+                 top_k=manifest["top_k"], top_n=manifest["top_n"])
+    return table
+
+
+def current_version(versions_dir):
+    """Directory name CURRENT points at, or None when there is no versioned layout."""
+    try:
+        with open(os.path.join(versions_dir, CURRENT), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish(versions_dir, version):
+    """Point CURRENT at versions_dir/<version> (rename over the old pointer: atomic)."""
+    if not os.path.exists(os.path.join(versions_dir, version, MANIFEST)):
+        raise FileNotFoundError(f"{versions_dir}/{version} is not a complete bundle")
+    tmp_path = os.path.join(versions_dir, f".{CURRENT}.{os.getpid()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, os.path.join(versions_dir, CURRENT))
+
+
+def write_version(artifacts, versions_dir, version, materialize_movies=None):
+    """Write <versions_dir>/<version>/ and make it CURRENT. With materialize_movies
+    set (0 = every movie) its materialized table is built first; both go into a
+    hidden staging directory that is renamed into place complete, so neither a
+    reload nor the CURRENT watcher ever sees a half-built version."""
+    out_dir = os.path.join(versions_dir, version)
+    if os.path.exists(out_dir):
+        raise FileExistsError(f"{out_dir} already exists; published versions are never overwritten")
+    staging = os.path.join(versions_dir, f".{version}.staging")
+    manifest = write_bundle(artifacts, staging, version=version)
+    try:
+        if materialize_movies is not None:
+            import materialize  # imports this module
+            materialize.build(staging, movies=materialize_movies)
+        os.rename(staging, out_dir)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    publish(versions_dir, version)
+    return manifest
+
+
+def load_stages(bundle_dir, legacy_dir="artifacts", content_mode="table", nprobe=ann.DEFAULT_NPROBE):
+    """Build the serving artifacts one stage at a time, the most useful first,
+    yielding (stage, artifacts) after each:
+
+        trending   the trending list only: enough for cold-start answers
+        titles     + catalog columns, title index, genre bits, tmdbId -> row
+        content    + content neighbours (top-K table or ANN index). Until the
+                   CF matrix is in, content_to_cf is all -1, so CF scores are
+                   0 and rankings are content-only
+        ready      + CF similarity, the /suggest index and the materialized
+                   top-10 table if the bundle has one: the full set
+
+    Every stage is a new dict carrying its name under 'stage'; an earlier one
+    is never changed afterwards, so it can be served while the next loads."""
+    mapped = os.path.exists(os.path.join(bundle_dir, MANIFEST))
+    if mapped:
+        version, trending = _read_manifest(bundle_dir)["version"], _read_trending(bundle_dir)
+    else:
+        version, trending = "pickles", _load_trending_pickle(legacy_dir)
+    yield "trending", {'version': version, 'stage': "trending", 'trending': trending}
+
+    if mapped:
+        # Memory-mapped bundle: no unpickling, pages shared across processes.
+        # The CF arrays are mapped here too, but cost nothing until touched.
+        loaded = open_bundle(bundle_dir)
+        print(f"Opened artifact bundle {loaded['version']}")
+    else:
+        loaded = _load_catalog_pickles(legacy_dir)
+        scoring.prepare(loaded)
+        # Same columnar form as a mapped bundle; the DataFrame is dropped here.
+        catalog.from_prepared(loaded)
+        loaded.update(version=version, trending=trending)
+    loaded['title_index'] = TitleIndex(loaded['titles'])
+    loaded['genre_bits'] = catalog.genre_bits(loaded['genre_codes'], loaded['genre_offsets'])
+    loaded['genre_vocab'] = {g: i for i, g in enumerate(loaded['genre_names'])}
+    loaded['tmdb_rows'] = catalog.IdIndex(loaded['tmdb_ids'])
+    no_cf = {} if 'movie_similarity' in loaded else {
+        'content_to_cf': np.full(len(loaded['titles']), -1, dtype=np.int32)}
+    yield "titles", {**loaded, **no_cf, 'stage': "titles"}
+
+    if not mapped:
+        loaded.update(_load_content_pickles(legacy_dir))
+    if content_mode == "ann":
+        if 'ann_embeddings' not in loaded:
+            raise RuntimeError("CONTENT_MODE=ann but no ann_*.npy arrays were found (run python ann.py)")
+        loaded['ann_index'] = ann.IVFIndex.from_artifacts(loaded, nprobe)
+        # Same depth as the table, so genre filtering has the same row to work with.
+        loaded['ann_depth'] = min(neighbors.DEFAULT_K, len(loaded['titles']) - 1)
+    elif 'content_idx' not in loaded:
+        raise RuntimeError("No content top-K table in these artifacts; serve them with CONTENT_MODE=ann")
+    yield "content", {**loaded, **no_cf, 'stage': "content"}
+
+    if not mapped:
+        loaded['movie_similarity'] = _load_cf_pickle(legacy_dir)
+    # Bundles written before vote_counts existed rank suggestions by row order.
+    loaded['suggest_index'] = SuggestIndex(loaded['titles'], loaded.get('vote_counts'))
+    if mapped:
+        loaded['materialized'] = open_materialized(bundle_dir, version, content_mode, nprobe)
+    yield "ready", {**loaded, 'stage': "ready"}
+
+
+def load_serving(bundle_dir, legacy_dir="artifacts", content_mode="table", nprobe=ann.DEFAULT_NPROBE):
+    """Everything the request path needs: the bundle if there is one, else the
+    pickles, plus the indexes built on top (titles, genre bits, tmdbId -> row).
+
+    content_mode "ann" answers content neighbours from the IVF index (ann.py)
+    instead of the top-K table."""
+    for _, loaded in load_stages(bundle_dir, legacy_dir, content_mode, nprobe):
+        pass
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pickled artifacts into a memory-mapped bundle.")
+    parser.add_argument("--src", default="artifacts", help="directory holding the pickled artifacts")
+    parser.add_argument("--dst", default=os.path.join("artifacts", "bundle"), help="bundle output directory")
+    parser.add_argument("--version", default=None, help="artifact version label (default: UTC timestamp)")
+    parser.add_argument("--versions", default=None,
+                        help="write to <versions>/<version>/ instead of --dst and make it CURRENT")
+    parser.add_argument("--materialize", type=int, nargs="?", const=0, default=None, metavar="MOVIES",
+                        help="also build the materialized top-10 table (materialize.py) into the bundle, "
+                             "before it is published; optionally for the MOVIES most voted only")
+    args = parser.parse_args()
+
+    version = args.version or time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+    if args.versions:
+        args.dst = os.path.join(args.versions, version)
+        if os.path.exists(args.dst):
+            parser.error(f"{args.dst} already exists; published versions are never overwritten")
+
+    loaded = load_pickles(args.src)
+    scoring.prepare(loaded)
+    if args.versions:
+        manifest = write_version(loaded, args.versions, version, materialize_movies=args.materialize)
+    else:
+        manifest = write_bundle(loaded, args.dst, version=version)
+        if args.materialize is not None:
+            import materialize
+            materialize.build(args.dst, movies=args.materialize)
+
+    size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(args.dst) for f in files)
+    print(f"Wrote bundle {manifest['version']} ({manifest['n_movies']} movies, "
+          f"{size / 1e6:.1f} MB) to {args.dst}/" + (" and made it CURRENT" if args.versions else ""))
+
+
+if __name__ == "__main__":
+    main()
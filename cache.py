@@ -0,0 +1,117 @@
+"""
+cache.py
+--------
+Bounded LRU cache with a TTL, single-flight request coalescing and stats.
+
+Used by the backend for two things:
+  * title string -> resolved movies_df row
+  * (row, alpha on a grid, genre) -> finished /recommend response
+
+`get_or_compute(key, compute)` returns a live entry if there is one;
+otherwise the first caller runs `compute()` while concurrent callers for the
+same key wait for its result instead of repeating the work.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Pending:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    def __init__(self, max_entries=1024, ttl=600.0, sizeof=sys.getsizeof):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self._entries = OrderedDict()       # key -> (expires_at, value, size)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._generation = 0                # bumped by clear(); stale computations aren't stored
+        self.hits = self.misses = self.coalesced = self.evictions = self.expirations = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._drop(key)
+                self.expirations += 1
+
+            generation = self._generation
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = _Pending()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = compute()
+        except BaseException as exc:
+            pending.error = exc
+            raise
+        else:
+            with self._lock:
+                if generation == self._generation:
+                    self._store(key, pending.value)
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is pending:
+                    del self._inflight[key]
+            pending.event.set()
+        return pending.value
+
+    def _store(self, key, value):
+        if self.max_entries <= 0:
+            return
+        if key in self._entries:
+            self._drop(key)
+        size = self.sizeof(value)
+        self._entries[key] = (time.monotonic() + self.ttl, value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._inflight.clear()
+            self._bytes = 0
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "approx_bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,118 @@
+"""
+catalog.py
+----------
+Columnar, pandas-free movie catalog for the serving path.
+
+The backend reads only a handful of movies_df fields per request, so it keeps
+them as typed arrays rather than a DataFrame or per-movie Python objects:
+
+    titles       PackedStrings   one UTF-8 buffer + int64 offsets, decoded on access
+    tmdb_ids     int64 [N]       with IdIndex for tmdbId -> row lookups
+    genres       int16 codes + int64 offsets into a sorted name list,
+                 folded into a uint64 bitmask per movie for filtering
+    vote_counts  int64 [N]       popularity (/suggest ranking)
+    vote_average float32 [N]
+
+The bundle (bundle.py) stores exactly these arrays, so a mapped bundle is
+served as-is; the legacy pickle path is converted with from_prepared() and
+the DataFrame dropped.
+"""
+import numpy as np
+
+
+class PackedStrings:
+    """Read-only sequence of strings stored as one UTF-8 buffer plus offsets."""
+
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def pack(cls, strings):
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return bytes(self.buffer[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        # One copy of the buffer, then slices: much cheaper than N __getitem__ calls.
+        raw = bytes(self.buffer)
+        bounds = self.offsets.tolist()
+        for i in range(len(bounds) - 1):
+            yield raw[bounds[i]:bounds[i + 1]].decode("utf-8")
+
+    def tolist(self):
+        return list(self)
+
+
+class IdIndex:
+    """tmdbId -> first row with that id, over a sorted copy of the id column (dict-like)."""
+
+    def __init__(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        self.order = np.argsort(ids, kind="stable").astype(np.int32)
+        self.sorted_ids = ids[self.order]
+
+    def get(self, tmdb_id, default=None):
+        i = int(np.searchsorted(self.sorted_ids, tmdb_id))
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == tmdb_id:
+            return int(self.order[i])
+        return default
+
+    def __contains__(self, tmdb_id):
+        return self.get(tmdb_id) is not None
+
+    def __getitem__(self, tmdb_id):
+        row = self.get(tmdb_id)
+        if row is None:
+            raise KeyError(tmdb_id)
+        return row
+
+    def __len__(self):
+        return len(self.sorted_ids)
+
+
+def encode_genres(genre_lists):
+    """Per-movie genre name lists -> (sorted names, int16 codes, int64 offsets)."""
+    names = sorted({g for genres in genre_lists for g in genres})
+    code = {g: i for i, g in enumerate(names)}
+    offsets = np.zeros(len(genre_lists) + 1, dtype=np.int64)
+    np.cumsum([len(g) for g in genre_lists], out=offsets[1:])
+    codes = np.array([code[g] for genres in genre_lists for g in genres], dtype=np.int16)
+    return names, codes, offsets
+
+
+def genre_bits(codes, offsets):
+    """One uint64 per movie with bit c set for each genre code c (see scoring.genre_rows)."""
+    if len(codes) and int(np.max(codes)) >= 64:
+        raise ValueError(f"{int(np.max(codes)) + 1} genres do not fit a 64-bit mask")
+    bits = np.zeros(len(offsets) - 1, dtype=np.uint64)
+    owner = np.repeat(np.arange(len(bits)), np.diff(offsets))
+    np.bitwise_or.at(bits, owner, np.left_shift(np.uint64(1), np.asarray(codes, dtype=np.uint64)))
+    return bits
+
+
+def from_prepared(artifacts):
+    """Replace scoring.prepare's list / DataFrame fields with the columnar ones, in place."""
+    names, codes, offsets = encode_genres(artifacts.pop('genres'))
+    artifacts.update(
+        titles=PackedStrings.pack(artifacts['titles']),
+        genre_names=names,
+        genre_codes=codes,
+        genre_offsets=offsets,
+    )
+    # The DataFrame and id maps were only needed to build the fields above.
+    artifacts.pop('movies_df', None)
+    artifacts.pop('tmdb_to_ml', None)
+    artifacts.pop('movie_id_search', None)
+    return artifacts
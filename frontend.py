@@ -1,10 +1,11 @@
 import streamlit as st
-import requests
 import time
 import urllib.parse
 import os
 from dotenv import load_dotenv
 
+import api_client
+
 # Load environment variables (Create a .env file with OMDB_API_KEY=your_key)
 load_dotenv()
 
@@ -13,6 +14,7 @@ API_URL = "http://127.0.0.1:8000/recommend"
 # Set OMDB_API_KEY in a .env file (free key: https://www.omdbapi.com/apikey.aspx).
 # No key baked into source: without one the app degrades to placeholder posters / "No Rating".
 OMDB_API_KEY = os.getenv("OMDB_API_KEY", "")
+OMDB_URL = os.getenv("OMDB_URL", "https://www.omdbapi.com/")  # omdb_stub.py for local testing
 
 st.set_page_config(
     page_title="MovieMatch AI",
@@ -59,7 +61,6 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-@st.cache_data(ttl=3600, show_spinner=False)
 def fetch_omdb_data(movie_title):
     """
     Fetches both the Poster and IMDb Rating from OMDb.
@@ -71,38 +72,30 @@ def fetch_omdb_data(movie_title):
     imdb_rating = "N/A"
 
     if OMDB_API_KEY:
-        try:
-            # params dict -> requests URL-encodes the title (handles &, #, etc.)
-            response = requests.get(
-                "https://www.omdbapi.com/",
-                params={"t": movie_title, "apikey": OMDB_API_KEY},
-                timeout=5,
-            )
-            data = response.json()
-            
-            if data.get('Response') == 'True':
-                # Get Poster
-                if data.get('Poster') != 'N/A':
-                    poster_url = data.get('Poster')
-                # Get Rating
-                if data.get('imdbRating') != 'N/A':
-                    imdb_rating = data.get('imdbRating')
-                    
-        except Exception:
-            pass 
+        # Shared pooled session + cache (api_client), so repeated titles cost nothing
+        data = api_client.omdb(OMDB_URL, OMDB_API_KEY, movie_title)
+
+        if data and data.get('Response') == 'True':
+            # Get Poster
+            if data.get('Poster') != 'N/A':
+                poster_url = data.get('Poster')
+            # Get Rating
+            if data.get('imdbRating') != 'N/A':
+                imdb_rating = data.get('imdbRating')
 
     return poster_url, imdb_rating
 
 def get_recommendations(title, genre, alpha=0.45):
-    try:
-        # If title is empty, we send empty string, backend handles trending
-        params = {"title": title, "alpha": alpha, "genre": genre}
-        response = requests.get(API_URL, params=params, timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except requests.RequestException:
-        return None
+    # If title is empty, we send empty string, backend handles trending
+    return api_client.recommend(API_URL, title, genre, alpha)
+
+def card_data(movie):
+    # Poster AND Rating: from the backend's poster store if it has the movie (a real
+    # poster, or at least a rating), else OMDb. A stored poster without a rating
+    # shows N/A rather than asking OMDb again for what the prefetch already got.
+    if movie.get('imdb_rating') is not None or not api_client.is_placeholder(movie['poster_url']):
+        return movie['poster_url'], movie['imdb_rating'] or "N/A"
+    return fetch_omdb_data(movie['title'])
 
 
 # MAIN APP LAYOUT
@@ -127,6 +120,14 @@ with col3:
     # use_container_width makes the button fill the column
     search_btn = st.button("🚀 Find Movies", type="primary", use_container_width=True)
 
+# Typeahead: titles starting with what was typed (backend /suggest), so the search
+# below sends a concrete title instead of making the backend fuzzy-match partial input
+picked_title = search_query
+if search_query.strip():
+    suggestions = api_client.suggest(API_URL, search_query)
+    if suggestions:
+        picked_title = st.selectbox("Matching titles", suggestions, label_visibility="collapsed")
+
 # 3. Logic & Display
 # Trigger if button clicked OR if query is empty (shows trending on load)
 if search_btn or search_query == "":
@@ -136,7 +137,7 @@ if search_btn or search_query == "":
     with st.spinner("🤖 Curating your list..."):
         # Add slight delay for UX feel
         if search_query: time.sleep(0.3)
-        data = get_recommendations(search_query, selected_genre)
+        data = get_recommendations(picked_title, selected_genre)
 
     if data:
         source_movie = data['source_movie']
@@ -165,12 +166,14 @@ if search_btn or search_query == "":
         if not recommendations and message:
              st.info(message)
         else:
+            # All cards' posters / ratings fetched in parallel up front
+            extras = api_client.map_parallel(card_data, recommendations)
             cols = st.columns(5)
             for i, movie in enumerate(recommendations):
                 with cols[i % 5]:
                     with st.container():
-                        # 1. Fetch Poster AND Rating
-                        poster_url, imdb_rating = fetch_omdb_data(movie['title'])
+                        # 1. Poster AND Rating
+                        poster_url, imdb_rating = extras[i]
                         st.image(poster_url, use_container_width=True)
                         
                         # 2. Title
@@ -12,16 +12,17 @@ Backend must be running:  python -m uvicorn main:app --reload
 import html
 import os
 import urllib.parse
-from concurrent.futures import ThreadPoolExecutor
 
-import requests
 import streamlit as st
 from dotenv import load_dotenv
 
+import api_client
+
 load_dotenv()
 
 API_URL = os.getenv("API_URL", "http://127.0.0.1:8000/recommend")
 OMDB_API_KEY = os.getenv("OMDB_API_KEY", "")
+OMDB_URL = os.getenv("OMDB_URL", "https://www.omdbapi.com/")  # omdb_stub.py for local testing
 
 GENRES = ["All", "Action", "Adventure", "Animation", "Comedy", "Drama",
           "Horror", "Romance", "Science Fiction", "Thriller"]
@@ -124,42 +125,38 @@ div[data-baseweb="input"]:focus-within {border-color:#e50914 !important; box-sha
 
 
 # ---------------------------------------------------------------- data
-@st.cache_data(ttl=3600, show_spinner=False)
 def fetch_omdb_data(title: str):
     """Poster URL, IMDb rating and genres for a title. Graceful fallback without a key."""
     safe = urllib.parse.quote(title)
     poster = f"https://placehold.co/400x600/141824/8b93a7?text={safe}&font=roboto"
     rating = "N/A"
     genres = []
-    if OMDB_API_KEY:
-        try:
-            r = requests.get("https://www.omdbapi.com/",
-                             params={"t": title, "apikey": OMDB_API_KEY}, timeout=5)
-            d = r.json()
-            if d.get("Response") == "True":
-                if d.get("Poster") and d.get("Poster") != "N/A":
-                    poster = d["Poster"]
-                if d.get("imdbRating") and d.get("imdbRating") != "N/A":
-                    rating = d["imdbRating"]
-                if d.get("Genre") and d.get("Genre") != "N/A":
-                    genres = [g.strip() for g in d["Genre"].split(",")][:2]
-        except Exception:
-            pass
+    # Pooled, cached and de-duplicated across sessions by api_client.
+    d = api_client.omdb(OMDB_URL, OMDB_API_KEY, title) if OMDB_API_KEY else None
+    if d and d.get("Response") == "True":
+        if d.get("Poster") and d.get("Poster") != "N/A":
+            poster = d["Poster"]
+        if d.get("imdbRating") and d.get("imdbRating") != "N/A":
+            rating = d["imdbRating"]
+        if d.get("Genre") and d.get("Genre") != "N/A":
+            genres = [g.strip() for g in d["Genre"].split(",")][:2]
     return poster, rating, genres
 
 
 def get_recommendations(title: str, genre: str, alpha: float):
-    try:
-        r = requests.get(API_URL, params={"title": title, "alpha": alpha, "genre": genre}, timeout=10)
-        return r.json() if r.status_code == 200 else None
-    except requests.RequestException:
-        return None
+    return api_client.recommend(API_URL, title, genre, alpha)
+
+
+def card_data(m):
+    """The backend's prefetched poster-store data when it has any, else OMDb."""
+    if m.get("imdb_rating") is not None or m.get("genres") or not api_client.is_placeholder(m["poster_url"]):
+        return m["poster_url"], m["imdb_rating"] or "N/A", m["genres"][:2]
+    return fetch_omdb_data(m["title"])
 
 
 def enrich(recs):
-    """Fetch OMDb data for all cards in parallel (cache still applies per title)."""
-    with ThreadPoolExecutor(max_workers=8) as pool:
-        extras = list(pool.map(lambda m: fetch_omdb_data(m["title"]), recs))
+    """Fetch OMDb data for all cards in parallel on the client's shared pool."""
+    extras = api_client.map_parallel(card_data, recs)
     return [{**m, "poster": p, "imdb": r, "genres": g} for m, (p, r, g) in zip(recs, extras)]
 
 
@@ -197,6 +194,17 @@ with c2:
 with c3:
     go = st.button("Recommend", use_container_width=True)
 
+# Typeahead: /suggest turns what was typed into a concrete title, so /recommend
+# (and its fuzzy matching) only runs for a picked title -- or for text no title
+# starts with, once Recommend is pressed.
+title = query.strip()
+if title:
+    options = api_client.suggest(API_URL, title)
+    if options:
+        title = st.selectbox("Matching titles", options, label_visibility="collapsed")
+    elif not go:
+        title = None
+
 with st.expander("⚙ Tune the blend"):
     alpha = st.slider("Content ↔ Crowd weight (α)", 0.0, 1.0, 0.45, 0.05,
                       help="Higher α = more metadata-driven (plot, cast, genres). "
@@ -206,10 +214,19 @@ with st.expander("⚙ Tune the blend"):
 # ---------------------------------------------------------------- results
 # Render unconditionally: Enter in the search box, the button, the genre
 # select, and the alpha slider all rerun the script and refresh results live.
-with st.spinner("Curating your list…"):
-    data = get_recommendations(query.strip(), genre, alpha)
-
-if data is None:
+# Reruns in quick succession (dragging the slider) are debounced, and repeated
+# inputs are answered from the client cache without a backend call.
+data = None
+if title is not None:
+    with st.spinner("Curating your list…"):
+        if api_client.settle(st.session_state, (title, genre, alpha)):
+            st.empty()      # Streamlit hands over to a newer rerun here, if one is waiting
+        data = get_recommendations(title, genre, alpha)
+
+if title is None:
+    st.markdown(f'<div class="mm-note">No title starts with <b>{html.escape(query)}</b> — press '
+                '<b>Recommend</b> to search for the closest match.</div>', unsafe_allow_html=True)
+elif data is None:
     st.markdown('<div class="mm-note">Couldn\'t reach the recommendation engine. '
                 'Start it with <code>python -m uvicorn main:app --reload</code> from the repo root.</div>',
                 unsafe_allow_html=True)
@@ -0,0 +1,228 @@
+"""
+ingest.py
+---------
+Incremental catalog ingestion: add a batch of new movies to an existing
+artifact set without refitting TF-IDF or recomputing the N x N similarity.
+
+For a batch of B new movies (TMDB movies + credits CSVs, same columns as the
+Kaggle files) this:
+
+  * runs them through the same text preparation as build_artifacts.py and
+    transforms them with the saved, already-fitted tfidf_vectorizer.pkl,
+  * scores them against the catalog (one B x N sparse product) to build their
+    own top-K neighbour rows,
+  * patches existing rows only where a new movie beats the row's current K-th
+    neighbour -- every other row is left untouched,
+  * embeds them with the saved SVD basis and files them into their nearest IVF
+    cell when the ann_* arrays exist,
+  * appends to movies_df (row order of existing movies is preserved), the
+    TF-IDF matrix and, with --links, tmdb_to_ml,
+  * writes the result as a new artifact version: the updated pickles go to a
+    new directory (--dst, default <src>-<version>) and the bundle to
+    <versions>/<version>/, which is then published (bundle.write_version) so
+    a backend watching CURRENT picks it up. With --materialize the bundle's
+    materialized top-10 table is built before publishing. --src is only read,
+    so the previous version stays intact for rollback.
+
+Compute is O(B x N) rather than a rebuild's O(N^2). The vocabulary stays the
+one the vectorizer was fitted on, so words never seen before are ignored until
+the next full `python build_artifacts.py`.
+
+    python ingest.py --movies new_movies.csv --credits new_credits.csv
+    python ingest.py --movies m.csv --credits c.csv --links links.csv --version 2024-06-02
+    python ingest.py --movies m.csv --credits c.csv --materialize 20000
+
+Run a full `python build_artifacts.py --out <dst>` later to refit the vocabulary.
+"""
+import argparse
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+import ann
+import bundle
+import neighbors
+import scoring
+from build_artifacts import prepare_movies
+
+
+def neighbour_rows(new_vectors, vectors, k, first_row):
+    """Top-k rows of `vectors` for each new vector, the new movie itself excluded.
+
+    `vectors` already holds the new movies, starting at row `first_row`.
+    Returns (idx, scores, sims) where sims is the dense B x N similarity block.
+    """
+    sims = new_vectors @ vectors.T
+    sims = np.asarray(sims.toarray() if hasattr(sims, 'toarray') else sims, dtype=np.float32)
+    idx, scores = neighbors._topk_rows(sims.copy(), first_row, k)
+    return idx, scores, sims
+
+
+def patch_rows(idx, scores, sims, first_new):
+    """Merge new movies into the existing rows they belong to. Returns the patched row numbers.
+
+    `idx` / `scores` are the existing [N_old, K] table; `sims[:, :N_old]` are the
+    new movies' similarities to them. A row is touched only if some new movie
+    beats its current K-th score; ties keep the existing neighbour.
+    """
+    n_old, k = idx.shape
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    to_old = sims[:, :n_old].T                                   # [N_old, B]
+    affected = np.flatnonzero((to_old > scores[:, -1:].astype(np.float32)).any(axis=1))
+    if len(affected) == 0:
+        return affected
+
+    new_rows = np.arange(first_new, first_new + sims.shape[0], dtype=np.int32)
+    merged_idx = np.hstack([idx[affected], np.broadcast_to(new_rows, (len(affected), len(new_rows)))])
+    merged_scores = np.hstack([scores[affected].astype(np.float32), to_old[affected]])
+    order = np.argsort(-merged_scores, axis=1, kind="stable")[:, :k]
+    idx[affected] = np.take_along_axis(merged_idx, order, axis=1)
+    scores[affected] = np.take_along_axis(merged_scores, order, axis=1).astype(scores.dtype)
+    return affected
+
+
+def extend_ann(arrays, new_vectors):
+    """ann_* arrays with the new movies embedded and filed into their nearest cell."""
+    # Copies, not views: the inputs may be memory-mapped from the files being replaced.
+    components = np.array(arrays['ann_components'])
+    centroids = np.array(arrays['ann_centroids'])
+    offsets = np.array(arrays['ann_offsets'])
+    embeddings = ann.project(new_vectors, components)
+    n_old = len(arrays['ann_embeddings'])
+
+    new_cells = ann._assign(embeddings, centroids)
+    new_rows = np.arange(n_old, n_old + len(embeddings), dtype=np.int32)
+    # Each new row goes at the end of its cell's slice of `order`.
+    by_cell = np.argsort(new_cells, kind="stable")
+    order = np.insert(np.asarray(arrays['ann_order']), offsets[new_cells[by_cell] + 1], new_rows[by_cell])
+    counts = np.bincount(new_cells, minlength=len(centroids))
+    return {
+        'ann_embeddings': np.vstack([np.asarray(arrays['ann_embeddings']), embeddings]),
+        'ann_components': components,
+        'ann_centroids': centroids,
+        'ann_order': order.astype(np.int32),
+        'ann_offsets': offsets + np.concatenate([[0], np.cumsum(counts)]),
+    }
+
+
+# Read from --src; trending.pkl is optional, as it is for the backend.
+INPUTS = ("movies_df.pkl", "tfidf_vectorizer.pkl", "tfidf_matrix.npz", "tmdb_to_ml.pkl",
+          "movie_id_search.pkl", "movie_similarity.npy")
+
+
+def check_inputs(src):
+    """None if `src` has everything ingest extends, else what to run first."""
+    missing = [name for name in INPUTS if not os.path.exists(os.path.join(src, name))]
+    if missing:
+        return (f"{src} is missing {', '.join(missing)}. ingest extends the pickled artifacts, not a "
+                f"bundle: run python build_artifacts.py --out {src} first")
+    has_table = all(os.path.exists(os.path.join(src, name)) for name in (neighbors.IDX_FILE, neighbors.SCORES_FILE))
+    has_ann = all(os.path.exists(os.path.join(src, f"{name}.npy")) for name in ann.ARRAYS)
+    if not (has_table or has_ann):
+        # The dense similarity.pkl can't be extended to the new movies; the table can.
+        if os.path.exists(os.path.join(src, "similarity.pkl")):
+            return f"{src} has no content top-K table: run python neighbors.py --src {src} first"
+        return f"{src} has no content top-K table or ann_* arrays: run python build_artifacts.py --out {src} first"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add new movies to an existing artifact set.")
+    parser.add_argument("--movies", required=True, help="new movies CSV (tmdb_5000_movies.csv columns)")
+    parser.add_argument("--credits", required=True, help="their credits CSV (tmdb_5000_credits.csv columns)")
+    parser.add_argument("--links", default=None, help="MovieLens links.csv rows for the new movies")
+    parser.add_argument("--src", default="artifacts", help="artifact directory to extend (read only)")
+    parser.add_argument("--dst", default=None, help="new artifact directory (default: <src>-<version>)")
+    parser.add_argument("--versions", default=os.getenv("ARTIFACT_VERSIONS", os.path.join("artifacts", "versions")),
+                        help="write the bundle to <versions>/<version>/ and make it CURRENT")
+    parser.add_argument("--version", default=None, help="artifact version label (default: UTC timestamp)")
+    parser.add_argument("--materialize", type=int, nargs="?", const=0, default=None, metavar="MOVIES",
+                        help="build the materialized top-10 table (materialize.py) before publishing; "
+                             "optionally for the MOVIES most voted only")
+    args = parser.parse_args()
+    version = args.version or time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+    dst = args.dst or f"{os.path.normpath(args.src)}-{version}"
+    bundle_dir = os.path.join(args.versions, version)
+    # Never in place: the old files are the rollback, and a live backend may have them mapped.
+    if os.path.realpath(dst) == os.path.realpath(args.src):
+        parser.error("--dst must differ from --src; ingest writes a new artifact version")
+    if os.path.exists(dst) and os.listdir(dst):
+        parser.error(f"{dst} already exists and is not empty")
+    if os.path.exists(bundle_dir):
+        parser.error(f"{bundle_dir} already exists; published versions are never overwritten")
+    problem = check_inputs(args.src)
+    if problem:
+        raise SystemExit(problem)
+    os.makedirs(dst, exist_ok=True)
+    start = time.perf_counter()
+
+    from scipy.sparse import load_npz, save_npz, vstack
+
+    with open(os.path.join(args.src, "movies_df.pkl"), "rb") as f:
+        movies_df = pickle.load(f)
+    with open(os.path.join(args.src, "tfidf_vectorizer.pkl"), "rb") as f:
+        vectorizer = pickle.load(f)
+    vectors = load_npz(os.path.join(args.src, "tfidf_matrix.npz")).tocsr()
+    with open(os.path.join(args.src, "tmdb_to_ml.pkl"), "rb") as f:
+        tmdb_to_ml = pickle.load(f)
+
+    batch = prepare_movies(pd.read_csv(args.movies), pd.read_csv(args.credits))
+    known = batch['tmdbId'].isin(movies_df['tmdbId'])
+    if known.any():
+        print(f"Skipping {int(known.sum())} movie(s) already in the catalog")
+    batch = batch[~known].reset_index(drop=True)
+    if batch.empty:
+        print("Nothing to ingest.")
+        return
+
+    n_old = len(movies_df)
+    new_vectors = vectorizer.transform(batch['final_text_nltk']).astype(np.float32)
+    vectors = vstack([vectors, new_vectors]).tocsr()
+    movies_df = pd.concat([movies_df, batch[movies_df.columns.intersection(batch.columns)]],
+                          ignore_index=True)
+
+    # Content neighbour table: new rows + patched existing rows.
+    table = neighbors.load(args.src)
+    patched = np.empty(0, dtype=np.int64)
+    if table is not None:
+        idx, scores = np.array(table[0]), np.array(table[1])
+        k = idx.shape[1]
+        new_idx, new_scores, sims = neighbour_rows(new_vectors, vectors, k, n_old)
+        patched = patch_rows(idx, scores, sims, n_old)
+        neighbors.save(np.vstack([idx, new_idx]), np.vstack([scores, new_scores]), dst)
+
+    arrays = ann.load(args.src)
+    if arrays is not None:
+        ann.save(extend_ann(arrays, new_vectors), dst)
+
+    if args.links:
+        links = pd.read_csv(args.links).dropna(subset=["tmdbId"])
+        tmdb_to_ml.update(zip(links['tmdbId'].astype(int).tolist(), links['movieId'].astype(int).tolist()))
+
+    with open(os.path.join(dst, "movies_df.pkl"), "wb") as f:
+        pickle.dump(movies_df, f, protocol=4)
+    with open(os.path.join(dst, "tmdb_to_ml.pkl"), "wb") as f:
+        pickle.dump(tmdb_to_ml, f, protocol=4)
+    save_npz(os.path.join(dst, "tfidf_matrix.npz"), vectors)
+    # Unchanged by a batch. dst has no build_artifacts stage cache, so a later
+    # build into it starts from scratch.
+    for name in ("tfidf_vectorizer.pkl", "movie_id_search.pkl", "movie_similarity.npy", "trending.pkl"):
+        if os.path.exists(os.path.join(args.src, name)):
+            shutil.copyfile(os.path.join(args.src, name), os.path.join(dst, name))
+
+    loaded = bundle.load_pickles(dst)
+    scoring.prepare(loaded)
+    manifest = bundle.write_version(loaded, args.versions, version, materialize_movies=args.materialize)
+
+    print(f"Ingested {len(batch)} movies ({n_old} -> {len(movies_df)}), patched {len(patched)} "
+          f"existing neighbour rows in {time.perf_counter() - start:.1f}s")
+    print(f"Artifacts in {dst}/, bundle {manifest['version']} published as CURRENT in {args.versions}/")
+
+
+if __name__ == "__main__":
+    main()
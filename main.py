@@ -1,54 +1,266 @@
-import pickle
+import asyncio
+import base64
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
 import urllib.parse
 import numpy as np
-import pandas as pd
-import re
-from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from contextlib import asynccontextmanager
-from thefuzz import process, fuzz
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
-from slowapi.util import get_remote_address
+from typing import Optional, Union
 
+import bundle
+from cache import TTLCache
+import metrics
+import posters
+import ratelimit
+import scoring
+import workers
+
+BUNDLE_DIR = os.getenv("ARTIFACT_BUNDLE", os.path.join("artifacts", "bundle"))
+# Versioned artifacts for hot reload: <ARTIFACT_VERSIONS>/<version>/ bundles plus a
+# CURRENT pointer (python bundle.py --versions ...). Used instead of BUNDLE_DIR
+# whenever CURRENT exists.
+ARTIFACT_VERSIONS = os.getenv("ARTIFACT_VERSIONS", os.path.join("artifacts", "versions"))
+# POST /admin/reload needs this token in X-Admin-Token; unset disables the endpoint.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Poll CURRENT every N seconds and reload when it moves; 0 turns the watcher off.
+RELOAD_WATCH_SECONDS = float(os.getenv("RELOAD_WATCH_SECONDS", "0"))
+# "table" reads content neighbours from the precomputed top-K table; "ann"
+# queries the SVD-embedding IVF index (python ann.py) per request, for catalogs
+# too large for the table. ANN_NPROBE trades recall for latency.
+CONTENT_MODE = os.getenv("CONTENT_MODE", "table")
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+SERVING = {"content_mode": CONTENT_MODE, "nprobe": ANN_NPROBE}
+# Prefetched OMDb posters / ratings (python posters.py). Optional: without the
+# file every result gets a placeholder poster and imdb_rating null.
+POSTER_DB = os.getenv("POSTER_DB", posters.DB_PATH)
+# Answer grid-alpha / single-genre requests from the bundle's precomputed
+# top-10 table (python materialize.py) when it has one; 0 always scores live.
+MATERIALIZED = os.getenv("MATERIALIZED", "1") != "0"
+# Batch items rescored together; bounds the dense CF block at BATCH_BLOCK x CF width.
+BATCH_BLOCK = 128
+
+# /recommend result cache. Alpha is snapped to ALPHA_GRID (the frontend slider
+# step) so nearby slider positions share an entry; 0 disables snapping.
+ALPHA_GRID = float(os.getenv("CACHE_ALPHA_GRID", "0.05"))
+result_cache = TTLCache(max_entries=int(os.getenv("RESULT_CACHE_SIZE", "2048")),
+                        ttl=float(os.getenv("RESULT_CACHE_TTL", "600")),
+                        sizeof=lambda response: len(json.dumps(response)))
+title_cache = TTLCache(max_entries=int(os.getenv("TITLE_CACHE_SIZE", "8192")),
+                       ttl=float(os.getenv("TITLE_CACHE_TTL", "3600")))
+
+# Paged /recommend (limit / cursor / stream). A page ranks up to `depth`
+# candidates (TOP_K by default, at most the neighbour row); the blended
+# candidates of recent paged requests are kept here so later pages continue
+# the same partly sorted ranking (scoring.PartialRanking) instead of rescoring.
+TOP_K = 50
+TOP_N = 10
+MAX_DEPTH = 1000
+# NDJSON pages are ranked and formatted this many results at a time.
+STREAM_CHUNK = 20
+ranking_cache = TTLCache(max_entries=int(os.getenv("RANKING_CACHE_SIZE", "512")),
+                         ttl=float(os.getenv("RANKING_CACHE_TTL", "600")),
+                         sizeof=lambda ranking: ranking.rows.nbytes + ranking.scores.nbytes)
+
+# "thread" scores on FastAPI's thread pool; "process" hands the CPU-bound part
+# (title resolution, candidate selection, rescoring) to a pool of worker
+# processes that each map the artifacts themselves, so throughput scales past
+# one core per uvicorn worker. Use with the bundle so the pool shares pages.
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "thread")
+PROCESS_WORKERS = int(os.getenv("PROCESS_WORKERS", str(os.cpu_count() or 2)))
+
+# "blocking" loads every artifact before the server accepts connections.
+# "background" binds at once and loads in stages (bundle.load_stages): trending,
+# then titles, then content neighbours, then CF and /suggest. Until the last
+# stage /readyz answers 503 and /recommend serves trending or content-only results.
+STARTUP_MODE = os.getenv("STARTUP_MODE", "blocking")
+
+# The active artifact generation. A reload builds the next one alongside it and
+# then rebinds this name (double buffering); it is never mutated in place, so a
+# request that pinned the old dict (see pin_artifacts) finishes against it.
 artifacts = {}
-poster_lookup = {}
+poster_store = None
+reload_lock = threading.Lock()
+reload_status = {"loading": None, "last_error": None, "reloaded_at": None}
+# Requests currently pinned to each generation (by id), so a retired
+# generation's process pool is only shut down once they have finished.
+_pins = {}
+_pins_changed = threading.Condition()
+# Upper bound on that wait; a request still running after it falls back to
+# in-process scoring (see _offload).
+RETIRE_TIMEOUT = 300
+# Seconds since process start at which each stage went live, and the first
+# /recommend answer that had recommendations in it (time to first useful response).
+startup = {"mode": STARTUP_MODE, "error": None, "stages": {}, "first_useful_response_s": None}
+_imported_at = time.monotonic()
+
+def _process_age():
+    # Process start from /proc (Linux) so interpreter and import time count too.
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0]) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _imported_at
+
+def _mark_startup(event):
+    at = _process_age()
+    startup["stages"][event] = round(at, 3)
+    print(f"Startup: {event} at {at:.2f}s")
+
+def _bundle_dir(version=None):
+    if version:
+        return os.path.join(ARTIFACT_VERSIONS, version)
+    current = bundle.current_version(ARTIFACT_VERSIONS)
+    return os.path.join(ARTIFACT_VERSIONS, current) if current else BUNDLE_DIR
+
+def _load_generation(bundle_dir):
+    # Memory-mapped bundle (python bundle.py) when present, else the pickles.
+    return _start_pool(bundle.load_serving(bundle_dir, "artifacts", **SERVING), bundle_dir)
+
+def _start_pool(loaded, bundle_dir):
+    loaded['bundle_dir'] = bundle_dir
+    if EXECUTION_MODE == "process":
+        # Each generation gets its own pool, mapped onto its own bundle.
+        loaded['process_pool'] = workers.start_pool(PROCESS_WORKERS, bundle_dir, "artifacts", **SERVING)
+        print(f"Scoring in {PROCESS_WORKERS} worker processes")
+    return loaded
+
+def _open_posters():
+    # Re-checked on every (re)load, so a store created after startup is picked up.
+    global poster_store
+    poster_store = posters.PosterStore.open(POSTER_DB)
+    if poster_store is not None:
+        print(f"Posters from {POSTER_DB}")
+
+def _pin(arts):
+    with _pins_changed:
+        _pins[id(arts)] = _pins.get(id(arts), 0) + 1
+
+def _unpin(arts):
+    with _pins_changed:
+        count = _pins.pop(id(arts)) - 1
+        if count:
+            _pins[id(arts)] = count
+        _pins_changed.notify_all()
+
+def _retire(old, cancel=False):
+    # Waits for the requests still pinned to `old`, then shuts its pool down;
+    # tasks already submitted run to completion unless cancelled.
+    pool = old.get('process_pool')
+    if pool is None:
+        return
+    if not cancel:
+        with _pins_changed:
+            _pins_changed.wait_for(lambda: id(old) not in _pins, timeout=RETIRE_TIMEOUT)
+    pool.shutdown(wait=True, cancel_futures=cancel)
+
+def reload_artifacts(version=None):
+    """Load a version next to the active one, then swap it in. Returns the new version."""
+    global artifacts
+    with reload_lock:
+        bundle_dir = _bundle_dir(version)
+        reload_status["loading"] = bundle_dir
+        try:
+            new = _load_generation(bundle_dir)
+        except Exception as exc:
+            reload_status["last_error"] = f"{bundle_dir}: {type(exc).__name__}: {exc}"
+            raise
+        finally:
+            reload_status["loading"] = None
+        old, artifacts = artifacts, new
+        _open_posters()
+        # Cache keys carry the version, so this only frees the old generation's entries.
+        _clear_caches()
+        reload_status.update(last_error=None, reloaded_at=time.time())
+        threading.Thread(target=_retire, args=(old,), daemon=True).start()
+        print(f"Serving artifact version {new['version']} (was {old.get('version')})")
+        return new['version']
+
+def _clear_caches():
+    title_cache.clear()
+    result_cache.clear()
+    ranking_cache.clear()
+
+def _warm_up(bundle_dir):
+    # STARTUP_MODE=background: each stage replaces the last as soon as it is
+    # built. Partial stages get their own version label, so nothing cached from
+    # them outlives the stage. Holding reload_lock keeps reloads out meanwhile.
+    global artifacts
+    try:
+        with reload_lock:
+            reload_status["loading"] = bundle_dir
+            for stage, loaded in bundle.load_stages(bundle_dir, "artifacts", **SERVING):
+                if stage == "ready":
+                    # The process pool maps the full set itself; start it only now.
+                    loaded = _start_pool(loaded, bundle_dir)
+                else:
+                    loaded.update(bundle_dir=bundle_dir, version=f"{loaded['version']}+{stage}")
+                artifacts = loaded
+                _clear_caches()
+                _mark_startup(stage)
+    except Exception as exc:
+        startup["error"] = f"{bundle_dir}: {type(exc).__name__}: {exc}"
+        print(f"Background load failed: {startup['error']}")
+    finally:
+        reload_status["loading"] = None
+
+async def _watch_current():
+    # File-watch trigger: reload whenever CURRENT is repointed. Only a change
+    # counts, so an explicit /admin/reload to another version is not undone.
+    seen = _bundle_dir()
+    while True:
+        await asyncio.sleep(RELOAD_WATCH_SECONDS)
+        target = _bundle_dir()
+        if target == seen or reload_lock.locked():
+            continue
+        seen = target              # a broken version is not retried until CURRENT moves again
+        try:
+            await run_in_threadpool(reload_artifacts)
+        except Exception as exc:
+            print(f"Reload of {target} failed: {exc}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Fail fast: any missing/corrupt artifact aborts startup with the real error,
-    # instead of silently leaving `artifacts` empty and 500-ing on every request.
-    print("Loading model artifacts...")
-    with open("artifacts/movies_df.pkl", "rb") as f:
-        artifacts['movies_df'] = pickle.load(f)
-    with open("artifacts/similarity.pkl", "rb") as f:
-        artifacts['similarity'] = pickle.load(f)
-    with open("artifacts/tmdb_to_ml.pkl", "rb") as f:
-        artifacts['tmdb_to_ml'] = pickle.load(f)
-    with open("artifacts/movie_id_search.pkl", "rb") as f:
-        artifacts['movie_id_search'] = pickle.load(f)
-
-    # Trending is optional: cold start degrades gracefully without it
-    try:
-        with open("artifacts/trending.pkl", "rb") as f:
-            artifacts['trending'] = pickle.load(f)
-    except FileNotFoundError:
-        print("Warning: trending.pkl not found. Cold start will be empty.")
-        artifacts['trending'] = []
-
-    loaded_sim = np.load("artifacts/movie_similarity.npy", allow_pickle=True)
-    if loaded_sim.ndim == 0:
-        artifacts['movie_similarity'] = loaded_sim.item()
+    # Blocking mode fails fast: any missing/corrupt artifact aborts startup with
+    # the real error, instead of silently leaving `artifacts` empty and 500-ing on
+    # every request. Background mode reports it on /livez and /readyz instead.
+    global artifacts
+    _open_posters()
+    if STARTUP_MODE == "background":
+        print("Loading model artifacts in the background...")
+        threading.Thread(target=_warm_up, args=(_bundle_dir(),), daemon=True).start()
     else:
-        artifacts['movie_similarity'] = loaded_sim
+        print("Loading model artifacts...")
+        artifacts = _load_generation(_bundle_dir())
+        _mark_startup("ready")
+    _clear_caches()
+    _mark_startup("listening")
+    watcher = asyncio.create_task(_watch_current()) if RELOAD_WATCH_SECONDS > 0 else None
 
     yield
-    artifacts.clear()
+    if watcher is not None:
+        watcher.cancel()
+    _retire(artifacts, cancel=True)
+    artifacts = {}
+    _clear_caches()
 
-limiter = Limiter(key_func=get_remote_address)
+# Per-IP limits, shared by every `uvicorn --workers N` process on the host
+# through RATE_LIMIT_FILE (see ratelimit.py). RATE_LIMIT_ENABLED=0 turns them
+# off (load tests / benchmarks only).
+limiter = ratelimit.Limiter(key_func=ratelimit.client_address,
+                            enabled=os.getenv("RATE_LIMIT_ENABLED", "1") != "0",
+                            path=os.getenv("RATE_LIMIT_FILE", ratelimit.DEFAULT_PATH))
 app = FastAPI(lifespan=lifespan)
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 # Only the local Streamlit frontend may call this API from a browser context.
 # Update allow_origins if you ever deploy the frontend elsewhere.
@@ -57,155 +269,566 @@ app.add_middleware(
     allow_origins=["http://localhost:8501", "http://127.0.0.1:8501"],
     allow_methods=["GET"],
     allow_headers=[],
+    expose_headers=["X-Artifact-Version", "Server-Timing"],
 )
 
+@app.middleware("http")
+async def pin_artifacts(request: Request, call_next):
+    # One artifact generation per request, start to finish, even if a reload
+    # swaps in a new one meanwhile; the response says which one answered.
+    active = artifacts
+    request.state.artifacts = active
+    _pin(active)
+    try:
+        response = await call_next(request)
+    finally:
+        _unpin(active)
+    if active.get('version'):
+        response.headers["X-Artifact-Version"] = str(active['version'])
+    return response
+
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    # Whole-request latency per route, plus per-stage timings echoed back in a
+    # Server-Timing header when the client asks with X-Server-Timing: 1.
+    timings = metrics.collect_timings() if request.headers.get("x-server-timing") == "1" else None
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    metrics.observe_request(route.path if route is not None else "unmatched", elapsed)
+    if timings is not None:
+        response.headers["Server-Timing"] = metrics.server_timing_header(timings, elapsed)
+    return response
+
+def _loaded(arts, stage):
+    # True once `arts` has everything of `stage` (see bundle.STAGES).
+    return arts.get('stage') in bundle.STAGES and bundle.STAGES.index(arts['stage']) >= bundle.STAGES.index(stage)
+
+def _partial(arts):
+    # Rankings are content-only while the CF matrix is missing: before the ready
+    # stage from pickles. A mapped bundle has CF from the content stage on.
+    return 'movie_similarity' not in arts
+
+def _require(arts, stage):
+    if not _loaded(arts, stage):
+        raise HTTPException(status_code=503, headers={"Retry-After": "2"},
+                            detail=f"Still loading artifacts (at stage {arts.get('stage')})")
+
 #Health check / landing route -- lets Render confirm the service is up,
 # and shows a friendly message instead of a 404 if you open the URL in a browser.
 @app.get("/")
 @app.get("/healthz")
-def health():
+def health(request: Request):
+    arts = request.state.artifacts
     return {
         "status": "ok",
         "service": "MovieMatch AI backend",
+        "version": arts.get('version'),
+        "stage": arts.get('stage'),
+        "ready": _loaded(arts, "ready"),
         "try": "/recommend?title=Inception",
     }
 
-#Helper Functions
+# Liveness: the process is up and not wedged. Only a failed background load
+# fails it, since restarting is the way out of that.
+@app.get("/livez")
+def livez():
+    if startup["error"]:
+        return JSONResponse({"status": "failed", "error": startup["error"]}, status_code=503)
+    return {"status": "ok"}
+
+# Readiness: every artifact is loaded. While warming up the server still
+# answers, but with trending or partial results.
+@app.get("/readyz")
+def readyz(request: Request):
+    arts = request.state.artifacts
+    body = {"stage": arts.get('stage'), "version": arts.get('version'), **startup}
+    if not _loaded(arts, "ready"):
+        return JSONResponse({"status": "loading", **body}, status_code=503, headers={"Retry-After": "2"})
+    return {"status": "ready", **body}
+
+class BatchItem(BaseModel):
+    title: str = Field("", max_length=200)
+    alpha: float = Field(0.45, ge=0.0, le=1.0)
+    genre: str = Field("All", max_length=100)
+    genre_mode: str = Field("any", pattern="^(any|all)$")
 
-def cf_similarity(tmdb_id_1, tmdb_id_2):
-    tmdb_to_ml = artifacts.get('tmdb_to_ml')
-    movie_id_search = artifacts.get('movie_id_search')
-    movie_similarity = artifacts.get('movie_similarity')
+class BatchRequest(BaseModel):
+    # Capped so one call can't monopolise a worker; page larger jobs client-side.
+    items: list[BatchItem] = Field(..., min_length=1, max_length=1000)
+    stream: bool = False
 
-    if tmdb_id_1 not in tmdb_to_ml or tmdb_id_2 not in tmdb_to_ml: return 0.0
-    ml_id_1, ml_id_2 = tmdb_to_ml[tmdb_id_1], tmdb_to_ml[tmdb_id_2]
-    if ml_id_1 not in movie_id_search or ml_id_2 not in movie_id_search: return 0.0
-    
-    return movie_similarity[movie_id_search[ml_id_1], movie_id_search[ml_id_2]]
+class ProfileRequest(BaseModel):
+    # Seeds are titles (resolved like /recommend) or tmdb ids.
+    liked: list[Union[int, str]] = Field(..., min_length=1, max_length=100)
+    disliked: list[Union[int, str]] = Field(default_factory=list, max_length=100)
+    alpha: float = Field(0.45, ge=0.0, le=1.0)
+    genre: str = Field("All", max_length=100)
+    genre_mode: str = Field("any", pattern="^(any|all)$")
+    top_n: int = Field(10, ge=1, le=50)
 
 #API Endpoint
-def _content_candidates(user_input, top_k=50):
-    movies_df = artifacts['movies_df']
-    similarity = artifacts['similarity']
-    all_titles = movies_df['title'].tolist()
-    
-    # --- STRATEGY 1: SMART EXACT MATCH (Handles "spiderman", "ironman") ---
-    def clean_text(text):
-        return re.sub(r'[^a-zA-Z0-9]', '', str(text)).lower()
-
-    cleaned_input = clean_text(user_input)
-    cleaned_titles = movies_df['title'].apply(clean_text)
-    exact_matches = movies_df[cleaned_titles == cleaned_input]
-    
-    if not exact_matches.empty:
-        movie_index = exact_matches.index[0]
-        
-    else:
-        # --- STRATEGY 2: ROBUST FUZZY MATCH (Handles "shawshank redeption") ---
-        # We revert to 'token_sort_ratio' which is safer for typos in long phrases.
-        # It prevents "RED" from matching "Redemption" just because it's a substring.
-        best_match = process.extractOne(user_input, all_titles, scorer=fuzz.token_sort_ratio)
-        
-        # Threshold 65: Flexible enough for typos, strict enough to reject garbage
-        if not best_match or best_match[1] < 65:
-            return None, None 
-            
-        matched_title = best_match[0]
-        matches = movies_df[movies_df['title'] == matched_title]
-        if matches.empty:
-            return None, None
-            
-        movie_index = matches.index[0]
-
-    # Get Recommendations
-    similar_movies = list(enumerate(similarity[movie_index]))
-    sorted_similar_movies = sorted(similar_movies, key=lambda x: x[1], reverse=True)[1:top_k+1]
-    
-    return movie_index, sorted_similar_movies
+# Helpers below take the request's pinned artifact generation (`arts`) rather
+# than reading the global, so one request never mixes two versions.
+def _offload(arts, task, *args):
+    # Run a workers.* task in-process, or in the generation's process pool
+    # (EXECUTION_MODE=process) with this thread only waiting on the result.
+    pool = arts.get('process_pool')
+    if pool is not None:
+        try:
+            future = pool.submit(workers.run, task, *args)
+        except RuntimeError:
+            # The generation was retired under a long-running request: its pool
+            # is shut down, but the parent still has the same artifacts mapped.
+            pool = None
+    if pool is None:
+        return task(*args, artifacts=arts)
+    result, delta = future.result()
+    metrics.merge(delta)
+    return result
+
+def _resolve_title(arts, user_input):
+    # Exact cleaned-title hit first ("spiderman" -> "Spider-Man"), then a trigram
+    # shortlist scored with token_sort_ratio (threshold 65) -- see title_index.py.
+    with metrics.timer("resolve"):
+        row, method = title_cache.get_or_compute((arts['version'], user_input),
+                                                 lambda: _offload(arts, workers.resolve, user_input))
+    metrics.incr(f"{method}_match" if method else "no_match")
+    return row
+
+def _recommend_for(arts, base_idx, alpha, genre, genre_mode="any"):
+    with metrics.timer("rank"):
+        # A table hit is a lookup, so it never goes to the process pool.
+        hit = scoring.lookup_materialized(arts, base_idx, alpha, genre) if MATERIALIZED else None
+        if hit is None:
+            rows, final_scores = _offload(arts, workers.rank, base_idx, alpha, genre, genre_mode)
+        else:
+            metrics.incr("materialized_hit")
+            rows, final_scores = hit
+    response = _recommendation_response(arts, base_idx, rows, final_scores, genre)
+    return _with_cursor(arts, response, base_idx, alpha, genre, genre_mode)
+
+def _metadata(tmdb_ids):
+    # {tmdb_id: (poster, imdb_rating, genres)} for one response, in one query.
+    store = poster_store
+    if store is None:
+        return {}
+    try:
+        return store.lookup(tmdb_ids)
+    except sqlite3.Error as exc:
+        # A missing or half-written store degrades to placeholders, never a 500.
+        print(f"Poster store unavailable: {exc}")
+        return {}
+
+def _card(title, score, tmdb_id, meta):
+    poster, imdb_rating, genres = meta or (None, None, [])
+    return {
+        "title": title,
+        "score": score,
+        "tmdb_id": tmdb_id,
+        "poster_url": _poster_url(tmdb_id, title, poster),
+        "imdb_rating": imdb_rating,
+        "genres": genres,
+    }
+
+def _poster_url(tmdb_id, title, poster_url=None):
+    if not poster_url:
+        safe_title = urllib.parse.quote_plus(str(title))
+        poster_url = f"https://placehold.co/400x600/2c3e50/ffffff?text={safe_title}"
+    return poster_url
+
+def _cold_start_response(arts):
+    metrics.incr("cold_start")
+    trending = arts.get('trending', [])
+
+    if not trending:
+        return {
+            "source_movie": "Unknown",
+            "recommendations": [],
+            "message": "Movie not found and no trending data available."
+        }
+
+    meta = _metadata(m['tmdbId'] for m in trending[:10])
+    return {
+        "source_movie": "Trending Movies (Cold Start)",
+        "recommendations": [
+            _card(m['title'], float(m.get('vote_average', 0))/10,
+                  int(m['tmdbId']),  # <--- FIXED: Changed 'tmdb_id' to 'tmdbId'
+                  meta.get(int(m['tmdbId'])))
+            for m in trending[:10]
+        ]
+    }
+
+def _cards(arts, rows, final_scores):
+    titles = arts['titles']
+    tmdb_ids = arts['tmdb_ids']
+
+    with metrics.timer("format"):
+        ids = [int(tmdb_ids[idx]) for idx in rows.tolist()]
+        meta = _metadata(ids)
+        return [
+            _card(titles[idx], final_score, tmdb_id, meta.get(tmdb_id))
+            for idx, tmdb_id, final_score in zip(rows.tolist(), ids, final_scores.tolist())
+        ]
+
+def _recommendation_response(arts, base_idx, rows, final_scores, genre):
+    titles = arts['titles']
+    rescored = _cards(arts, rows, final_scores)
+
+    # Handle empty result after filtering (counted by the callers, per response)
+    if not rescored:
+         return {
+            "source_movie": titles[base_idx],
+            "recommendations": [],
+            "message": f"No '{genre}' movies found similar to this."
+         }
+
+    return {
+        "source_movie": titles[base_idx],
+        "recommendations": rescored
+    }
+
+def _encode_cursor(arts, base_idx, alpha, genre, genre_mode, depth, offset):
+    # Opaque to clients: the resolved movie and everything its ranking depends on.
+    state = {"v": arts['version'], "m": int(base_idx), "a": alpha, "g": genre, "gm": genre_mode,
+             "d": depth, "o": offset}
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def _decode_cursor(arts, cursor):
+    """(base_idx, alpha, genre, genre_mode, depth, offset) of a cursor from _encode_cursor."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        version, *query = (state[key] for key in ("v", "m", "a", "g", "gm", "d", "o"))
+        base_idx, alpha, genre, genre_mode, depth, offset = query = tuple(query)
+        valid = (isinstance(base_idx, int) and 0 <= base_idx < len(arts['titles'])
+                 and isinstance(alpha, (int, float)) and 0 <= alpha <= 1
+                 and isinstance(genre, str) and len(genre) <= 100 and genre_mode in ("any", "all")
+                 and isinstance(depth, int) and 1 <= depth <= MAX_DEPTH
+                 and isinstance(offset, int) and 0 <= offset <= depth)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if version != arts['version']:
+        # Rows mean different movies in another artifact version.
+        raise HTTPException(status_code=410, detail=f"Cursor is from artifact version {version}; "
+                                                    "request the first page again")
+    return query
+
+def _with_cursor(arts, response, base_idx, alpha, genre, genre_mode, depth=TOP_K):
+    # A full first page links to the next one. The candidates may run out
+    # exactly there, in which case that page is empty.
+    full = len(response["recommendations"]) == TOP_N
+    response["next_cursor"] = _encode_cursor(arts, base_idx, alpha, genre, genre_mode, depth, TOP_N) if full else None
+    return response
+
+def _resolve_seed(arts, seed):
+    if isinstance(seed, int):
+        return arts['tmdb_rows'].get(seed)
+    if len(seed) > 200 or not seed.strip():
+        return None
+    return _resolve_title(arts, seed)
+
+@app.get("/resolve")
+@limiter.limit("30/minute")
+def resolve(request: Request, title: str = Query(..., min_length=1, max_length=200)):
+    # Title resolution on its own, so its latency can be measured apart from scoring.
+    arts = request.state.artifacts
+    _require(arts, "titles")
+    start = time.perf_counter()
+    movie_index, method, score = arts['title_index'].resolve(title)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if movie_index is None:
+        return {"query": title, "match": None, "score": score, "elapsed_ms": elapsed_ms}
+    return {
+        "query": title,
+        "match": arts['titles'][movie_index],
+        "tmdb_id": int(arts['tmdb_ids'][movie_index]),
+        "method": method,
+        "score": score,
+        "elapsed_ms": elapsed_ms,
+    }
+
+@app.get("/suggest")
+@limiter.limit("600/minute")
+async def suggest(request: Request, q: str = Query("", max_length=200),
+                  limit: int = Query(10, ge=1, le=25)):
+    # Typeahead: prefix / token-prefix matches from a sorted key array, most
+    # voted first (suggest.py). Microseconds of work, so it runs on the event
+    # loop; the higher rate limit allows one call per keystroke.
+    arts = request.state.artifacts
+    _require(arts, "ready")
+    with metrics.timer("suggest"):
+        rows = arts['suggest_index'].suggest(q, limit)
+    return {
+        "query": q,
+        "suggestions": [{"title": arts['titles'][r], "tmdb_id": int(arts['tmdb_ids'][r])} for r in rows],
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # Prometheus text format: per-route and per-stage latency histograms, event
+    # counters (exact / fuzzy / no match, cold starts, genre-empty results) and
+    # cache totals.
+    cache_totals = []
+    for name, cache in (("results", result_cache), ("titles", title_cache), ("rankings", ranking_cache)):
+        stats = cache.stats()
+        for field in ("hits", "misses", "coalesced", "evictions", "expirations"):
+            cache_totals.append((f"moviematch_cache_{field}_total", {"cache": name}, stats[field]))
+    return PlainTextResponse(metrics.render(cache_totals), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"results": result_cache.stats(), "titles": title_cache.stats(), "rankings": ranking_cache.stats()}
 
 @app.get("/recommend")
 @limiter.limit("30/minute")
-def recommend(
+async def recommend(
     request: Request,
     # max_length caps the input before it hits fuzzy matching over every title (DoS guard);
     # longest real movie titles are well under 200 chars.
     title: str = Query("", max_length=200),
     # alpha is a blend weight; anything outside [0, 1] produces nonsensical scores.
     alpha: float = Query(0.45, ge=0.0, le=1.0),
-    genre: str = Query("All", max_length=50),
+    # One genre, or a comma-separated list combined per genre_mode (any = OR, all = AND).
+    genre: str = Query("All", max_length=100),
+    genre_mode: str = Query("any", pattern="^(any|all)$"),
+    # Paging: `limit` results from the best `depth` candidates (default TOP_K,
+    # or `limit` if that is larger). A response's next_cursor fetches the next
+    # page of the same ranking (title, alpha, genre and depth are then taken
+    # from the cursor); stream=true answers in NDJSON.
+    limit: int = Query(TOP_N, ge=1, le=MAX_DEPTH),
+    depth: Optional[int] = Query(None, ge=1, le=MAX_DEPTH),
+    cursor: Optional[str] = Query(None, max_length=1000),
+    stream: bool = Query(False),
 ):
-    movies_df = artifacts['movies_df']
-    
+    arts = request.state.artifacts
+    if depth is not None and depth < limit and cursor is None:
+        # The page would silently stop at `depth` with no cursor to continue from.
+        raise HTTPException(status_code=422, detail=f"depth ({depth}) must be at least limit ({limit})")
+    if cursor is not None or stream or limit != TOP_N or depth not in (None, TOP_K):
+        depth = depth or max(TOP_K, limit)
+        head, ranking, query = await run_in_threadpool(_recommend_page, arts, title, alpha, genre,
+                                                       genre_mode, depth, cursor)
+        if stream:
+            return StreamingResponse(_page_lines(arts, head, ranking, query, limit),
+                                     media_type="application/x-ndjson")
+        return await run_in_threadpool(_page_response, arts, head, ranking, query, limit)
+    # Off the event loop either way: a thread-pool thread does the work itself,
+    # or just waits on the process pool.
+    response = await run_in_threadpool(_recommend, arts, title, alpha, genre, genre_mode)
+    if (startup["first_useful_response_s"] is None and response.get("recommendations")
+            and not response.get("warming_up")):
+        startup["first_useful_response_s"] = round(_process_age(), 3)
+        print(f"Startup: first useful /recommend response at {startup['first_useful_response_s']:.2f}s")
+    return response
+
+def _snap_alpha(alpha):
+    return round(round(alpha / ALPHA_GRID) * ALPHA_GRID, 6) if ALPHA_GRID > 0 else alpha
+
+@metrics.profiled("recommend_page")
+def _recommend_page(arts, title, alpha, genre, genre_mode, depth, cursor):
+    """Start of a paged answer: (head, ranking, query). `head` is the response
+    minus its recommendations; without a ranking (warming up, cold start) it is
+    the whole trending response. `query` is what _decode_cursor returns."""
+    if not _loaded(arts, "content"):
+        return _warming_up_response(arts), None, None
+    if cursor is not None:
+        query = _decode_cursor(arts, cursor)
+    else:
+        base_idx = _resolve_title(arts, title) if title.strip() else None
+        query = (base_idx, _snap_alpha(alpha), genre, genre_mode, depth, 0)
+    if query[0] is None:
+        return _cold_start_response(arts), None, None
+
+    base_idx, alpha, genre, genre_mode, depth, offset = query
+    ranking = ranking_cache.get_or_compute(
+        (arts['version'], int(base_idx), alpha, genre, genre_mode, depth),
+        lambda: scoring.PartialRanking(*_offload(arts, workers.score, base_idx, alpha, genre, genre_mode, depth)))
+    head = {"source_movie": arts['titles'][base_idx], "offset": offset, "total": len(ranking)}
+    if not len(ranking):
+        metrics.incr("genre_empty")
+        head["message"] = f"No '{genre}' movies found similar to this."
+    if _partial(arts):
+        head["partial"] = True
+    return head, ranking, query
+
+def _page(arts, ranking, start, stop):
+    with metrics.timer("page"):
+        rows, final_scores = ranking.take(start, stop)
+    return _cards(arts, rows, final_scores)
+
+def _next_cursor(arts, query, stop, total):
+    return _encode_cursor(arts, *query[:5], stop) if stop < total else None
+
+def _page_response(arts, head, ranking, query, limit):
+    if ranking is None:
+        return head
+    offset = query[5]
+    stop = min(offset + limit, len(ranking))
+    return {**head, "recommendations": _page(arts, ranking, offset, stop),
+            "next_cursor": _next_cursor(arts, query, stop, len(ranking))}
+
+def _page_lines(arts, head, ranking, query, limit):
+    # NDJSON: the head, one line per recommendation with its rank, then
+    # {"next_cursor": ...}. Results are selected, sorted and formatted
+    # STREAM_CHUNK at a time, so the first lines are out before the rest of a
+    # long page is ranked.
+    head = dict(head)
+    trending = head.pop("recommendations", [])
+    yield json.dumps(head) + "\n"
+    if ranking is None:
+        for rank, card in enumerate(trending, 1):
+            yield json.dumps({"rank": rank, **card}) + "\n"
+        yield json.dumps({"next_cursor": None}) + "\n"
+        return
+    offset = query[5]
+    stop = min(offset + limit, len(ranking))
+    for start in range(offset, stop, STREAM_CHUNK):
+        for rank, card in enumerate(_page(arts, ranking, start, min(start + STREAM_CHUNK, stop)), start + 1):
+            yield json.dumps({"rank": rank, **card}) + "\n"
+    yield json.dumps({"next_cursor": _next_cursor(arts, query, stop, len(ranking))}) + "\n"
+
+def _warming_up_response(arts):
+    metrics.incr("warming_up")
+    return {**_cold_start_response(arts), "warming_up": True,
+            "message": "Recommendations are still loading; here is what is trending meanwhile."}
+
+@metrics.profiled("recommend")
+def _recommend(arts, title, alpha, genre, genre_mode):
+    # Background startup: trending until content neighbours are in, then
+    # content-only rankings (flagged partial) if CF is not in yet.
+    if not _loaded(arts, "content"):
+        return _warming_up_response(arts)
     base_idx = None
-    candidates = None
 
     # Only run search if title is not empty
     if title.strip():
-        base_idx, candidates = _content_candidates(title, top_k=50)
+        base_idx = _resolve_title(arts, title)
 
     # --- COLD START BLOCK ---
     if base_idx is None:
-        trending = artifacts.get('trending', [])
-        
-        if not trending:
-            return {
-                "source_movie": "Unknown", 
-                "recommendations": [],
-                "message": "Movie not found and no trending data available."
-            }
-            
-        return {
-            "source_movie": "Trending Movies (Cold Start)",
-            "recommendations": [
-                {
-                    "title": m['title'], 
-                    "score": float(m.get('vote_average', 0))/10, 
-                    "tmdb_id": int(m['tmdbId']),  # <--- FIXED: Changed 'tmdb_id' to 'tmdbId'
-                    "poster_url": poster_lookup.get(m['tmdbId'], f"https://placehold.co/400x600/2c3e50/ffffff?text={urllib.parse.quote_plus(str(m['title']))}")
-                } for m in trending[:10]
-            ]
-        }
+        return _cold_start_response(arts)
 
     # --- NORMAL RECOMMENDATION BLOCK ---
-    base_movie = movies_df.iloc[base_idx]
-    rescored = []
-
-    for idx, content_score in candidates:
-        candidate = movies_df.iloc[idx]
-        
-        # Genre Filter
-        if genre != "All":
-            cand_genres = candidate.genres if isinstance(candidate.genres, list) else []
-            if genre not in cand_genres:
-                continue
-
-        # Hybrid Score
-        cf_score = cf_similarity(base_movie.tmdbId, candidate.tmdbId)
-        final_score = alpha * content_score + (1 - alpha) * cf_score
-        
-        poster_url = poster_lookup.get(candidate.tmdbId)
-        if not poster_url:
-            safe_title = urllib.parse.quote_plus(str(candidate.title))
-            poster_url = f"https://placehold.co/400x600/2c3e50/ffffff?text={safe_title}"
-
-        rescored.append({
-            "title": candidate.title,
-            "score": float(final_score),
-            "tmdb_id": int(candidate.tmdbId),
-            "poster_url": poster_url
-        })
-
-    rescored.sort(key=lambda x: x["score"], reverse=True)
-    
-    # Handle empty result after filtering
-    if not rescored:
-         return {
-            "source_movie": base_movie.title,
-            "recommendations": [],
-            "message": f"No '{genre}' movies found similar to this."
-         }
+    # Cached per (version, movie, alpha snapped to the slider grid, genre);
+    # concurrent identical requests share one computation.
+    alpha = _snap_alpha(alpha)
+    response = result_cache.get_or_compute((arts['version'], int(base_idx), alpha, genre, genre_mode),
+                                           lambda: _recommend_for(arts, base_idx, alpha, genre, genre_mode))
+    # Counted here rather than in _recommend_for, so cached empty answers count too.
+    if not response["recommendations"]:
+        metrics.incr("genre_empty")
+    return {**response, "partial": True} if _partial(arts) else response
 
+@app.post("/recommend/batch")
+@limiter.limit("30/minute")
+@metrics.profiled("recommend_batch")
+def recommend_batch(request: Request, batch: BatchRequest):
+    # Titles are resolved once per distinct string, then the resolved items are
+    # rescored BATCH_BLOCK at a time as one candidate matrix (scoring.rescore_batch).
+    arts = request.state.artifacts
+    _require(arts, "content")
+    resolved = {}
+    for item in batch.items:
+        if item.title not in resolved:
+            resolved[item.title] = _resolve_title(arts, item.title) if item.title.strip() else None
+    base_rows = [resolved[item.title] for item in batch.items]
+
+    def results():
+        for start in range(0, len(batch.items), BATCH_BLOCK):
+            block = range(start, min(start + BATCH_BLOCK, len(batch.items)))
+            hits = [i for i in block if base_rows[i] is not None]
+            if hits:
+                with metrics.timer("rescore_batch"):
+                    rows, final_scores = scoring.rescore_batch(
+                        arts,
+                        [base_rows[i] for i in hits],
+                        [batch.items[i].alpha for i in hits],
+                        [batch.items[i].genre for i in hits],
+                        modes=[batch.items[i].genre_mode for i in hits],
+                    )
+                scored = dict(zip(hits, zip(rows, final_scores)))
+            for i in block:
+                if base_rows[i] is None:
+                    yield {"index": i, **_cold_start_response(arts)}
+                    continue
+                rows_i, scores_i = scored[i]
+                keep = np.isfinite(scores_i)
+                item = batch.items[i]
+                response = _recommendation_response(arts, base_rows[i], rows_i[keep], scores_i[keep], item.genre)
+                if not response["recommendations"]:
+                    metrics.incr("genre_empty")
+                yield {"index": i, **_with_cursor(arts, response, base_rows[i], item.alpha, item.genre,
+                                                  item.genre_mode)}
+
+    if batch.stream:
+        return StreamingResponse((json.dumps(r) + "\n" for r in results()), media_type="application/x-ndjson")
+    return {"results": list(results())}
+
+@app.post("/recommend/profile")
+@limiter.limit("30/minute")
+@metrics.profiled("recommend_profile")
+def recommend_profile(request: Request, profile: ProfileRequest):
+    # One weighted reduction over every seed's content + CF rows (scoring.rank_profile):
+    # liked seeds pull with weight +1, disliked ones push with -1.
+    arts = request.state.artifacts
+    _require(arts, "content")
+    seeds, weights, unresolved = [], [], []
+    for weight, group in ((1.0, profile.liked), (-1.0, profile.disliked)):
+        for seed in group:
+            row = _resolve_seed(arts, seed)
+            if row is None:
+                unresolved.append(seed)
+            elif row not in seeds:
+                seeds.append(row)
+                weights.append(weight)
+
+    if not any(w > 0 for w in weights):
+        return {**_cold_start_response(arts), "unresolved": unresolved}
+
+    with metrics.timer("rank_profile"):
+        rows, final_scores = scoring.rank_profile(arts, seeds, weights, profile.alpha,
+                                                  profile.genre, profile.top_n, profile.genre_mode)
+    response = _recommendation_response(arts, seeds[0], rows, final_scores, profile.genre)
+    response.pop("source_movie")
+    if not response["recommendations"]:
+        metrics.incr("genre_empty")
     return {
-        "source_movie": base_movie.title,
-        "recommendations": rescored[:10]
-    }
\ No newline at end of file
+        "source_movies": [arts['titles'][r] for r, w in zip(seeds, weights) if w > 0],
+        **response,
+        "unresolved": unresolved,
+    }
+
+def _require_admin(x_admin_token):
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/admin/reload")
+def reload_state(request: Request, x_admin_token: str = Header("")):
+    # Load state and the last error text (paths, exception messages): admin only too.
+    _require_admin(x_admin_token)
+    return {"version": request.state.artifacts.get('version'), **reload_status}
+
+@app.post("/admin/reload")
+async def admin_reload(version: Optional[str] = Query(None, max_length=100),
+                       x_admin_token: str = Header("")):
+    # Loads <ARTIFACT_VERSIONS>/<version> (default: whatever CURRENT names) next to
+    # the live artifacts, then swaps. Traffic keeps flowing on the old version
+    # until the swap; nothing is restarted.
+    _require_admin(x_admin_token)
+    if version is not None and (os.path.basename(version) != version or version.startswith(".")):
+        raise HTTPException(status_code=400, detail="version must be a directory name")
+    if reload_lock.locked():
+        raise HTTPException(status_code=409, detail="A reload is already in progress")
+    target = _bundle_dir(version)
+    if not os.path.exists(os.path.join(target, bundle.MANIFEST)):
+        raise HTTPException(status_code=404, detail=f"No bundle at {target}")
+    previous = artifacts.get('version')
+    try:
+        active = await run_in_threadpool(reload_artifacts, version)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving {previous}: {exc}")
+    return {"version": active, "previous": previous}
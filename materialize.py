@@ -0,0 +1,255 @@
+"""
+materialize.py
+--------------
+Offline top-10 table for /recommend over the slider's alpha grid.
+
+Between deploys a (movie, genre, alpha) request always gets the same answer,
+so this works them out ahead of time: for every movie, every genre of the
+frontend's picker and alpha = 0, 0.05, ..., 1, the top 10 that live scoring
+would return. The backend answers those requests with a lookup
+(scoring.lookup_materialized) and scores live only for off-grid alphas, genre
+lists and movies left out of the table.
+
+21 alphas of one (movie, genre) mostly reshuffle the same dozen movies, so
+the table stores each (movie, genre)'s candidates once -- the union of every
+alpha's top 10, with their content and CF scores -- and per alpha only the
+ten positions into that span:
+
+    manifest.json     bundle version and content mode it was built for, grid, genres
+    rows.npy          int32   [N]            movie -> table row, -1 = not materialized
+    offsets.npy       int64   [M*G + 1]      (row, genre) -> span of the three below
+    cand_idx.npy      int32   [..]           candidate movies (uint16 when N fits)
+    content.npy       float32 [..]           their content scores
+    cf.npy            float32 [..]           their CF scores (float64 for float64 / int8 CF)
+    ranks.npy         uint8   [M*G, A, 10]   per alpha, best first, positions in
+                                             the span; 255 = fewer than 10 results
+
+A lookup re-blends alpha * content + (1 - alpha) * cf for those ten movies, the
+expression rescore evaluates, from scores stored at the precision live
+scoring sees them in, so rankings and scores match live scoring exactly.
+
+The table is written to <bundle>/materialized/ and mapped with the bundle
+(bundle.open_materialized); one built for another bundle version or content
+mode is ignored. Blocks of movies are scored in parallel worker processes
+that each map the bundle, as the serving pool does (workers.py).
+
+Run it on a bundle before publishing it (build_artifacts.py runs it as its
+materialize stage; bundle.py --versions and ingest.py take --materialize):
+    python materialize.py                            # artifacts/bundle/materialized/
+    python materialize.py --movies 20000 --jobs 8    # only the 20k most voted movies
+
+A published <versions>/<version>/ directory is refused: it is never modified,
+and a backend would not reload it anyway. Publish a new version instead.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+import ann
+import bundle
+import scoring
+
+# The frontend's genre picker (frontend_v2.GENRES).
+GENRES = ["All", "Action", "Adventure", "Animation", "Comedy", "Drama",
+          "Horror", "Romance", "Science Fiction", "Thriller"]
+ALPHA_STEP = 0.05               # the slider step, and main.py's CACHE_ALPHA_GRID default
+TOP_K = 50                      # candidates rescored per request (workers.rank)
+TOP_N = 10
+NO_RESULT = 255
+BLOCK = 256
+# Movies per task shrink on wide CF matrices so the dense CF block
+# (block x CF width) stays within DENSE_CELLS.
+DENSE_CELLS = 1 << 24
+
+_artifacts = {}
+
+
+def alpha_grid(step=ALPHA_STEP):
+    """The grid alphas, as main.py snaps them: round(round(alpha / step) * step, 6)."""
+    return [round(i * step, 6) for i in range(round(1 / step) + 1)]
+
+
+def _init(bundle_dir, serving):
+    _artifacts.update(bundle.load_serving(bundle_dir, **serving))
+
+
+def _block(base_rows, genres, alphas, top_k, top_n):
+    """Table entries of the movies `base_rows`, (movie, genre) major: span
+    lengths, the spans' candidates and scores, and the ranks."""
+    cand_idx, content, cf = scoring.candidate_scores(_artifacts, base_rows)
+    b, k = cand_idx.shape
+    width = min(top_n, k)
+    used = np.zeros((b, len(genres), k), dtype=bool)
+    picks = np.zeros((b, len(genres), len(alphas), top_n), dtype=np.int64)
+    found = np.zeros(picks.shape, dtype=bool)
+    for g, genre in enumerate(genres):
+        keep = scoring.candidate_mask(_artifacts, cand_idx, content, [genre] * b, ["any"] * b, top_k)
+        for a, alpha in enumerate(alphas):
+            # Exactly rescore_batch's blend and stable sort, so ties break the same way.
+            with np.errstate(invalid="ignore"):      # 0 * -inf on ANN padding, masked next
+                final = alpha * content + (1 - alpha) * cf
+            final[~keep] = -np.inf
+            order = np.argsort(-final, axis=1, kind="stable")[:, :width]
+            hit = np.isfinite(np.take_along_axis(final, order, axis=1))
+            picks[:, g, a, :width], found[:, g, a, :width] = order, hit
+            used[np.nonzero(hit)[0], g, order[hit]] = True
+
+    # Column of the neighbour row -> position in its (movie, genre) span.
+    position = np.cumsum(used, axis=2) - 1
+    ranks = np.full(picks.shape, NO_RESULT, dtype=np.uint8)
+    at = np.take_along_axis(position, picks.reshape(b, len(genres), -1), axis=2).reshape(picks.shape)
+    ranks[found] = at[found]
+    movie, _, column = np.nonzero(used)
+    return (used.sum(axis=2).ravel(), cand_idx[movie, column], content[movie, column], cf[movie, column],
+            ranks.reshape(b * len(genres), len(alphas), top_n))
+
+
+def build(bundle_dir, genres=GENRES, step=ALPHA_STEP, movies=0, jobs=None, block=BLOCK,
+          content_mode="table", nprobe=ann.DEFAULT_NPROBE, top_k=TOP_K, top_n=TOP_N):
+    """Write <bundle_dir>/materialized/ and return its manifest. `movies` > 0
+    keeps only that many of the most voted movies."""
+    if not os.path.exists(os.path.join(bundle_dir, bundle.MANIFEST)):
+        raise FileNotFoundError(f"{bundle_dir} is not a bundle (run python bundle.py first)")
+    start = time.perf_counter()
+    serving = {"content_mode": content_mode, "nprobe": nprobe}
+    arts = bundle.load_serving(bundle_dir, **serving)
+    n = len(arts['titles'])
+    skipped = [g for g in genres if g != "All" and g not in arts['genre_vocab']]
+    if skipped:
+        print(f"Not in this catalog, left to live scoring: {', '.join(skipped)}")
+    genres = [g for g in genres if g not in skipped]
+    alphas = alpha_grid(step)
+
+    selected = np.arange(n)
+    if 0 < movies < n:
+        popularity = arts.get('vote_counts')
+        if popularity is not None:
+            selected = np.sort(np.argsort(-np.asarray(popularity), kind="stable")[:movies])
+        else:
+            selected = selected[:movies]
+    m = len(selected)
+    rows = np.full(n, -1, dtype=np.int32)
+    rows[selected] = np.arange(m, dtype=np.int32)
+    block = max(1, min(block, DENSE_CELLS // max(arts['movie_similarity'].shape[1], 1)))
+    chunks = [selected[i:i + block] for i in range(0, m, block)]
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(chunks)))
+
+    out_dir = os.path.join(bundle_dir, bundle.MATERIALIZED)
+    tmp_dir = f"{out_dir}.tmp{os.getpid()}"
+    os.makedirs(tmp_dir)
+    # Content scores are float16 / float32 / int8 x float32 scale: all exact in
+    # float32. CF scores need float64 unless the CF data is float32 or narrower.
+    cf = arts['movie_similarity']
+    dtypes = {"cand_idx": np.uint16 if n <= 1 << 16 else np.int32, "content": np.float32,
+              "cf": np.float32 if cf.scale is None and cf.data.dtype.itemsize <= 4 else np.float64}
+    ranks = np.lib.format.open_memmap(os.path.join(tmp_dir, "ranks.npy"), mode="w+", dtype=np.uint8,
+                                      shape=(m * len(genres), len(alphas), top_n))
+    offsets = np.zeros(m * len(genres) + 1, dtype=np.int64)
+    # Spans are appended to raw files as blocks finish, then turned into .npy
+    # at the end: their total length is only known then.
+    spills = {name: open(os.path.join(tmp_dir, f"{name}.raw"), "wb") for name in dtypes}
+
+    args = (chunks, repeat(genres), repeat(alphas), repeat(top_k), repeat(top_n))
+    if jobs == 1:
+        _artifacts.update(arts)
+        pool, results = None, map(_block, *args)
+    else:
+        # spawn, not fork: each worker maps the bundle itself (see workers.py).
+        pool = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init, initargs=(bundle_dir, serving))
+        results = pool.map(_block, *args)
+    key = total = 0
+    try:
+        for done, (counts, cand_idx, content, cf, block_ranks) in enumerate(results, 1):
+            ranks[key:key + len(counts)] = block_ranks
+            offsets[key + 1:key + 1 + len(counts)] = total + np.cumsum(counts)
+            key, total = key + len(counts), total + int(counts.sum())
+            for name, values in (("cand_idx", cand_idx), ("content", content), ("cf", cf)):
+                spills[name].write(np.ascontiguousarray(values, dtype=dtypes[name]).tobytes())
+            if done % max(1, len(chunks) // 10) == 0 or done == len(chunks):
+                print(f"  {done}/{len(chunks)} blocks ({time.perf_counter() - start:.1f}s)", flush=True)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        for spill in spills.values():
+            spill.close()
+
+    ranks.flush()
+    del ranks
+    np.save(os.path.join(tmp_dir, "rows.npy"), rows)
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+    for name, dtype in dtypes.items():
+        raw = os.path.join(tmp_dir, f"{name}.raw")
+        np.save(os.path.join(tmp_dir, f"{name}.npy"),
+                np.memmap(raw, dtype=dtype, mode="r") if total else np.empty(0, dtype=dtype))
+        os.remove(raw)
+
+    manifest = {
+        "format_version": bundle.FORMAT_VERSION,
+        "version": arts['version'],
+        "content_mode": content_mode,
+        "nprobe": nprobe if content_mode == "ann" else None,
+        "top_k": top_k,
+        "top_n": top_n,
+        "alpha_step": step,
+        "alphas": alphas,
+        "genres": genres,
+        "movies": m,
+        "jobs": jobs,
+        "build_seconds": round(time.perf_counter() - start, 2),
+        "arrays": {},
+    }
+    for name in ("rows", "offsets", "cand_idx", "content", "cf", "ranks"):
+        array = np.load(os.path.join(tmp_dir, f"{name}.npy"), mmap_mode="r")
+        manifest["arrays"][name] = {"shape": list(array.shape), "dtype": str(array.dtype)}
+    with open(os.path.join(tmp_dir, bundle.MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Replace a previous table in one rename. A backend that still maps the
+    # old files keeps reading them until it reloads.
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.rename(tmp_dir, out_dir)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute /recommend top-10 lists over the alpha grid.")
+    parser.add_argument("--bundle", default=os.path.join("artifacts", "bundle"), help="bundle directory")
+    parser.add_argument("--movies", type=int, default=0, help="only the N most voted movies (default: all)")
+    parser.add_argument("--genres", nargs="+", default=GENRES, help="genres to materialize (All = no filter)")
+    parser.add_argument("--step", type=float, default=ALPHA_STEP, help="alpha grid step")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--content-mode", choices=("table", "ann"), default="table",
+                        help="the CONTENT_MODE the backend will serve with")
+    parser.add_argument("--nprobe", type=int, default=ann.DEFAULT_NPROBE, help="ANN_NPROBE (ann mode)")
+    args = parser.parse_args()
+    if os.path.exists(os.path.join(os.path.dirname(os.path.normpath(args.bundle)), bundle.CURRENT)):
+        parser.error(f"{args.bundle} is a published version and is never modified; publish a new one with "
+                     "python bundle.py --versions ... --materialize (or ingest.py --materialize)")
+
+    manifest = build(args.bundle, args.genres, args.step, args.movies, args.jobs,
+                     content_mode=args.content_mode, nprobe=args.nprobe)
+    out_dir = os.path.join(args.bundle, bundle.MATERIALIZED)
+    size = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+    spans = manifest["arrays"]["cand_idx"]["shape"][0]
+    keys = manifest["movies"] * len(manifest["genres"])
+    lists = keys * len(manifest["alphas"])
+    # What the same lists would take stored one by one: an index and a float32 score per result.
+    flat = lists * manifest["top_n"] * (np.dtype(manifest["arrays"]["cand_idx"]["dtype"]).itemsize + 4)
+    print(f"Materialized {manifest['movies']} movies x {len(manifest['genres'])} genres x "
+          f"{len(manifest['alphas'])} alphas = {lists} top-{manifest['top_n']} lists "
+          f"in {manifest['build_seconds']:.1f}s on {manifest['jobs']} processes")
+    print(f"{size / 1e6:.1f} MB ({flat / 1e6:.1f} MB as flat lists), "
+          f"{spans / max(keys, 1):.1f} distinct movies per (movie, genre) -> {out_dir}/")
+
+
+if __name__ == "__main__":
+    main()
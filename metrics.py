@@ -0,0 +1,221 @@
+"""
+metrics.py
+----------
+In-process latency histograms, event counters and a slow-request profiler
+for the backend, exposed on /metrics in the Prometheus text format.
+
+    with metrics.timer("rescore"):       # one histogram per stage
+        ...
+    metrics.incr("fuzzy_match")          # one counter per event
+
+A timer costs two perf_counter() calls and a short locked bucket update, so
+instrumentation stays on all the time. Two opt-in extras:
+
+  * Server-Timing: a request that sends `X-Server-Timing: 1` gets its stage
+    durations back in a `Server-Timing` response header (collect_timings()).
+  * Sampling profiler: with PROFILE_SAMPLE_RATE > 0 that fraction of requests
+    runs under cProfile; runs slower than PROFILE_SLOW_MS are written to
+    PROFILE_DIR as .prof files (open with `python -m pstats` or snakeviz).
+    Off by default, and then the hook is a single comparison.
+
+Stages timed and events counted inside worker processes (EXECUTION_MODE=process)
+are recorded per task (record()), shipped back with the task's result and
+replayed in the parent (merge()), so /metrics and Server-Timing show the same
+stages in both execution modes.
+"""
+import bisect
+import contextvars
+import cProfile
+import functools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; Prometheus buckets are cumulative "less than or equal" bounds.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "250"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+_timings = contextvars.ContextVar("server_timings", default=None)
+_pending = contextvars.ContextVar("pending_counters", default=None)
+_profile_lock = threading.Lock()      # cProfile can only run one profiler at a time
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)      # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+stages = {}          # stage name -> Histogram
+requests = {}        # route -> Histogram
+counters = {}        # event -> count
+_registry_lock = threading.Lock()
+
+
+def _histogram(table, name):
+    histogram = table.get(name)
+    if histogram is None:
+        with _registry_lock:
+            histogram = table.setdefault(name, Histogram())
+    return histogram
+
+
+def observe(stage, seconds):
+    _histogram(stages, stage).observe(seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+def observe_request(route, seconds):
+    _histogram(requests, route).observe(seconds)
+
+
+class timer:
+    """`with timer("stage"):` -- a plain class, cheaper than a generator context manager."""
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.start)
+
+
+def incr(event, amount=1):
+    with _registry_lock:
+        counters[event] = counters.get(event, 0) + amount
+    pending = _pending.get()
+    if pending is not None:
+        pending[event] = pending.get(event, 0) + amount
+
+
+def record():
+    """Start recording this context's stage timings and counter increments;
+    returns the (timings, counters) they land in, for merge() in another process."""
+    delta = ([], {})
+    _timings.set(delta[0])
+    _pending.set(delta[1])
+    return delta
+
+
+def merge(delta):
+    """Replay a record() delta from a worker process as if it had run here."""
+    timings, pending = delta
+    for stage, seconds in timings:
+        observe(stage, seconds)
+    for event, amount in pending.items():
+        incr(event, amount)
+
+
+def collect_timings():
+    """Start collecting this request's stage timings; returns the list they land in.
+
+    The list is shared with threads the request hands work to (run_in_threadpool
+    copies the context, not the list)."""
+    timings = []
+    _timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings, total):
+    # Repeated stages (e.g. one resolve per batch title) are summed.
+    merged = {}
+    for stage, seconds in timings:
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    parts = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in merged.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+@contextmanager
+def maybe_profile(name):
+    """Run the block under cProfile for a PROFILE_SAMPLE_RATE share of calls and
+    keep the profile if it took longer than PROFILE_SLOW_MS."""
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE \
+            or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profile_lock.release()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        incr("profiled")
+        if elapsed_ms >= PROFILE_SLOW_MS:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{elapsed_ms:.0f}ms.prof")
+            profiler.dump_stats(path)
+            incr("slow_profiles")
+            print(f"Slow {name} ({elapsed_ms:.0f} ms): profile written to {path}")
+
+
+def profiled(name):
+    """Decorator form of maybe_profile for a synchronous function."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with maybe_profile(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _histogram_lines(metric, label, table):
+    lines = [f"# TYPE {metric} histogram"]
+    for name, histogram in sorted(table.items()):
+        counts, total = histogram.snapshot()
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{metric}_bucket{{{label}="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{{label}="{name}"}} {total}')
+        lines.append(f'{metric}_count{{{label}="{name}"}} {cumulative}')
+    return lines
+
+
+def render(extra_counters=()):
+    """Everything recorded so far in Prometheus text exposition format.
+
+    `extra_counters` is an iterable of (metric, labels dict, value) appended as
+    counters -- e.g. cache hit / miss totals owned by other modules."""
+    lines = _histogram_lines("moviematch_request_duration_seconds", "route", requests)
+    lines += _histogram_lines("moviematch_stage_duration_seconds", "stage", stages)
+    lines.append("# TYPE moviematch_events_total counter")
+    with _registry_lock:
+        events = sorted(counters.items())
+    lines += [f'moviematch_events_total{{event="{event}"}} {count}' for event, count in events]
+
+    families = {}           # a metric's samples must be contiguous in the exposition
+    for metric, labels, value in extra_counters:
+        label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+        families.setdefault(metric, []).append(f"{metric}{{{label_text}}} {value}")
+    for metric, samples in families.items():
+        lines.append(f"# TYPE {metric} counter")
+        lines += samples
+    return "\n".join(lines) + "\n"
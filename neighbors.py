@@ -0,0 +1,122 @@
+"""
+neighbors.py
+------------
+Per-movie top-K content neighbour table.
+
+The backend only ever reads the best few dozen content neighbours of a movie,
+so instead of holding the dense N x N cosine matrix (similarity.pkl) in RAM it
+serves a K-wide table: int32 neighbour rows plus float16 scores, sorted
+best-first, with the movie itself left out. Memory grows O(N*K) instead of
+O(N^2), and a candidate lookup is a slice instead of a full-row sort.
+
+Reads from   artifacts/similarity.pkl
+Writes to    artifacts/content_topk_idx.npy
+             artifacts/content_topk_scores.npy
+
+Run it once after regenerating artifacts:
+    python neighbors.py
+    python neighbors.py --k 300        # deeper table (default 200)
+"""
+import argparse
+import os
+import pickle
+
+import numpy as np
+
+DEFAULT_K = 200
+IDX_FILE = "content_topk_idx.npy"
+SCORES_FILE = "content_topk_scores.npy"
+
+
+def _topk_rows(block, start, k):
+    """Top-k columns of each row of a float32 block whose first row is matrix row `start`."""
+    rows = np.arange(block.shape[0])
+    block[rows, rows + start] = -np.inf              # never recommend the movie itself
+
+    part = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(block, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return (np.take_along_axis(part, order, axis=1).astype(np.int32),
+            np.take_along_axis(part_scores, order, axis=1).astype(np.float16))
+
+
+def topk_from_dense(similarity, k=DEFAULT_K, block_rows=1024):
+    """Top-k neighbours of every row of a dense similarity matrix, self excluded.
+
+    Works a block of rows at a time so the temporary copy stays small even when
+    `similarity` is a float64 matrix for a large catalog.
+    """
+    n = similarity.shape[0]
+    k = max(0, min(k, n - 1))
+    idx = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float16)
+    if k == 0:
+        return idx, scores
+
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        block = np.array(similarity[start:stop], dtype=np.float32)
+        idx[start:stop], scores[start:stop] = _topk_rows(block, start, k)
+
+    return idx, scores
+
+
+def topk_from_vectors(vectors, k=DEFAULT_K, block_rows=1024):
+    """Top-k cosine neighbours straight from L2-normalised row vectors (e.g. sparse TF-IDF).
+
+    Only a block_rows x N slice of the similarity matrix exists at any time, so
+    the N x N matrix is never materialised.
+    """
+    n = vectors.shape[0]
+    k = max(0, min(k, n - 1))
+    idx = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float16)
+    if k == 0:
+        return idx, scores
+
+    vectors_t = vectors.T.tocsr() if hasattr(vectors, 'tocsr') else vectors.T
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        block = vectors[start:stop] @ vectors_t
+        block = block.toarray() if hasattr(block, 'toarray') else block
+        idx[start:stop], scores[start:stop] = _topk_rows(np.asarray(block, dtype=np.float32), start, k)
+
+    return idx, scores
+
+
+def save(idx, scores, directory="artifacts"):
+    np.save(os.path.join(directory, IDX_FILE), idx)
+    np.save(os.path.join(directory, SCORES_FILE), scores)
+
+
+def load(directory="artifacts"):
+    """Return (idx, scores), or None if the table hasn't been built yet."""
+    idx_path = os.path.join(directory, IDX_FILE)
+    scores_path = os.path.join(directory, SCORES_FILE)
+    if not (os.path.exists(idx_path) and os.path.exists(scores_path)):
+        return None
+    return np.load(idx_path), np.load(scores_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the top-K content neighbour table.")
+    parser.add_argument("--src", default="artifacts", help="directory holding similarity.pkl")
+    parser.add_argument("--dst", default=None, help="output directory (defaults to --src)")
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="neighbours kept per movie")
+    args = parser.parse_args()
+    dst = args.dst or args.src
+    os.makedirs(dst, exist_ok=True)
+
+    with open(os.path.join(args.src, "similarity.pkl"), "rb") as f:
+        sim = pickle.load(f)
+    idx, scores = topk_from_dense(np.asarray(sim), k=args.k)
+    save(idx, scores, dst)
+
+    dense_mb = os.path.getsize(os.path.join(args.src, "similarity.pkl")) / 1e6
+    table_mb = (idx.nbytes + scores.nbytes) / 1e6
+    print(f"{idx.shape[0]} movies x {idx.shape[1]} neighbours: "
+          f"{dense_mb:.1f} MB dense -> {table_mb:.1f} MB table")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+omdb_stub.py
+------------
+Local stand-in for the OMDb API, for exercising posters.py and the frontends
+without a key or network access. Answers GET /?t=<title>&apikey=<anything>
+with the same JSON shape OMDb uses, deterministically per title:
+
+  * about 1 in 10 titles is "Movie not found!",
+  * the rest get a poster URL, an imdbRating and a Genre string derived from
+    the title (and the catalog's own genres when --movies is given),
+  * optional per-request latency, random 500s, and a request quota after which
+    every call gets OMDb's 401 "Request limit reached!".
+
+    python omdb_stub.py --port 8090
+    python omdb_stub.py --port 8090 --movies artifacts/movies_df.pkl --latency-ms 80 --quota 1000
+    OMDB_URL=http://127.0.0.1:8090/ OMDB_API_KEY=test python posters.py
+"""
+import argparse
+import hashlib
+import json
+import pickle
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FALLBACK_GENRES = ["Drama", "Comedy", "Action", "Thriller", "Romance", "Adventure", "Crime", "Horror"]
+
+
+def _digest(title):
+    return int.from_bytes(hashlib.sha1(title.lower().encode()).digest()[:8], "big")
+
+
+def answer(title, catalog_genres=None):
+    """The OMDb-shaped response for one title."""
+    h = _digest(title)
+    if not title or h % 10 == 0:
+        return {"Response": "False", "Error": "Movie not found!"}
+    genres = (catalog_genres or {}).get(title.lower()) or [FALLBACK_GENRES[h % len(FALLBACK_GENRES)]]
+    slug = urllib.parse.quote(title.lower().replace(" ", "-"))
+    return {
+        "Title": title,
+        "Year": str(1950 + h % 75),
+        "Genre": ", ".join(genres[:3]),
+        "Poster": f"https://posters.example.invalid/{h % 100000:05d}/{slug}.jpg" if h % 7 else "N/A",
+        "imdbRating": f"{3 + (h >> 8) % 65 / 10:.1f}",
+        "imdbID": f"tt{h % 10_000_000:07d}",
+        "Response": "True",
+    }
+
+
+def make_handler(catalog_genres, latency, error_rate, quota):
+    served = [0]
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            with lock:
+                served[0] += 1
+                count = served[0]
+            if latency:
+                time.sleep(latency)
+            if not query.get("apikey"):
+                return self._send(401, {"Response": "False", "Error": "No API key provided."})
+            if quota and count > quota:
+                return self._send(401, {"Response": "False", "Error": "Request limit reached!"})
+            if error_rate and random.random() < error_rate:
+                return self._send(500, {"Response": "False", "Error": "Internal error"})
+            self._send(200, answer(query.get("t", [""])[0], catalog_genres))
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OMDb stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--movies", default=None, help="movies_df.pkl, to answer with the catalog's genres")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 500")
+    parser.add_argument("--quota", type=int, default=0, help="answer 401 after N requests (0 = unlimited)")
+    args = parser.parse_args()
+
+    catalog_genres = None
+    if args.movies:
+        with open(args.movies, "rb") as f:
+            movies = pickle.load(f)
+        catalog_genres = {t.lower(): list(g) for t, g in zip(movies['title'], movies['genres'])}
+
+    handler = make_handler(catalog_genres, args.latency_ms / 1000, args.error_rate, args.quota)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"OMDb stub on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
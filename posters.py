@@ -0,0 +1,201 @@
+"""
+posters.py
+----------
+Persistent poster / metadata store: one SQLite file keyed by tmdbId with the
+OMDb poster URL, IMDb rating and genres, filled ahead of time by a bulk,
+rate-limited prefetch over movies_df instead of per card at page render.
+
+The backend reads it (POSTER_DB, default artifacts/posters.db) to fill
+poster_url / imdb_rating in responses; every replica and restart shares the
+same file, so nothing is re-fetched. Movies not in the store keep the
+placehold.co fallback.
+
+    python posters.py                                    # prefetch everything missing
+    python posters.py --rate 2 --limit 900               # stay inside the free OMDb tier
+    python posters.py --retry-errors                     # re-try earlier failures too
+    python posters.py --omdb-url http://127.0.0.1:8090/  # against omdb_stub.py
+
+Needs OMDB_API_KEY (or --api-key); the stub accepts any key.
+"""
+import argparse
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+DB_PATH = os.path.join("artifacts", "posters.db")
+OMDB_URL = "https://www.omdbapi.com/"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    tmdb_id     INTEGER PRIMARY KEY,
+    title       TEXT NOT NULL,
+    poster      TEXT,
+    imdb_rating TEXT,
+    genres      TEXT,            -- comma-separated, as OMDb returns them
+    status      TEXT NOT NULL,   -- ok / not_found / error
+    fetched_at  REAL NOT NULL
+)
+"""
+
+
+class PosterStore:
+    """Read side used by the backend. One connection per thread, read-only."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @classmethod
+    def open(cls, path=DB_PATH):
+        """The store at `path`, or None when nothing has been prefetched yet."""
+        return cls(path) if os.path.exists(path) else None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, tmdb_ids):
+        """{tmdb_id: (poster, imdb_rating, genres)} for the ids the store has found."""
+        ids = list({int(i) for i in tmdb_ids})
+        if not ids:
+            return {}
+        marks = ",".join("?" * len(ids))
+        rows = self._conn().execute(
+            f"SELECT tmdb_id, poster, imdb_rating, genres FROM movies "
+            f"WHERE status = 'ok' AND tmdb_id IN ({marks})", ids)
+        return {tmdb_id: (poster, rating, genres.split(", ") if genres else [])
+                for tmdb_id, poster, rating, genres in rows}
+
+
+# --------------------------------------------------------------- prefetch
+def connect(path=DB_PATH):
+    """Writable connection; creates the file and table on first use."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")       # readers (the backend) never block on the prefetch
+    conn.execute(SCHEMA)
+    return conn
+
+
+def pending(conn, movies, retry_errors=False):
+    """(tmdbId, title) pairs of `movies` the store has no answer for yet."""
+    skip = ("ok", "not_found") if retry_errors else ("ok", "not_found", "error")
+    done = {row[0] for row in conn.execute(
+        f"SELECT tmdb_id FROM movies WHERE status IN ({','.join('?' * len(skip))})", skip)}
+    return [(int(t), title) for t, title in zip(movies['tmdbId'].tolist(), movies['title'].tolist())
+            if int(t) not in done]
+
+
+class RateLimiter:
+    """At most `rate` calls per second across threads (evenly spaced)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def fetch(session, url, api_key, title, timeout=10):
+    """One OMDb lookup -> (status, poster, rating, genres). Raises on transport errors."""
+    import requests
+    r = session.get(url, params={"t": title, "apikey": api_key}, timeout=timeout)
+    if r.status_code in (401, 429) or r.status_code >= 500:
+        # OMDb answers 401 "Request limit reached!" once the daily quota is spent.
+        raise requests.HTTPError(f"{r.status_code}: {r.text[:100]}", response=r)
+    d = r.json()
+    if d.get("Response") != "True":
+        return "not_found", None, None, None
+
+    def field(name):
+        value = d.get(name)
+        return value if value and value != "N/A" else None
+
+    return "ok", field("Poster"), field("imdbRating"), field("Genre")
+
+
+def prefetch(movies, db_path=DB_PATH, api_key="", url=OMDB_URL, rate=5.0, workers=4,
+             limit=None, retry_errors=False, max_failures=20):
+    """Fill the store for every movie it has no answer for. Returns {status: count}."""
+    # Only the prefetch needs requests; the backend just reads the store.
+    import requests
+    conn = connect(db_path)
+    todo = pending(conn, movies, retry_errors)[:limit]
+    print(f"{len(todo)} movies to fetch ({len(movies)} in catalog), {rate:g} req/s")
+
+    limiter = RateLimiter(rate)
+    session = requests.Session()
+    write_lock = threading.Lock()
+    counts = {"ok": 0, "not_found": 0, "error": 0}
+    stop = threading.Event()
+    consecutive_failures = [0]
+
+    def one(item):
+        if stop.is_set():
+            return
+        tmdb_id, title = item
+        limiter.wait()
+        try:
+            status, poster, rating, genres = fetch(session, url, api_key, title)
+            consecutive_failures[0] = 0
+        except (requests.RequestException, ValueError) as exc:
+            status, poster, rating, genres = "error", None, None, None
+            consecutive_failures[0] += 1
+            if consecutive_failures[0] >= max_failures and not stop.is_set():
+                # Quota spent or the service is down: stop instead of marking the rest failed.
+                print(f"Stopping after {max_failures} consecutive failures (last: {exc})")
+                stop.set()
+        with write_lock:
+            conn.execute("INSERT OR REPLACE INTO movies VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (tmdb_id, title, poster, rating, genres, status, time.time()))
+            counts[status] += 1
+            done = sum(counts.values())
+            if done % 100 == 0:
+                conn.commit()
+                print(f"  {done}/{len(todo)} {counts}")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, todo))
+    conn.commit()
+    conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefetch OMDb posters / ratings into the SQLite store.")
+    parser.add_argument("--movies", default=os.path.join("artifacts", "movies_df.pkl"))
+    parser.add_argument("--db", default=os.getenv("POSTER_DB", DB_PATH))
+    parser.add_argument("--api-key", default=os.getenv("OMDB_API_KEY", ""))
+    parser.add_argument("--omdb-url", default=os.getenv("OMDB_URL", OMDB_URL))
+    parser.add_argument("--rate", type=float, default=5.0, help="requests per second (all threads)")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent requests")
+    parser.add_argument("--limit", type=int, default=None, help="fetch at most N movies this run")
+    parser.add_argument("--retry-errors", action="store_true", help="re-fetch movies that failed before")
+    args = parser.parse_args()
+
+    if not args.api_key:
+        parser.error("set OMDB_API_KEY or pass --api-key")
+    with open(args.movies, "rb") as f:
+        movies = pickle.load(f)
+    start = time.perf_counter()
+    counts = prefetch(movies, args.db, args.api_key, args.omdb_url, args.rate, args.workers,
+                      args.limit, args.retry_errors)
+    print(f"Done in {time.perf_counter() - start:.1f}s: {counts} -> {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+ratelimit.py
+------------
+Per-client rate limiting shared by every uvicorn worker on the host.
+
+slowapi's Limiter kept its counters in process memory, so `uvicorn --workers N`
+let each client through N times the limit. Here the buckets live in one
+memory-mapped file (/dev/shm when available) that every worker maps, so a
+limit holds across all of them without Redis:
+
+  * Token buckets, stored GCRA-style as a single float per (route, client):
+    the time at which the bucket is full again. A request adds one token's
+    worth of time and is allowed if that stays within one period of now. No
+    refill bookkeeping, and a key is idle exactly when its time has passed.
+  * The table is SEGMENTS independent open-addressing hash segments. Each is
+    guarded by its own lock -- a thread lock plus an fcntl lock on one byte of
+    the file -- so threads and processes only contend within a segment.
+  * A segment drops its idle keys every COMPACT_SECONDS, and early once it is
+    3/4 full. Dropping an idle key changes nothing: a missing key is a full
+    bucket. If a segment is still full the request is let through and counted
+    as ratelimit_table_full in /metrics.
+
+A check is a hash, two lock syscalls and a few struct reads / writes on the
+mapping: a few microseconds. Without fcntl (Windows) the table is private to
+the process, as slowapi's was.
+
+    limiter = Limiter(key_func=client_address)
+
+    @app.get("/recommend")
+    @limiter.limit("30/minute")
+    def recommend(request: Request, ...): ...
+"""
+import asyncio
+import functools
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+import numpy as np
+from fastapi import HTTPException
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:             # Windows: per-process table
+    fcntl = None
+
+DEFAULT_PATH = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+                            "moviematch-ratelimit")
+SEGMENTS = 64
+SLOTS = 1024                    # per segment: 64 x 1024 keys, 1 MB of slots
+COMPACT_SECONDS = 60.0
+MAX_LOAD = 0.75
+PERIODS = {"second": 1.0, "minute": 60.0, "hour": 3600.0, "day": 86400.0}
+
+_HEADER = struct.Struct("<8sII")            # magic, segments, slots
+_SEGMENT = struct.Struct("<Id")             # keys in use, last compaction (monotonic)
+_SLOT = struct.Struct("<Qd")                # key hash (0 = empty), time the bucket is full again
+_SLOT_DTYPE = np.dtype([("key", "<u8"), ("tat", "<f8")])
+_MAGIC = b"MMRL0001"
+_HEADER_SIZE = 64
+_SEGMENT_HEADER = 16
+
+
+def parse_rate(rate):
+    """"30/minute" -> (30, 60.0)."""
+    count, _, unit = rate.partition("/")
+    return int(count), PERIODS[unit.strip().rstrip("s")]
+
+
+def client_address(request):
+    return request.client.host if request.client else "127.0.0.1"
+
+
+_hashes = {}
+
+
+def _hash(key):
+    # Stable across processes (unlike hash()); 0 marks an empty slot. Memoized,
+    # since the same few clients come back over and over.
+    h = _hashes.get(key)
+    if h is None:
+        if len(_hashes) >= 1 << 16:
+            _hashes.clear()
+        h = _hashes[key] = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+    return h
+
+
+class BucketTable:
+    """Token buckets in a fixed-size hash table over a shared memory mapping."""
+
+    def __init__(self, path=DEFAULT_PATH, segments=SEGMENTS, slots=SLOTS):
+        self.segments, self.slots = segments, slots
+        self.max_used = int(slots * MAX_LOAD)
+        self.segment_size = _SEGMENT_HEADER + slots * _SLOT.size
+        size = _HEADER_SIZE + segments * self.segment_size
+        header = _HEADER.pack(_MAGIC, segments, slots)
+        if fcntl is None:
+            self.fd = None
+            self.mm = mmap.mmap(-1, size)
+            self.mm[:_HEADER.size] = header
+        else:
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            # Byte 0 serializes set-up; a file from another layout is reset.
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, 0)
+            try:
+                if os.fstat(self.fd).st_size != size or os.pread(self.fd, _HEADER.size, 0) != header:
+                    os.ftruncate(self.fd, 0)
+                    os.ftruncate(self.fd, size)
+                    os.pwrite(self.fd, header, 0)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, 0)
+            self.mm = mmap.mmap(self.fd, size)
+        self.thread_locks = [threading.Lock() for _ in range(segments)]
+
+    def _lock(self, segment):
+        self.thread_locks[segment].acquire()
+        if self.fd is not None:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, 1 + segment)
+
+    def _unlock(self, segment):
+        if self.fd is not None:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, 1 + segment)
+        self.thread_locks[segment].release()
+
+    def _find(self, base, key):
+        """(slot offset, stored time or None if the key is new); (None, None) if the segment is full."""
+        start = (key // self.segments) % self.slots
+        for probe in range(self.slots):
+            offset = base + _SEGMENT_HEADER + ((start + probe) % self.slots) * _SLOT.size
+            found, tat = _SLOT.unpack_from(self.mm, offset)
+            if found == key:
+                return offset, tat
+            if found == 0:
+                return offset, None
+        return None, None
+
+    def _compact(self, segment, base, now):
+        table = np.frombuffer(self.mm, dtype=_SLOT_DTYPE, count=self.slots, offset=base + _SEGMENT_HEADER)
+        live = table[(table["key"] != 0) & (table["tat"] > now)].tolist()
+        table[:] = 0
+        del table                   # no exported buffer may outlive the call
+        for key, tat in live:
+            offset, _ = self._find(base, key)
+            _SLOT.pack_into(self.mm, offset, key, tat)
+        _SEGMENT.pack_into(self.mm, base, len(live), now)
+        return len(live)
+
+    def hit(self, key, count, period):
+        """Take a token from `key`'s bucket (`count` per `period` seconds).
+        Returns 0.0 if allowed, else the seconds until one is available."""
+        key = _hash(key)
+        segment = key % self.segments
+        base = _HEADER_SIZE + segment * self.segment_size
+        interval = period / count
+        self._lock(segment)
+        try:
+            now = time.monotonic()
+            used, compacted = _SEGMENT.unpack_from(self.mm, base)
+            if used >= self.max_used or not compacted <= now < compacted + COMPACT_SECONDS:
+                used, compacted = self._compact(segment, base, now), now
+            offset, tat = self._find(base, key)
+            new = tat is None
+            if offset is None or (new and used >= self.max_used):
+                metrics.incr("ratelimit_table_full")
+                return 0.0
+            # A time more than a period ahead can only be left over from before a reboot.
+            if new or tat < now or tat > now + period:
+                tat = now
+            tat += interval
+            if tat - now > period + 1e-9:
+                return tat - now - period
+            _SLOT.pack_into(self.mm, offset, key, tat)
+            if new:
+                _SEGMENT.pack_into(self.mm, base, used + 1, compacted)
+            return 0.0
+        finally:
+            self._unlock(segment)
+
+    def reset(self):
+        for segment in range(self.segments):
+            base = _HEADER_SIZE + segment * self.segment_size
+            self._lock(segment)
+            try:
+                self.mm[base:base + self.segment_size] = bytes(self.segment_size)
+            finally:
+                self._unlock(segment)
+
+
+class Limiter:
+    """Route decorator in the style of slowapi's: `@limiter.limit("30/minute")` on
+    an endpoint that takes `request: Request`. Over the limit -> 429 with Retry-After."""
+
+    def __init__(self, key_func=client_address, enabled=True, path=DEFAULT_PATH):
+        self.key_func = key_func
+        self.enabled = enabled
+        self.table = BucketTable(path) if enabled else None
+
+    def _check(self, scope, rate, count, period, request):
+        if not self.enabled:
+            return
+        wait = self.table.hit(f"{scope}|{self.key_func(request)}", count, period)
+        if wait > 0:
+            metrics.incr("rate_limited")
+            raise HTTPException(status_code=429, detail=f"Rate limit exceeded: {rate}",
+                                headers={"Retry-After": str(math.ceil(wait))})
+
+    def limit(self, rate):
+        count, period = parse_rate(rate)
+
+        def decorate(func):
+            scope = func.__name__
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def wrapper(*args, **kwargs):
+                    self._check(scope, rate, count, period, kwargs["request"])
+                    return await func(*args, **kwargs)
+            else:
+                @functools.wraps(func)
+                def wrapper(*args, **kwargs):
+                    self._check(scope, rate, count, period, kwargs["request"])
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        if self.table is not None:
+            self.table.reset()
@@ -0,0 +1,405 @@
+"""
+scoring.py
+----------
+Vectorized hybrid rescoring for the backend.
+
+`prepare()` runs once after the artifacts are loaded and flattens everything
+the hot path needs into plain arrays / lists:
+
+    titles         list[str]      row -> title
+    tmdb_ids       int64[N]       row -> tmdbId
+    genres         list[list]     row -> genre names
+    content_to_cf  int32[N]       row -> row of movie_similarity (-1 = no CF data)
+
+`rescore()` then blends a whole candidate set at once: one CF row is fetched
+for the base movie, every candidate's CF score is gathered with a single
+fancy-index, and the alpha blend, genre mask and sort are NumPy operations.
+
+Content neighbour rows come from the precomputed top-K table, or -- when the
+artifacts carry an `ann_index` (CONTENT_MODE=ann, see ann.py) -- from an
+approximate nearest-neighbour query at request time.
+
+Content scores and CF values may be stored as int8 with one float32 scale per
+row (shrink_artifacts.py --dtype int8): `content_scale` [N] next to the table,
+and `movie_similarity.scale` per CF row. Rows are read in the stored dtype and
+only the gathered candidates are multiplied back by their scale.
+
+Paged /recommend keeps a request's blended candidates in a `PartialRanking`,
+which sorts only as deep as the pages asked for so far.
+"""
+import threading
+
+import numpy as np
+
+
+def prepare(artifacts):
+    movies_df = artifacts['movies_df']
+    tmdb_to_ml = artifacts['tmdb_to_ml']
+    movie_id_search = artifacts['movie_id_search']
+
+    artifacts['titles'] = movies_df['title'].tolist()
+    artifacts['tmdb_ids'] = movies_df['tmdbId'].to_numpy(dtype=np.int64)
+    artifacts['genres'] = [g if isinstance(g, list) else [] for g in movies_df['genres']]
+    if 'vote_count' in movies_df:
+        # Popularity for /suggest ranking.
+        artifacts['vote_counts'] = movies_df['vote_count'].fillna(0).to_numpy(dtype=np.int64)
+    if 'vote_average' in movies_df:
+        artifacts['vote_average'] = movies_df['vote_average'].fillna(0).to_numpy(dtype=np.float32)
+
+    content_to_cf = np.full(len(movies_df), -1, dtype=np.int32)
+    for row, tmdb_id in enumerate(movies_df['tmdbId'].tolist()):
+        ml_id = tmdb_to_ml.get(tmdb_id)
+        if ml_id is not None and ml_id in movie_id_search:
+            content_to_cf[row] = movie_id_search[ml_id]
+    artifacts['content_to_cf'] = content_to_cf
+
+
+def cf_scale(artifacts, cf_rows):
+    """Dequantization scale of int8 CF rows, or None when the values are stored as floats."""
+    scale = getattr(artifacts['movie_similarity'], 'scale', None)
+    return None if scale is None else scale[cf_rows]
+
+
+def cf_row(artifacts, cf_idx):
+    """Dense CF row for one movie_similarity row in the stored dtype (zeros where
+    nothing is stored); int8 values still need cf_scale."""
+    movie_similarity = artifacts['movie_similarity']
+    if not hasattr(movie_similarity, 'indptr'):
+        return np.asarray(movie_similarity[cf_idx], dtype=np.float64).ravel()
+
+    # Slice the CSR arrays directly: no per-element binary search, no scipy row object.
+    start, stop = movie_similarity.indptr[cf_idx], movie_similarity.indptr[cf_idx + 1]
+    row = np.zeros(movie_similarity.shape[1], dtype=movie_similarity.data.dtype)
+    row[movie_similarity.indices[start:stop]] = movie_similarity.data[start:stop]
+    return row
+
+
+def cf_dense_rows(artifacts, cf_rows):
+    """Dense CF rows for several movie_similarity rows at once, shape (len(cf_rows), width),
+    in the stored dtype like cf_row."""
+    movie_similarity = artifacts['movie_similarity']
+    cf_rows = np.asarray(cf_rows, dtype=np.int64)
+    if not hasattr(movie_similarity, 'indptr'):
+        return np.asarray(movie_similarity[cf_rows], dtype=np.float64)
+
+    # Concatenate every row's [start, stop) slice of the CSR arrays in one go.
+    indptr = np.asarray(movie_similarity.indptr)
+    starts = indptr[cf_rows]
+    lengths = indptr[cf_rows + 1] - starts
+    owner = np.repeat(np.arange(len(cf_rows)), lengths)
+    positions = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+
+    rows = np.zeros((len(cf_rows), movie_similarity.shape[1]), dtype=movie_similarity.data.dtype)
+    rows[owner, movie_similarity.indices[positions]] = movie_similarity.data[positions]
+    return rows
+
+
+def cf_scores(artifacts, base_idx, cand_idx):
+    """CF similarity between the base movie and every candidate row, 0.0 where unknown."""
+    content_to_cf = artifacts['content_to_cf']
+    scores = np.zeros(len(cand_idx), dtype=np.float64)
+    base_cf = content_to_cf[base_idx]
+    if base_cf < 0:
+        return scores
+
+    cand_cf = content_to_cf[cand_idx]
+    known = cand_cf >= 0
+    scores[known] = cf_row(artifacts, base_cf)[cand_cf[known]]
+    scale = cf_scale(artifacts, base_cf)
+    if scale is not None:
+        scores *= scale
+    return scores
+
+
+def parse_genres(genre):
+    """"All" -> (); "Action" -> ("Action",); "Action,Comedy" -> ("Action", "Comedy")."""
+    if genre == "All":
+        return ()
+    return tuple(g.strip() for g in genre.split(",") if g.strip())
+
+
+def genre_rows(artifacts, genre, mode="any"):
+    """Boolean [N] array of the movies matching a genre query, built on first use and kept.
+
+    `genre` is one name or a comma-separated list; `mode` "any" matches movies
+    with at least one of them (OR), "all" only movies with every one (AND).
+    Masks are cached by the set of known genre names, so the cache is bounded by
+    the vocabulary, not by what clients send: unknown names never create an entry
+    and every query that can match nothing shares one all-false array.
+    """
+    bits = artifacts['genre_bits']
+    vocab = artifacts['genre_vocab']
+    names = set(parse_genres(genre))
+    known = frozenset(name for name in names if name in vocab)
+    if names and (not known or (mode == "all" and len(known) < len(names))):
+        if 'genre_none' not in artifacts:
+            none = np.zeros(len(bits), dtype=bool)
+            none.flags.writeable = False
+            artifacts['genre_none'] = none
+        return artifacts['genre_none']
+
+    masks = artifacts.setdefault('genre_rows', {})
+    key = (known, mode if len(known) > 1 else "any")
+    if key not in masks:
+        if not known:
+            masks[key] = np.ones(len(bits), dtype=bool)
+        else:
+            query = np.uint64(sum(1 << vocab[name] for name in known))
+            hits = bits & query
+            masks[key] = hits == query if mode == "all" else hits != 0
+    return masks[key]
+
+
+def genre_mask(artifacts, cand_idx, genre, mode="any"):
+    if genre == "All":
+        return np.ones(len(cand_idx), dtype=bool)
+    return genre_rows(artifacts, genre, mode)[cand_idx]
+
+
+def content_scale(artifacts):
+    """Per-movie scale of an int8 content table, or None (float table, or ANN mode)."""
+    if artifacts.get('ann_index') is not None:
+        return None
+    return artifacts.get('content_scale')
+
+
+def content_row(artifacts, base_idx):
+    """(neighbour rows, content scores) of one movie, best first, itself excluded.
+    Scores are as stored: an int8 table still needs content_scale."""
+    index = artifacts.get('ann_index')
+    if index is not None:
+        return index.neighbours(base_idx, artifacts['ann_depth'])
+    return artifacts['content_idx'][base_idx], artifacts['content_scores'][base_idx]
+
+
+def content_rows(artifacts, base_rows):
+    """`content_row` for several movies, as (B, K) arrays, with float scores."""
+    if artifacts.get('ann_index') is None:
+        idx, scores = artifacts['content_idx'][base_rows], artifacts['content_scores'][base_rows]
+        scale = content_scale(artifacts)
+        return idx, scores if scale is None else scores * scale[base_rows][:, None]
+    depth = artifacts['ann_depth']
+    idx = np.zeros((len(base_rows), depth), dtype=np.int32)
+    scores = np.full((len(base_rows), depth), -np.inf, dtype=np.float32)
+    for i, row in enumerate(base_rows):
+        found, found_scores = content_row(artifacts, row)
+        idx[i, :len(found)], scores[i, :len(found)] = found, found_scores
+    return idx, scores
+
+
+def candidates(artifacts, base_idx, top_k=50, genre="All", mode="any"):
+    """The first `top_k` content neighbours of a movie that pass the genre filter.
+
+    The filter is one vectorized AND over the whole neighbour row before the
+    cut, so a niche genre still gets up to `top_k` candidates instead of
+    whatever survived in the overall top 50.
+    """
+    row_idx, row_scores = content_row(artifacts, base_idx)
+    if genre == "All":
+        cand_idx, cand_scores = row_idx[:top_k], row_scores[:top_k]
+    else:
+        keep = np.flatnonzero(genre_rows(artifacts, genre, mode)[row_idx])[:top_k]
+        cand_idx, cand_scores = row_idx[keep], row_scores[keep]
+    scale = content_scale(artifacts)
+    return cand_idx, cand_scores if scale is None else cand_scores * scale[base_idx]
+
+
+def blend(artifacts, base_idx, cand_idx, content_scores, alpha, genre="All", mode="any"):
+    """Filter and blend candidates. Returns (rows, final_scores) in candidate order."""
+    cand_idx = np.asarray(cand_idx, dtype=np.int64)
+    content_scores = np.asarray(content_scores, dtype=np.float64)
+
+    keep = genre_mask(artifacts, cand_idx, genre, mode)
+    cand_idx, content_scores = cand_idx[keep], content_scores[keep]
+    return cand_idx, alpha * content_scores + (1 - alpha) * cf_scores(artifacts, base_idx, cand_idx)
+
+
+def rescore(artifacts, base_idx, cand_idx, content_scores, alpha, genre="All", mode="any"):
+    """Blend, filter and rank candidates. Returns (rows, final_scores), best first."""
+    cand_idx, final = blend(artifacts, base_idx, cand_idx, content_scores, alpha, genre, mode)
+    # Stable sort keeps content order on ties, like the old list.sort did.
+    order = np.argsort(-final, kind="stable")
+    return cand_idx[order], final[order]
+
+
+class PartialRanking:
+    """`blend` output, ranked lazily: `take(start, stop)` returns ranks
+    [start, stop) in exactly `rescore`'s order, sorting only as far as stop.
+
+    The ranks already handed out stay sorted; a deeper page partial-selects
+    the next ones from the rest (np.partition, ties to the earlier candidate,
+    as the stable sort would) and sorts just those. Shared between the
+    requests paging through one ranking, hence the lock."""
+
+    def __init__(self, rows, scores):
+        self.rows = rows
+        self.scores = scores
+        self.order = np.empty(0, dtype=np.int64)        # sorted prefix (candidate positions)
+        self.rest = np.arange(len(scores))               # the others, in candidate order
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.scores)
+
+    def _extend(self, depth):
+        need = min(depth, len(self.scores)) - len(self.order)
+        if need <= 0:
+            return
+        rest_scores = self.scores[self.rest]
+        if need < len(self.rest):
+            # The need-th best score left; everything above it, then ties in candidate order.
+            cut = np.partition(rest_scores, len(rest_scores) - need)[len(rest_scores) - need]
+            above = rest_scores > cut
+            ties = np.flatnonzero(rest_scores == cut)[:need - int(above.sum())]
+            above[ties] = True
+            picked = np.flatnonzero(above)
+        else:
+            picked = np.arange(len(self.rest))
+        chosen = self.rest[picked]
+        chosen = chosen[np.argsort(-self.scores[chosen], kind="stable")]
+        self.order = np.concatenate([self.order, chosen])
+        self.rest = np.delete(self.rest, picked)
+
+    def take(self, start, stop):
+        """(rows, final_scores) of ranks [start, stop), best first."""
+        with self._lock:
+            self._extend(stop)
+            page = self.order[start:stop]
+        return self.rows[page], self.scores[page]
+
+
+def lookup_materialized(artifacts, base_idx, alpha, genre="All", top_k=50, top_n=10):
+    """(rows, final_scores) of `rescore`'s top_n from the materialized table
+    (materialize.py), or None when the request is not in it: no table, an
+    off-grid alpha, a genre list or unlisted genre, or a movie left out.
+
+    One genre matches the same movies in "any" and "all" mode, so the mode
+    does not matter for anything the table holds."""
+    table = artifacts.get('materialized')
+    if table is None or (table['top_k'], table['top_n']) != (top_k, top_n):
+        return None
+    g = table['genres'].get(genre)
+    row = int(table['rows'][base_idx])
+    a = int(round(alpha / table['alpha_step']))
+    if g is None or row < 0 or not 0 <= a < len(table['alphas']) or table['alphas'][a] != alpha:
+        return None
+    key = row * len(table['genres']) + g
+    ranks = table['ranks'][key, a]
+    span = table['offsets'][key] + ranks[ranks != 255].astype(np.int64)     # 255: no result
+    content = table['content'][span].astype(np.float64)
+    cf = table['cf'][span].astype(np.float64)
+    return table['cand_idx'][span].astype(np.int64), alpha * content + (1 - alpha) * cf
+
+
+def candidate_scores(artifacts, base_rows):
+    """Each base movie's whole neighbour row with its content and CF scores,
+    as (cand_idx, content, cf) (B, K) arrays; content and CF are float64.
+    Padding of short ANN rows has a content score of -inf. The base movies'
+    CF rows are densified together."""
+    base_rows = np.asarray(base_rows, dtype=np.int64)
+    cand_idx, content_scores = content_rows(artifacts, base_rows)
+    cand_idx = np.asarray(cand_idx, dtype=np.int64)
+    content_scores = np.asarray(content_scores, dtype=np.float64)
+
+    content_to_cf = artifacts['content_to_cf']
+    base_cf = content_to_cf[base_rows]
+    cand_cf = content_to_cf[cand_idx]
+    cf = np.zeros_like(content_scores)
+    has_cf = base_cf >= 0
+    if has_cf.any():
+        dense = cf_dense_rows(artifacts, base_cf[has_cf])
+        sub_cf = cand_cf[has_cf]
+        known = sub_cf >= 0
+        sub_scores = np.zeros(sub_cf.shape, dtype=np.float64)
+        sub_scores[known] = dense[np.nonzero(known)[0], sub_cf[known]]
+        scale = cf_scale(artifacts, base_cf[has_cf])
+        if scale is not None:
+            sub_scores *= scale[:, None]
+        cf[has_cf] = sub_scores
+    return cand_idx, content_scores, cf
+
+
+def candidate_mask(artifacts, cand_idx, content_scores, genres, modes, top_k=50):
+    """(B, K) mask of the candidates each item keeps: its first `top_k`
+    genre-matching columns, as `candidates` picks them."""
+    keep = np.ones(cand_idx.shape, dtype=bool)
+    for genre, mode in set(zip(genres, modes)) - {("All", m) for m in modes}:
+        items = np.array([g == genre and m == mode for g, m in zip(genres, modes)])
+        keep[items] = genre_rows(artifacts, genre, mode)[cand_idx[items]]
+    keep &= np.isfinite(content_scores)              # padding of short ANN rows
+    keep &= np.cumsum(keep, axis=1) <= top_k
+    return keep
+
+
+def rescore_batch(artifacts, base_rows, alphas, genres, top_k=50, top_n=10, modes=None):
+    """`rescore` for many base movies at once.
+
+    Whole neighbour rows are gathered as a (B, K) matrix and each item keeps
+    its first `top_k` genre-matching columns, as `candidates` does. The base
+    movies' CF rows are densified together, and blend / genre mask / sort run
+    over the whole matrix. Returns (rows, final_scores), both (B, top_n), best
+    first per base movie; slots with no candidate hold a score of -inf.
+    """
+    cand_idx, content_scores, cf = candidate_scores(artifacts, base_rows)
+    modes = modes or ["any"] * len(cand_idx)
+    keep = candidate_mask(artifacts, cand_idx, content_scores, genres, modes, top_k)
+
+    alphas = np.asarray(alphas, dtype=np.float64)[:, None]
+    final = alphas * content_scores + (1 - alphas) * cf
+    final[~keep] = -np.inf
+
+    order = np.argsort(-final, axis=1, kind="stable")[:, :top_n]
+    return np.take_along_axis(cand_idx, order, axis=1), np.take_along_axis(final, order, axis=1)
+
+
+def profile_scores(artifacts, seed_rows, weights, alpha):
+    """Hybrid score of every movie against a weighted set of seed movies.
+
+    Each seed's top-K content row and CF row are combined in one weighted
+    reduction (bincount over the content table, a matrix-vector product over
+    the densified CF rows), normalised by the total liked weight so scores sit
+    on the same scale as a single-title request. Returns (final [N], signal [N]);
+    `signal` is False for movies no seed says anything about.
+    """
+    seed_rows = np.asarray(seed_rows, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    n = len(artifacts['content_to_cf'])
+    norm = max(weights[weights > 0].sum(), 1.0)
+
+    neighbours, neighbour_scores = content_rows(artifacts, seed_rows)
+    neighbours = np.asarray(neighbours, dtype=np.int64)
+    neighbour_scores = np.asarray(neighbour_scores, dtype=np.float64)
+    padding = ~np.isfinite(neighbour_scores)
+    neighbour_scores[padding] = 0.0
+    content = np.bincount(neighbours.ravel(), weights=(weights[:, None] * neighbour_scores).ravel(),
+                          minlength=n) / norm
+    signal = np.bincount(neighbours[~padding], minlength=n) > 0
+
+    content_to_cf = artifacts['content_to_cf']
+    cf = np.zeros(n, dtype=np.float64)
+    seed_cf = content_to_cf[seed_rows]
+    has_cf = seed_cf >= 0
+    if has_cf.any():
+        # int8 CF rows: fold each row's scale into its weight instead of scaling the rows.
+        scale = cf_scale(artifacts, seed_cf[has_cf])
+        cf_weights = weights[has_cf] if scale is None else weights[has_cf] * scale
+        cf_profile = cf_weights @ cf_dense_rows(artifacts, seed_cf[has_cf]) / norm
+        known = content_to_cf >= 0
+        cf[known] = cf_profile[content_to_cf[known]]
+        signal |= cf != 0
+
+    return alpha * content + (1 - alpha) * cf, signal
+
+
+def rank_profile(artifacts, seed_rows, weights, alpha, genre="All", top_n=10, mode="any"):
+    """Top-n (rows, final_scores) for a seed profile, seeds and off-genre movies excluded."""
+    final, keep = profile_scores(artifacts, seed_rows, weights, alpha)
+    keep[np.asarray(seed_rows, dtype=np.int64)] = False
+    if genre != "All":
+        keep &= genre_rows(artifacts, genre, mode)
+
+    candidates = np.flatnonzero(keep)
+    if len(candidates) > top_n:
+        candidates = candidates[np.argpartition(-final[candidates], top_n - 1)[:top_n]]
+    order = np.argsort(-final[candidates], kind="stable")
+    return candidates[order], final[candidates[order]]
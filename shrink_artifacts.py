@@ -2,61 +2,301 @@
 shrink_artifacts.py
 -------------------
 One-time helper: shrinks the two big model files so the backend fits in a
-512 MB free-tier server (e.g. Render Free).
+512 MB free-tier server (e.g. Render Free), and checks that the rankings
+survive it.
 
 The two big matrices hold cosine-similarity values (always between -1 and 1),
 so storing them in float16 instead of float64 keeps ~3 decimal digits of
 precision -- more than enough for ranking -- while cutting memory roughly 4x.
+int8 with one float32 scale per row (value = q * scale[row], scale = row
+max / 127) halves that again.
+
+    --dtype float16   content scores float16, CF values float32 (scipy sparse
+                      can't hold float16), written as pickles like the
+                      originals. The default.
+    --dtype int8      content scores and CF values int8 plus a scale per row,
+                      and the neighbour / CF column indices narrowed to
+                      uint16 where every value fits. scipy can't hold those either, so this
+                      writes a bundle (bundle.py); the backend multiplies by
+                      the scale only for the candidates it gathers.
+
+Either way, a fidelity report compares the shrunk artifacts with the float64
+originals for every movie, through the backend's own scoring.rescore_batch
+(alpha 0.45, no genre filter):
+
+    top10_overlap   share of the /recommend top 10 that is still there
+    recall_at_50    share of the 50 best hybrid scores over the whole top-K
+                    neighbour row that is still in the top 50
+    spearman        rank correlation of the 50 rescored candidates' order
+
+Content scores are re-read from similarity.pkl in float64 when it exists; the
+top-K table alone only keeps float16. The report is printed and saved as
+fidelity.json in the output directory.
 
 Reads from   artifacts/
-Writes to    artifacts_slim/   (originals are left untouched)
+Writes to    artifacts_slim/ (float16) or artifacts_slim/bundle/ (int8);
+             originals are left untouched
 
 Run it once:
     python shrink_artifacts.py
+    python shrink_artifacts.py --dtype int8 --min-overlap 0.95
 Then, when you're happy with it, replace the big files:
     (Windows PowerShell)
-    Copy-Item artifacts_slim\* artifacts\ -Force
+    Copy-Item artifacts_slim\\* artifacts\\ -Force
+or serve the int8 bundle with ARTIFACT_BUNDLE=artifacts_slim/bundle.
 """
+import argparse
+import json
 import os
 import pickle
 import shutil
+
 import numpy as np
 
+import ann
+import bundle
+import neighbors
+import scoring
+
 SRC = "artifacts"
 DST = "artifacts_slim"
-os.makedirs(DST, exist_ok=True)
+# Movies rescored together in the fidelity check, capped so the dense float64
+# CF block (block x CF width) stays within DENSE_CELLS.
+BLOCK = 256
+DENSE_CELLS = 1 << 24
 
 
 def mb(path):
     return f"{os.path.getsize(path) / 1e6:.1f} MB"
 
 
-# --- 1. Content similarity: dense float64 matrix -> float16 ------------------
-with open(os.path.join(SRC, "similarity.pkl"), "rb") as f:
-    sim = pickle.load(f)
-sim = np.asarray(sim).astype(np.float16)
-with open(os.path.join(DST, "similarity.pkl"), "wb") as f:
-    pickle.dump(sim, f, protocol=4)
-print("similarity.pkl   :", mb(os.path.join(SRC, "similarity.pkl")),
-      "->", mb(os.path.join(DST, "similarity.pkl")))
-
-# --- 2. Collaborative similarity: sparse CSR float64 -> float16 --------------
-loaded = np.load(os.path.join(SRC, "movie_similarity.npy"), allow_pickle=True)
-csr = loaded.item() if loaded.ndim == 0 else loaded
-# scipy sparse can't hold float16, so float32 is the smallest safe choice here.
-csr = csr.astype(np.float32)          # only the .data array shrinks; indices stay int32
-# save back in the exact same 0-d object-array wrapper main.py expects
-wrapper = np.empty((), dtype=object)
-wrapper[()] = csr
-np.save(os.path.join(DST, "movie_similarity.npy"), wrapper, allow_pickle=True)
-print("movie_similarity :", mb(os.path.join(SRC, "movie_similarity.npy")),
-      "->", mb(os.path.join(DST, "movie_similarity.npy")))
-
-# --- 3. Small files: copy across unchanged ----------------------------------
-for name in ("movies_df.pkl", "tmdb_to_ml.pkl", "movie_id_search.pkl", "trending.pkl"):
-    src = os.path.join(SRC, name)
-    if os.path.exists(src):
-        shutil.copy2(src, os.path.join(DST, name))
-        print(f"copied {name}")
-
-print("\nDone. Slim artifacts are in ./artifacts_slim/")
+def index_dtype(bound):
+    """Narrowest of uint16 / int32 / int64 that holds every value in [0, bound)."""
+    for dtype in (np.uint16, np.int32):
+        if bound <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.int64
+
+
+def _to_int8(values, scale):
+    safe = np.where(scale > 0, scale, 1).astype(np.float64)
+    return np.clip(np.rint(values / safe), -127, 127).astype(np.int8)
+
+
+def quantize_table(scores, block_rows=65536):
+    """(N, K) scores -> int8 (N, K) and a float32 scale per row."""
+    q = np.empty(scores.shape, dtype=np.int8)
+    scale = np.empty(len(scores), dtype=np.float32)
+    for start in range(0, len(scores), block_rows):
+        block = np.asarray(scores[start:start + block_rows], dtype=np.float64)
+        block_scale = (np.abs(block).max(axis=1, initial=0.0) / 127).astype(np.float32)
+        scale[start:start + len(block)] = block_scale
+        q[start:start + len(block)] = _to_int8(block, block_scale[:, None])
+    return q, scale
+
+
+def quantize_csr(indptr, data):
+    """CSR values -> int8 values and a float32 scale per row."""
+    lengths = np.diff(indptr)
+    scale = np.zeros(len(lengths), dtype=np.float32)
+    stored = np.flatnonzero(lengths)
+    if len(stored):
+        # Only non-empty rows: each reduceat segment then covers exactly one row.
+        scale[stored] = np.maximum.reduceat(np.abs(data), indptr[stored]) / 127
+    owner = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+    return _to_int8(np.asarray(data, dtype=np.float64), scale[owner]), scale
+
+
+def load_originals(src):
+    """(source, reference): the source artifacts as stored, and the same with
+    content scores and CF values in float64."""
+    source = bundle.load_pickles(src)
+    if 'content_idx' not in source:
+        raise SystemExit(f"{src} has no content top-K table (python neighbors.py) to shrink")
+    scoring.prepare(source)
+
+    movie_similarity = source['movie_similarity']
+    if not hasattr(movie_similarity, 'indptr'):
+        from scipy.sparse import csr_matrix
+        movie_similarity = csr_matrix(movie_similarity)
+
+    content_idx = source['content_idx']
+    dense_path = os.path.join(src, "similarity.pkl")
+    if os.path.exists(dense_path):
+        with open(dense_path, "rb") as f:
+            dense = np.asarray(pickle.load(f))
+        content_scores = np.empty(content_idx.shape, dtype=np.float64)
+        for start in range(0, len(content_idx), 4096):
+            rows = np.arange(start, min(start + 4096, len(content_idx)))
+            content_scores[rows] = dense[rows[:, None], content_idx[rows]]
+        del dense
+    else:
+        print("similarity.pkl not found: the float16 top-K table is the reference for content scores")
+        content_scores = np.asarray(source['content_scores'], dtype=np.float64)
+
+    reference = {**source, 'content_scores': content_scores,
+                 'movie_similarity': movie_similarity.astype(np.float64)}
+    return source, reference
+
+
+def shrink_float16(reference):
+    return {**reference,
+            'content_scores': reference['content_scores'].astype(np.float16),
+            'movie_similarity': reference['movie_similarity'].astype(np.float32)}
+
+
+def shrink_int8(reference):
+    csr = reference['movie_similarity']
+    content_scores, content_scale = quantize_table(reference['content_scores'])
+    cf_data, cf_scale = quantize_csr(csr.indptr, csr.data)
+    return {
+        **reference,
+        'content_idx': reference['content_idx'].astype(index_dtype(len(reference['content_idx']))),
+        'content_scores': content_scores,
+        'content_scale': content_scale,
+        # indptr stays as scipy made it (int32 unless nnz needs more): it takes
+        # part in signed offset arithmetic in scoring.cf_dense_rows.
+        'movie_similarity': bundle.CSRArrays(csr.indptr, csr.indices.astype(index_dtype(csr.shape[1])),
+                                             cf_data, csr.shape, cf_scale),
+    }
+
+
+def nbytes(artifacts):
+    """Bytes of the similarity arrays: the content table and the CF CSR parts, scales included."""
+    cf = artifacts['movie_similarity']
+    parts = (artifacts['content_idx'], artifacts['content_scores'], artifacts.get('content_scale'),
+             cf.indptr, cf.indices, cf.data, getattr(cf, 'scale', None))
+    return sum(np.asarray(p).nbytes for p in parts if p is not None)
+
+
+def fidelity(reference, shrunk, alpha=0.45, top_k=50, top_n=10, deep=50, movies=None):
+    """Ranking agreement of two artifact sets over `movies` (default: every
+    movie); see the module docstring for the measures."""
+    n, depth = reference['content_idx'].shape
+    movies = np.arange(n) if movies is None else np.asarray(movies)
+    top_k = min(top_k, depth)
+    block = max(1, min(BLOCK, DENSE_CELLS // max(reference['movie_similarity'].shape[1], 1)))
+    overlap, recall, spearman = [], [], []
+    for start in range(0, len(movies), block):
+        rows = movies[start:start + block]
+        alphas, genres = [alpha] * len(rows), ["All"] * len(rows)
+        # All top_k candidates in served order: the top 10 is its head.
+        cand_ref, score_ref = scoring.rescore_batch(reference, rows, alphas, genres, top_k, top_k)
+        cand_new, _ = scoring.rescore_batch(shrunk, rows, alphas, genres, top_k, top_k)
+        # The whole neighbour row ranked, for recall@deep.
+        deep_ref, deep_score = scoring.rescore_batch(reference, rows, alphas, genres, depth, deep)
+        deep_new, _ = scoring.rescore_batch(shrunk, rows, alphas, genres, depth, deep)
+
+        # Both sides rescore the same candidates (the table order is unchanged),
+        # so each row is a permutation: compare positions, aligned by movie.
+        valid = np.isfinite(score_ref).sum(axis=1)
+        d = np.argsort(cand_ref, axis=1, kind="stable") - np.argsort(cand_new, axis=1, kind="stable")
+        for i in range(len(rows)):
+            m = int(valid[i])
+            if m == 0:
+                continue
+            head = min(top_n, m)
+            overlap.append(len(set(cand_ref[i, :head].tolist()) & set(cand_new[i, :head].tolist())) / head)
+            spearman.append(1.0 - 6.0 * float((d[i] ** 2).sum()) / (m * (m * m - 1)) if m > 1 else 1.0)
+            wanted = deep_ref[i, np.isfinite(deep_score[i])].tolist()
+            recall.append(len(set(wanted) & set(deep_new[i, :len(wanted)].tolist())) / len(wanted))
+
+    overlap, recall, spearman = np.array(overlap), np.array(recall), np.array(spearman)
+    return {
+        "movies": len(overlap),
+        "alpha": alpha,
+        "top10_overlap": float(overlap.mean()),
+        "top10_overlap_min": float(overlap.min()),
+        "top10_identical_share": float((overlap == 1.0).mean()),
+        "recall_at_50": float(recall.mean()),
+        "recall_at_50_min": float(recall.min()),
+        "spearman": float(spearman.mean()),
+        "spearman_min": float(spearman.min()),
+    }
+
+
+def write_pickles(src, dst, shrunk):
+    """The float16 output: the original file layout with narrower values."""
+    os.makedirs(dst, exist_ok=True)
+
+    # --- 1. Content similarity: dense float64 matrix -> float16 ------------------
+    if os.path.exists(os.path.join(src, "similarity.pkl")):
+        with open(os.path.join(src, "similarity.pkl"), "rb") as f:
+            sim = pickle.load(f)
+        sim = np.asarray(sim).astype(np.float16)
+        with open(os.path.join(dst, "similarity.pkl"), "wb") as f:
+            pickle.dump(sim, f, protocol=4)
+        print("similarity.pkl   :", mb(os.path.join(src, "similarity.pkl")),
+              "->", mb(os.path.join(dst, "similarity.pkl")))
+    np.save(os.path.join(dst, neighbors.IDX_FILE), np.asarray(shrunk['content_idx'], dtype=np.int32))
+    np.save(os.path.join(dst, neighbors.SCORES_FILE), shrunk['content_scores'])
+
+    # --- 2. Collaborative similarity: sparse CSR float64 -> float32 --------------
+    # save back in the exact same 0-d object-array wrapper bundle.load_pickles expects
+    wrapper = np.empty((), dtype=object)
+    wrapper[()] = shrunk['movie_similarity']
+    np.save(os.path.join(dst, "movie_similarity.npy"), wrapper, allow_pickle=True)
+    print("movie_similarity :", mb(os.path.join(src, "movie_similarity.npy")),
+          "->", mb(os.path.join(dst, "movie_similarity.npy")))
+
+    # --- 3. Small files: copy across unchanged ----------------------------------
+    small = ("movies_df.pkl", "tmdb_to_ml.pkl", "movie_id_search.pkl", "trending.pkl")
+    for name in small + tuple(f"{array}.npy" for array in ann.ARRAYS):
+        path = os.path.join(src, name)
+        if os.path.exists(path):
+            shutil.copy2(path, os.path.join(dst, name))
+            print(f"copied {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shrink the similarity artifacts and check ranking fidelity.")
+    parser.add_argument("--src", default=SRC, help="directory holding the pickled artifacts")
+    parser.add_argument("--dst", default=None, help=f"output directory (default {DST}/, or {DST}/bundle/ for int8)")
+    parser.add_argument("--dtype", choices=("float16", "int8"), default="float16")
+    parser.add_argument("--version", default=None, help="bundle version label (int8 only)")
+    parser.add_argument("--alpha", type=float, default=0.45, help="hybrid blend used by the fidelity report")
+    parser.add_argument("--sample", type=int, default=0,
+                        help="check this many random movies instead of all of them (huge catalogs)")
+    parser.add_argument("--min-overlap", type=float, default=0.0,
+                        help="exit with status 1 if the mean top-10 overlap is below this")
+    args = parser.parse_args()
+    dst = args.dst or (os.path.join(DST, "bundle") if args.dtype == "int8" else DST)
+
+    source, reference = load_originals(args.src)
+    shrunk = shrink_int8(reference) if args.dtype == "int8" else shrink_float16(reference)
+    if args.dtype == "int8":
+        manifest = bundle.write_bundle(shrunk, dst, version=args.version)
+        print(f"Wrote int8 bundle {manifest['version']} to {dst}/")
+        # Check what the backend will actually map, not the in-memory copy.
+        served = bundle.open_bundle(dst)
+    else:
+        write_pickles(args.src, dst, shrunk)
+        served = shrunk
+
+    n = len(reference['content_idx'])
+    movies = None
+    if 0 < args.sample < n:
+        movies = np.sort(np.random.default_rng(0).choice(n, args.sample, replace=False))
+    print(f"Checking rankings for {len(movies) if movies is not None else n} movies...")
+    report = {
+        "dtype": args.dtype,
+        "similarity_mb": {"source": nbytes(source) / 1e6, "shrunk": nbytes(served) / 1e6},
+        **fidelity(reference, served, alpha=args.alpha, movies=movies),
+    }
+    with open(os.path.join(dst, "fidelity.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"similarity arrays : {report['similarity_mb']['source']:.1f} MB -> "
+          f"{report['similarity_mb']['shrunk']:.1f} MB")
+    print(f"top-10 overlap    : mean {report['top10_overlap']:.4f}  min {report['top10_overlap_min']:.2f}  "
+          f"identical {report['top10_identical_share']:.1%}")
+    print(f"recall@50         : mean {report['recall_at_50']:.4f}  min {report['recall_at_50_min']:.2f}")
+    print(f"rank correlation  : mean {report['spearman']:.4f}  min {report['spearman_min']:.3f}")
+    print(f"\nDone. Shrunk artifacts are in {dst}/")
+    if report["top10_overlap"] < args.min_overlap:
+        raise SystemExit(f"Mean top-10 overlap {report['top10_overlap']:.4f} is below --min-overlap "
+                         f"{args.min_overlap}")
+
+
+if __name__ == "__main__":
+    main()
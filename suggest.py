@@ -0,0 +1,122 @@
+"""
+suggest.py
+----------
+Typeahead for /suggest: titles matching a partial query by prefix, most
+popular first, without touching the fuzzy matcher.
+
+Built once per artifact generation as a sorted array of keys over the
+normalized titles (lower case, accents stripped, punctuation -> spaces):
+
+  * the whole title                 "the dark knight"
+  * the title with spaces removed   "thedarkknight"  (so "spiderm" finds "Spider-Man")
+  * every token suffix              "dark knight", "knight"  (token-prefix matches)
+
+A query is two np.searchsorted calls on that array, giving the contiguous
+range of keys it prefixes. Matches are ranked in tiers -- exact title, then
+whole-title prefix, then token prefix -- and by vote_count within a tier.
+Keys are stored truncated to KEY_BYTES; longer queries are checked against
+the full normalized title.
+"""
+import re
+import unicodedata
+
+import numpy as np
+
+KEY_BYTES = 32
+DEFAULT_LIMIT = 10
+# Ranges bigger than this ("t", "the") are ranked once and memoized.
+MEMO_RANGE = 8192
+
+EXACT, PREFIX, TOKEN = 0, 1, 2
+
+
+def normalize(text):
+    ascii_text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", ascii_text.lower()).split())
+
+
+class SuggestIndex:
+    def __init__(self, titles, popularity=None):
+        n = len(titles)
+        self.popularity = (np.zeros(n, dtype=np.int64) if popularity is None
+                           else np.asarray(popularity, dtype=np.int64))
+        self.titles = titles
+
+        keys, rows, starts = [], [], []
+        for row, title in enumerate(titles):
+            norm = normalize(title)
+            if not norm:
+                continue
+            keys.append(norm)
+            rows.append(row)
+            starts.append(0)
+            compact = norm.replace(" ", "")
+            if compact != norm:
+                keys.append(compact)
+                rows.append(row)
+                starts.append(-1)
+            for match in re.finditer(r" ", norm):
+                keys.append(norm[match.end():])
+                rows.append(row)
+                starts.append(match.end())
+
+        lengths = np.array([len(k) for k in keys], dtype=np.int32)
+        keys = np.array([k.encode("ascii")[:KEY_BYTES] for k in keys], dtype=f"S{KEY_BYTES}")
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.lengths = lengths[order]             # untruncated key length, for exact matches
+        self.rows = np.asarray(rows, dtype=np.int32)[order]
+        self.starts = np.asarray(starts, dtype=np.int32)[order]   # 0 whole, -1 compact, >0 token
+        self._memo = {}
+
+    def _key(self, row, start):
+        norm = normalize(self.titles[row])
+        return norm.replace(" ", "") if start < 0 else norm[start:]
+
+    def _rank(self, q, lo, hi, limit):
+        rows, starts, lengths = self.rows[lo:hi], self.starts[lo:hi], self.lengths[lo:hi]
+        if len(q) > KEY_BYTES:
+            # The stored keys were truncated: confirm against the full title.
+            keep = np.array([self._key(r, s).startswith(q) for r, s in zip(rows.tolist(), starts.tolist())],
+                            dtype=bool)
+            rows, starts, lengths = rows[keep], starts[keep], lengths[keep]
+        tier = np.where(starts > 0, TOKEN, PREFIX)
+        tier[(starts <= 0) & (lengths == len(q))] = EXACT
+        # Lower is better: tier first, then popularity, then row for stable ties.
+        rank = tier.astype(np.int64) << 40
+        rank -= np.minimum(self.popularity[rows], (1 << 40) - 1)
+        # Each title has at most a handful of keys, so 8x the limit leaves enough distinct rows.
+        if len(rank) > 8 * limit:
+            top = np.argpartition(rank, 8 * limit)[:8 * limit]
+            rows, rank = rows[top], rank[top]
+        out, seen = [], set()
+        for i in np.lexsort((rows, rank)).tolist():
+            row = int(rows[i])
+            if row not in seen:
+                seen.add(row)
+                out.append(row)
+                if len(out) == limit:
+                    break
+        return out
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        """Rows of up to `limit` titles matching `query` by prefix, best first."""
+        q = normalize(query)
+        if not q or limit <= 0:
+            return []
+        qb = q.encode("ascii")[:KEY_BYTES]
+        lo = int(np.searchsorted(self.keys, qb, side="left"))
+        if len(qb) == KEY_BYTES:
+            # Keys are cut at KEY_BYTES, so the only matches are keys equal to qb;
+            # qb + b"\xff" would be S33 and make searchsorted copy the whole S32 array.
+            hi = int(np.searchsorted(self.keys, qb, side="right"))
+        else:
+            hi = int(np.searchsorted(self.keys, qb + b"\xff", side="left"))
+        if hi <= lo:
+            return []
+        if hi - lo <= MEMO_RANGE:
+            return self._rank(q, lo, hi, limit)
+        memo_key = (q, limit)
+        if memo_key not in self._memo:
+            self._memo[memo_key] = self._rank(q, lo, hi, limit)
+        return self._memo[memo_key]
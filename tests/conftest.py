@@ -0,0 +1,60 @@
+"""
+Shared fixtures: small synthetic artifact versions (benchmarks.synth) laid out
+the way bundle.py --versions publishes them, so tests never need the real
+artifacts.
+
+    python -m pytest -q
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bundle  # noqa: E402
+import main  # noqa: E402
+from benchmarks import synth  # noqa: E402
+
+N_MOVIES = 400
+
+
+@pytest.fixture(scope="session")
+def versions_dir(tmp_path_factory):
+    """<versions>/v1 and v2 (different seeds), CURRENT -> v1."""
+    root = tmp_path_factory.mktemp("artifacts")
+    versions = os.path.join(root, "versions")
+    os.makedirs(versions)
+    for seed, version in enumerate(("v1", "v2")):
+        src = os.path.join(root, version)
+        synth.generate(N_MOVIES, src, k=100, seed=seed, version=version)
+        os.replace(os.path.join(src, "bundle"), os.path.join(versions, version))
+    bundle.publish(versions, "v1")
+    return versions
+
+
+@pytest.fixture
+def process_mode(versions_dir, monkeypatch):
+    """Backend in EXECUTION_MODE=process, serving v1 with one worker process."""
+    monkeypatch.setattr(main, "EXECUTION_MODE", "process")
+    monkeypatch.setattr(main, "PROCESS_WORKERS", 1)
+    monkeypatch.setattr(main, "ARTIFACT_VERSIONS", versions_dir)
+    main.artifacts = main._load_generation(main._bundle_dir("v1"))
+    yield
+    main._retire(main.artifacts, cancel=True)
+    main.artifacts = {}
+    main._clear_caches()
+
+
+@pytest.fixture
+def client(versions_dir, monkeypatch):
+    """TestClient on v1 in thread mode, rate limits off, caches empty."""
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(main, "ARTIFACT_VERSIONS", versions_dir)
+    monkeypatch.setattr(main.limiter, "enabled", False)
+    main.artifacts = main._load_generation(main._bundle_dir("v1"))
+    main._clear_caches()
+    yield TestClient(main.app)
+    main.artifacts = {}
+    main._clear_caches()
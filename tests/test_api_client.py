@@ -0,0 +1,14 @@
+"""The frontends tell prefetched posters from the backend's placeholder."""
+import api_client
+import main
+
+
+def test_backend_placeholder_is_recognised():
+    assert api_client.is_placeholder(main._poster_url(1, "Some Title"))
+    assert api_client.is_placeholder(None)
+
+
+def test_stored_poster_is_not_a_placeholder():
+    url = "https://m.media-amazon.com/images/M/poster.jpg"
+    assert main._poster_url(1, "Some Title", url) == url
+    assert not api_client.is_placeholder(url)
@@ -0,0 +1,43 @@
+"""ingest.py refuses inputs it cannot extend, before writing anything."""
+import os
+import shutil
+
+import pytest
+
+import ingest
+from benchmarks import synth
+
+
+@pytest.fixture(scope="module")
+def src(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("src"))
+    synth.generate(200, directory, k=30, version="src")
+    # synth writes no TF-IDF; ingest only checks that they exist here.
+    for name in ("tfidf_vectorizer.pkl", "tfidf_matrix.npz"):
+        open(os.path.join(directory, name), "wb").close()
+    return directory
+
+
+def _copy(src, dst, drop=()):
+    shutil.copytree(src, dst, ignore=shutil.ignore_patterns("bundle", *drop))
+    return str(dst)
+
+
+def test_complete_source_passes(src):
+    assert ingest.check_inputs(src) is None
+
+
+def test_bundle_only_source_points_to_build_artifacts(src):
+    message = ingest.check_inputs(os.path.join(src, "bundle"))
+    assert "movies_df.pkl" in message and "build_artifacts.py" in message
+
+
+def test_dense_similarity_only_points_to_neighbors(src, tmp_path):
+    directory = _copy(src, tmp_path / "dense", drop=("content_topk_*",))
+    open(os.path.join(directory, "similarity.pkl"), "wb").close()
+    assert "neighbors.py" in ingest.check_inputs(directory)
+
+
+def test_no_content_table_points_to_build_artifacts(src, tmp_path):
+    directory = _copy(src, tmp_path / "none", drop=("content_topk_*",))
+    assert "build_artifacts.py" in ingest.check_inputs(directory)
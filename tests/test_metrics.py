@@ -0,0 +1,45 @@
+"""Stage timings and counters recorded in worker processes reach the parent."""
+import contextvars
+
+import main
+import metrics
+import workers
+
+
+def _count(stage):
+    return sum(metrics._histogram(metrics.stages, stage).snapshot()[0])
+
+
+def test_record_and_merge_round_trip():
+    def in_worker():
+        delta = metrics.record()
+        metrics.incr("worker_event", 2)
+        metrics.observe("worker_stage", 0.001)
+        return delta
+
+    delta = contextvars.copy_context().run(in_worker)
+    assert delta == ([("worker_stage", 0.001)], {"worker_event": 2})
+    events, observed = metrics.counters.get("worker_event", 0), _count("worker_stage")
+    metrics.merge(delta)
+    assert metrics.counters["worker_event"] == events + 2
+    assert _count("worker_stage") == observed + 1
+
+
+def test_worker_stage_metrics_reach_parent(process_mode):
+    arts = main.artifacts
+    before = _count("candidates")
+    timings = metrics.collect_timings()
+    row = main._offload(arts, workers.resolve, arts['titles'][0])[0]
+    main._offload(arts, workers.rank, row, 0.45)
+    assert {"title_exact", "candidates", "rescore"} <= {stage for stage, _ in timings}
+    assert _count("candidates") == before + 1
+
+
+def test_genre_empty_counts_cached_responses(client):
+    title = main.artifacts['titles'][0]
+    before = metrics.counters.get("genre_empty", 0)
+    for _ in range(2):                      # the second answer comes from the result cache
+        body = client.get("/recommend", params={"title": title, "genre": "No Such Genre"}).json()
+        assert body["recommendations"] == []
+    assert main.result_cache.stats()["hits"] == 1
+    assert metrics.counters["genre_empty"] == before + 2
@@ -0,0 +1,27 @@
+"""Paged /recommend: limit / depth / cursor."""
+import main
+
+
+def _title(client):
+    return main.artifacts['titles'][0]
+
+
+def test_limit_above_default_depth_raises_depth(client):
+    body = client.get("/recommend", params={"title": _title(client), "limit": 60}).json()
+    # Not cut to the default depth of 50: the ranking is deepened to the page.
+    assert body["total"] == 60
+    assert len(body["recommendations"]) == 60
+
+
+def test_depth_below_limit_is_rejected(client):
+    response = client.get("/recommend", params={"title": _title(client), "limit": 20, "depth": 10})
+    assert response.status_code == 422
+
+
+def test_pages_continue_from_cursor(client):
+    first = client.get("/recommend", params={"title": _title(client), "limit": 20, "depth": 30}).json()
+    second = client.get("/recommend", params={"cursor": first["next_cursor"], "limit": 20}).json()
+    assert len(second["recommendations"]) == first["total"] - 20
+    assert second["next_cursor"] is None
+    seen = {r["tmdb_id"] for r in first["recommendations"]}
+    assert not seen & {r["tmdb_id"] for r in second["recommendations"]}
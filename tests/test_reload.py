@@ -0,0 +1,61 @@
+"""Hot reload under EXECUTION_MODE=process: requests pinned to the old
+generation keep scoring after the swap."""
+import threading
+
+import pytest
+
+import main
+import workers
+
+
+def test_pinned_request_finishes_on_old_pool_after_reload(process_mode):
+    old = main.artifacts
+    main._pin(old)
+    try:
+        row = main._resolve_title(old, old['titles'][0])
+        assert main.reload_artifacts("v2") == "v2"
+        response = main._recommend_for(old, row, 0.45, "All")
+        assert response["source_movie"] == old['titles'][row]
+        assert response["recommendations"]
+        # Not shut down while the request is pinned.
+        assert old['process_pool'].submit(workers._ready).result() == len(old['titles'])
+    finally:
+        main._unpin(old)
+
+
+def test_retire_waits_for_pinned_requests(process_mode):
+    old = main.artifacts
+    main._pin(old)
+    retired = threading.Thread(target=main._retire, args=(old,))
+    retired.start()
+    retired.join(0.5)
+    assert retired.is_alive()
+    main._unpin(old)
+    retired.join(30)
+    assert not retired.is_alive()
+
+
+def test_retired_generation_falls_back_to_in_process(process_mode):
+    old = main.artifacts
+    row = main._resolve_title(old, old['titles'][0])
+    main.reload_artifacts("v2")
+    main._retire(old)
+    with pytest.raises(RuntimeError):
+        old['process_pool'].submit(workers._ready)
+    expected = workers.rank(row, 0.45, artifacts=old)
+    rows, final_scores = main._offload(old, workers.rank, row, 0.45)
+    assert rows.tolist() == expected[0].tolist()
+    assert final_scores.tolist() == expected[1].tolist()
+
+
+def test_reload_state_requires_admin_token(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    client = TestClient(main.app)
+    assert client.get("/admin/reload").status_code == 403
+    assert client.get("/admin/reload", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    response = client.get("/admin/reload", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert "last_error" in response.json()
+
@@ -0,0 +1,28 @@
+"""Background startup: "partial" marks rankings only while CF is missing."""
+import numpy as np
+
+import bundle
+import main
+
+
+def _stages():
+    return dict(bundle.load_stages(main._bundle_dir("v1"), "artifacts"))
+
+
+def test_bundle_content_stage_is_not_partial(versions_dir, monkeypatch):
+    monkeypatch.setattr(main, "ARTIFACT_VERSIONS", versions_dir)
+    arts = _stages()["content"]
+    response = main._recommend(arts, arts['titles'][0], 0.45, "All", "any")
+    assert response["recommendations"]
+    assert "partial" not in response
+
+
+def test_content_stage_without_cf_is_partial(versions_dir, monkeypatch):
+    monkeypatch.setattr(main, "ARTIFACT_VERSIONS", versions_dir)
+    arts = dict(_stages()["content"])
+    # The pickle path's content stage: no CF matrix, every content_to_cf -1.
+    del arts['movie_similarity']
+    arts['content_to_cf'] = np.full(len(arts['titles']), -1, dtype=np.int32)
+    arts['version'] += "+nocf"
+    response = main._recommend(arts, arts['titles'][0], 0.45, "All", "any")
+    assert response["partial"] is True
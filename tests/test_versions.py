@@ -0,0 +1,36 @@
+"""Publishing versions: bundle.write_version builds the materialized table
+before CURRENT moves, and never touches a published directory."""
+import os
+
+import pytest
+
+import bundle
+import scoring
+from benchmarks import synth
+
+
+@pytest.fixture(scope="module")
+def loaded(tmp_path_factory):
+    src = tmp_path_factory.mktemp("pickles")
+    synth.generate(200, str(src), k=30, version="src")
+    arts = bundle.load_pickles(str(src))
+    scoring.prepare(arts)
+    return arts
+
+
+def test_write_version_materializes_before_publishing(loaded, tmp_path):
+    versions = str(tmp_path)
+    bundle.write_version(loaded, versions, "v1", materialize_movies=0)
+    assert bundle.current_version(versions) == "v1"
+    assert sorted(os.listdir(versions)) == [bundle.CURRENT, "v1"]
+    served = bundle.load_serving(os.path.join(versions, "v1"))
+    assert served['materialized'] is not None
+
+
+def test_write_version_without_table_and_never_overwrites(loaded, tmp_path):
+    versions = str(tmp_path)
+    bundle.write_version(loaded, versions, "v1")
+    assert not os.path.exists(os.path.join(versions, "v1", bundle.MATERIALIZED))
+    with pytest.raises(FileExistsError):
+        bundle.write_version(loaded, versions, "v1", materialize_movies=0)
+    assert not os.path.exists(os.path.join(versions, "v1", bundle.MATERIALIZED))
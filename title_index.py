@@ -0,0 +1,92 @@
+"""
+title_index.py
+--------------
+Resolves free-text titles to movies_df rows without scanning the catalog.
+
+Built once at startup from the title list:
+
+  * exact:  cleaned title ("Spider-Man" -> "spiderman") -> first row, an O(1)
+            dict hit that handles "spiderman" / "ironman" style input.
+  * fuzzy:  a character-trigram inverted index shortlists the few dozen titles
+            sharing the most trigrams with the query; only those go through
+            thefuzz's token_sort_ratio, with the same threshold of 65 as before.
+
+Trigrams are taken per word, so word order doesn't affect the shortlist, just
+as it doesn't affect token_sort_ratio.
+"""
+import re
+from collections import defaultdict
+
+import numpy as np
+
+import metrics
+
+FUZZY_THRESHOLD = 65
+SHORTLIST_SIZE = 48
+
+
+def clean_text(text):
+    return re.sub(r'[^a-zA-Z0-9]', '', str(text)).lower()
+
+
+def trigrams(text):
+    grams = set()
+    for token in re.sub(r'[^a-z0-9]+', ' ', str(text).lower()).split():
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TitleIndex:
+    def __init__(self, titles):
+        # Any sequence: a list, or the catalog's PackedStrings (decoded on access).
+        self.titles = titles
+
+        self.exact = {}
+        postings = defaultdict(list)
+        gram_counts = np.zeros(len(self.titles), dtype=np.int32)
+        for row, title in enumerate(self.titles):
+            self.exact.setdefault(clean_text(title), row)
+            grams = trigrams(title)
+            gram_counts[row] = len(grams)
+            for gram in grams:
+                postings[gram].append(row)
+        self.postings = {gram: np.asarray(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self.gram_counts = gram_counts
+
+    def shortlist(self, query, size=SHORTLIST_SIZE):
+        """Rows of the `size` titles with the highest trigram Dice overlap, in row order."""
+        grams = trigrams(query)
+        hits = [self.postings[g] for g in grams if g in self.postings]
+        if not hits:
+            return np.empty(0, dtype=np.int32)
+
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.titles))
+        dice = 2.0 * shared / (len(grams) + self.gram_counts)
+        candidates = np.flatnonzero(shared)
+        if len(candidates) > size:
+            top = np.argpartition(-dice[candidates], size - 1)[:size]
+            candidates = candidates[top]
+        # Row order keeps extractOne's first-wins tie-breaking identical to a full scan.
+        return np.sort(candidates)
+
+    def resolve(self, user_input):
+        """Return (row, method, score); row is None when nothing clears the threshold."""
+        with metrics.timer("title_exact"):
+            row = self.exact.get(clean_text(user_input))
+        if row is not None:
+            return row, "exact", 100
+
+        with metrics.timer("title_shortlist"):
+            rows = self.shortlist(user_input).tolist()
+        # Imported on first fuzzy lookup, so startup doesn't pay for it.
+        from thefuzz import fuzz, process
+        with metrics.timer("title_fuzzy"):
+            best_match = process.extractOne(user_input, {r: self.titles[r] for r in rows},
+                                            scorer=fuzz.token_sort_ratio)
+        # Threshold 65: Flexible enough for typos, strict enough to reject garbage
+        if not best_match or best_match[1] < FUZZY_THRESHOLD:
+            return None, None, best_match[1] if best_match else 0
+
+        # Keys are in row order, so a duplicated title resolves to its first row.
+        return best_match[2], "fuzzy", best_match[1]
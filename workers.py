@@ -0,0 +1,80 @@
+"""
+workers.py
+----------
+Process-pool execution mode for the CPU-bound half of /recommend.
+
+Fuzzy title matching, candidate selection and rescoring all hold the GIL, so
+on FastAPI's thread pool one uvicorn worker tops out at about one core. With
+EXECUTION_MODE=process the backend submits those calls to a pool of worker
+processes instead. Each worker loads the artifacts once in its initializer
+(memory-mapped when a bundle exists, so the pool shares one page-cache copy);
+a task only carries a title or a few scalars in and a couple of short arrays
+out -- matrices are never pickled per task. Tasks go through run(), which
+also returns the stage timings and counters recorded in the worker so the
+parent's /metrics sees them.
+
+The task functions also take an explicit `artifacts` dict so the backend can
+run exactly the same code in-process when the pool is off.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import bundle
+import metrics
+import scoring
+
+_artifacts = {}
+
+
+def _init(bundle_dir, legacy_dir, serving):
+    _artifacts.update(bundle.load_serving(bundle_dir, legacy_dir, **serving))
+
+
+def _ready():
+    return len(_artifacts['titles'])
+
+
+def start_pool(n_workers, bundle_dir, legacy_dir="artifacts", **serving):
+    """Worker pool; `serving` is passed on to bundle.load_serving (content_mode, nprobe)."""
+    # spawn, not fork: the parent is a threaded uvicorn process.
+    pool = ProcessPoolExecutor(max_workers=n_workers,
+                               mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init, initargs=(bundle_dir, legacy_dir, serving))
+    # Run one task per worker so every process has loaded before traffic arrives.
+    for future in [pool.submit(_ready) for _ in range(n_workers)]:
+        future.result()
+    return pool
+
+
+def run(task, *args):
+    """Pool entry point: (result of task(*args), the metrics it recorded). The
+    parent merges the latter (metrics.merge), so stages timed here still count."""
+    delta = metrics.record()
+    return task(*args), delta
+
+
+def resolve(title, artifacts=None):
+    """(movies_df row, "exact" / "fuzzy") for a free-text title, or (None, None)."""
+    artifacts = _artifacts if artifacts is None else artifacts
+    return artifacts['title_index'].resolve(title)[:2]
+
+
+def rank(base_idx, alpha, genre="All", genre_mode="any", top_k=50, top_n=10, artifacts=None):
+    """(rows, final_scores) of the top_n hybrid recommendations for one movie."""
+    artifacts = _artifacts if artifacts is None else artifacts
+    # Genre filtering happens over the whole neighbour row before the top_k cut.
+    with metrics.timer("candidates"):
+        cand_idx, content_scores = scoring.candidates(artifacts, base_idx, top_k, genre, genre_mode)
+    with metrics.timer("rescore"):
+        rows, final_scores = scoring.rescore(artifacts, base_idx, cand_idx, content_scores, alpha)
+    return rows[:top_n], final_scores[:top_n]
+
+
+def score(base_idx, alpha, genre="All", genre_mode="any", top_k=50, artifacts=None):
+    """(rows, final_scores) of every one of a movie's top_k candidates, unranked
+    (paged /recommend ranks them lazily, see scoring.PartialRanking)."""
+    artifacts = _artifacts if artifacts is None else artifacts
+    with metrics.timer("candidates"):
+        cand_idx, content_scores = scoring.candidates(artifacts, base_idx, top_k, genre, genre_mode)
+    with metrics.timer("rescore"):
+        return scoring.blend(artifacts, base_idx, cand_idx, content_scores, alpha)